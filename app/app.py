@@ -1,7 +1,22 @@
-from flask import Flask
+from flask import Flask, g
 from flask_ckeditor import CKEditor
 from dotenv import load_dotenv
 import os
+from urllib.parse import urlsplit
+from minio import Minio
+
+from app.cache import RecordCache
+from app.noco import NocoClient, Revalidator
+from app.jobs import JobQueue
+from app.edits import EditCoalescer
+from app import search_index
+from app import related
+from app import ingredients
+from app.planner import MENU_COLUMNS
+from app import markdown_cache
+from app import mirror
+from app import fragments
+from app import metrics
 
 # Function to create and configure the Flask app
 def create_app():
@@ -17,26 +32,211 @@ def create_app():
     app.config['CKEDITOR_HEIGHT'] = 400  # Customize as needed
     app.config['CKEDITOR_LANGUAGE'] = 'en'
 
+    # Per-request Server-Timing headers and the Prometheus metrics served at /ops/metrics
+    metrics.init_app(app)
+
     # Initialize NOCO
     app.config['NOCO_DB_BASE_URL'] = os.getenv('NOCO_DB_BASE_URL')
+    app.config['NOCO_DB_API_TOKEN'] = os.getenv('NOCO_DB_API_TOKEN')
     app.config['NOCO_DB_TABLE_ID'] = os.getenv('NOCO_DB_API_TOKEN')
     app.config['NOCO_DB_MENUS_TABLE_ID'] = os.getenv('NOCO_DB_MENUS_TABLE_ID')
+    # Menus table column names, "role=Column" pairs overriding planner.MENU_COLUMNS
+    app.config['NOCO_DB_MENUS_COLUMNS'] = {**MENU_COLUMNS, **dict(
+        pair.strip().split('=', 1) for pair in os.getenv('NOCO_DB_MENUS_COLUMNS', '').split(',') if '=' in pair
+    )}
     app.config['NOCO_DB_OWNERS_TABLE_ID'] = os.getenv('NOCO_DB_OWNERS_TABLE_ID')
+    app.config['NOCO_DB_PAGE_SIZE'] = int(os.getenv('NOCO_DB_PAGE_SIZE', 100))
+    app.config['NOCO_DB_PAGE_CONCURRENCY'] = int(os.getenv('NOCO_DB_PAGE_CONCURRENCY', 4))
+    app.config['NOCO_DB_POOL_SIZE'] = int(os.getenv('NOCO_DB_POOL_SIZE', 10))
+    app.config['NOCO_DB_CONNECT_TIMEOUT'] = float(os.getenv('NOCO_DB_CONNECT_TIMEOUT', 3.05))
+    app.config['NOCO_DB_READ_TIMEOUT'] = float(os.getenv('NOCO_DB_READ_TIMEOUT', 10))
+    app.config['NOCO_DB_RETRIES'] = int(os.getenv('NOCO_DB_RETRIES', 3))
+    app.config['NOCO_DB_RETRY_BACKOFF'] = float(os.getenv('NOCO_DB_RETRY_BACKOFF', 0.3))
+    # Consecutive failures that open the circuit, and seconds before a trial call is let through
+    app.config['NOCO_DB_BREAKER_THRESHOLD'] = int(os.getenv('NOCO_DB_BREAKER_THRESHOLD', 5))
+    app.config['NOCO_DB_BREAKER_RESET'] = float(os.getenv('NOCO_DB_BREAKER_RESET', 30))
+
+    # One pooled NocoDB client shared by every blueprint
+    app.extensions['noco_client'] = NocoClient(
+        app.config['NOCO_DB_BASE_URL'],
+        app.config['NOCO_DB_API_TOKEN'],
+        pool_size=app.config['NOCO_DB_POOL_SIZE'],
+        connect_timeout=app.config['NOCO_DB_CONNECT_TIMEOUT'],
+        read_timeout=app.config['NOCO_DB_READ_TIMEOUT'],
+        retries=app.config['NOCO_DB_RETRIES'],
+        backoff_factor=app.config['NOCO_DB_RETRY_BACKOFF'],
+        breaker_threshold=app.config['NOCO_DB_BREAKER_THRESHOLD'],
+        breaker_reset=app.config['NOCO_DB_BREAKER_RESET'],
+        metrics=app.extensions['metrics'],
+    )
+
+    # Initialize the NocoDB record cache shared by the blueprints
+    app.config['RECORD_CACHE_TTL'] = int(os.getenv('RECORD_CACHE_TTL', 60))
+    app.config['RECORD_CACHE_MAX_ENTRIES'] = int(os.getenv('RECORD_CACHE_MAX_ENTRIES', 1024))
+    # Expired records are kept this long to be served (marked stale) while NocoDB is down or slow
+    app.config['RECORD_CACHE_STALE_TTL'] = int(os.getenv('RECORD_CACHE_STALE_TTL', 86400))
+    app.config['STALE_REFRESH_WAIT'] = float(os.getenv('STALE_REFRESH_WAIT', 1.0))
+    app.extensions['record_cache'] = RecordCache(
+        ttl=app.config['RECORD_CACHE_TTL'],
+        max_entries=app.config['RECORD_CACHE_MAX_ENTRIES'],
+        stale_ttl=app.config['RECORD_CACHE_STALE_TTL'],
+    )
+    app.extensions['revalidator'] = Revalidator(app)
+    # Listeners called with (table_id, record_id, data) after every local write
+    app.extensions['record_listeners'] = []
+
+    # Initialize the search indexes (built on first search, then kept up to date)
+    app.config['SEARCH_INDEX_TTL'] = int(os.getenv('SEARCH_INDEX_TTL', 300))
+    app.config['SEARCH_PAGE_SIZE'] = int(os.getenv('SEARCH_PAGE_SIZE', 24))
+    app.config['SEARCH_ENGINE'] = os.getenv('SEARCH_ENGINE', 'index')  # 'index', 'where' (NocoDB filtering) or 'mirror' (local FTS5)
+    # Typo tolerance (trigram similarity, 0 disables); only the index engine has it, so it is off by default
+    # for the others and search_index.fuzzy_threshold ignores it there, keeping every engine's results identical
+    app.config['SEARCH_FUZZY_THRESHOLD'] = float(os.getenv(
+        'SEARCH_FUZZY_THRESHOLD', 0.3 if app.config['SEARCH_ENGINE'] == 'index' else 0))
+    app.extensions['search_indexes'] = {}
+    app.extensions['record_listeners'].append(search_index.apply_record_change)
+
+    # Related recipes: precomputed TF-IDF neighbour table (see app/related.py), built on first use
+    app.config['RELATED_RECIPES_K'] = int(os.getenv('RELATED_RECIPES_K', 6))
+    app.config['RELATED_INDEX_TTL'] = int(os.getenv('RELATED_INDEX_TTL', 3600))  # full rebuilds; edits apply right away
+    app.config['RELATED_MAX_DF'] = float(os.getenv('RELATED_MAX_DF', 0.5))  # ignore terms in more than this share of recipes
+    app.extensions['related_indexes'] = {}
+    app.extensions['record_listeners'].append(related.apply_record_change)
+
+    # Parsed ingredients per recipe with an item -> recipes index (see app/ingredients.py), built on first use;
+    # parsing is cached by the hash of the Ingredients text
+    app.config['INGREDIENT_INDEX_TTL'] = int(os.getenv('INGREDIENT_INDEX_TTL', 3600))  # full rebuilds; edits apply right away
+    app.config['INGREDIENT_CACHE_MAX_ENTRIES'] = int(os.getenv('INGREDIENT_CACHE_MAX_ENTRIES', 4096))
+    app.extensions['ingredient_indexes'] = {}
+    app.extensions['record_listeners'].append(ingredients.apply_record_change)
+
+    # Weekly menu planner (see app/planner.py): candidate plans scored per round, and how far back
+    # in the Menus table recently planned recipes are looked up
+    app.config['PLANNER_CANDIDATES'] = int(os.getenv('PLANNER_CANDIDATES', 2000))
+    app.config['PLANNER_ROUNDS'] = int(os.getenv('PLANNER_ROUNDS', 10))
+    app.config['PLANNER_RECENT_DAYS'] = int(os.getenv('PLANNER_RECENT_DAYS', 21))
+    app.extensions['planner_features'] = {}
+
+    # Initialize the rendered markdown cache (Ingredients/Method HTML, keyed by content hash)
+    app.config['MARKDOWN_CACHE_MAX_ENTRIES'] = int(os.getenv('MARKDOWN_CACHE_MAX_ENTRIES', 512))
+    app.extensions['markdown_cache'] = markdown_cache.MarkdownCache(app.config['MARKDOWN_CACHE_MAX_ENTRIES'])
+    app.extensions['record_listeners'].append(markdown_cache.apply_record_change)
+
+    # Cache of rendered search/recipe fragments keyed by their ETag (see app/fragments.py)
+    app.config['FRAGMENT_CACHE_TTL'] = int(os.getenv('FRAGMENT_CACHE_TTL', 300))
+    app.config['FRAGMENT_CACHE_MAX_ENTRIES'] = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 256))
+    app.extensions['fragment_cache'] = RecordCache(
+        ttl=app.config['FRAGMENT_CACHE_TTL'],
+        max_entries=app.config['FRAGMENT_CACHE_MAX_ENTRIES'],
+    )
+    app.extensions['table_versions'] = {}
+    app.extensions['record_listeners'].append(fragments.apply_record_change)
+
+    # Resized recipe photo variants (see app/blueprints/menu/images.py)
+    app.config['PHOTO_VARIANT_FORMAT'] = os.getenv('PHOTO_VARIANT_FORMAT', 'WEBP')  # 'WEBP' or 'JPEG'
+    app.config['PHOTO_VARIANT_QUALITY'] = int(os.getenv('PHOTO_VARIANT_QUALITY', 80))
+
+    # Initialize the persistent background job queue (photo uploads and attachment updates)
+    os.makedirs(app.instance_path, exist_ok=True)
+    app.config['JOBS_DB_PATH'] = os.getenv('JOBS_DB_PATH', os.path.join(app.instance_path, 'jobs.sqlite3'))
+    app.config['JOBS_SPOOL_DIR'] = os.getenv('JOBS_SPOOL_DIR', os.path.join(app.instance_path, 'job_uploads'))
+    app.config['JOBS_WORKERS'] = int(os.getenv('JOBS_WORKERS', 2))
+    app.config['JOBS_MAX_ATTEMPTS'] = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+    app.config['JOBS_RETRY_BACKOFF'] = float(os.getenv('JOBS_RETRY_BACKOFF', 2.0))
+    app.config['JOBS_LEASE'] = float(os.getenv('JOBS_LEASE', 300))  # seconds before a dead process's running job is requeued
+    os.makedirs(app.config['JOBS_SPOOL_DIR'], exist_ok=True)
+    # Resumable progress of bulk recipe imports (see app/transfer.py)
+    app.config['IMPORT_PROGRESS_DIR'] = os.getenv('IMPORT_PROGRESS_DIR', os.path.join(app.instance_path, 'imports'))
+    app.config['IMPORT_BATCH_SIZE'] = int(os.getenv('IMPORT_BATCH_SIZE', 100))
+    app.extensions['jobs'] = JobQueue(
+        app,
+        app.config['JOBS_DB_PATH'],
+        workers=app.config['JOBS_WORKERS'],
+        max_attempts=app.config['JOBS_MAX_ATTEMPTS'],
+        retry_backoff=app.config['JOBS_RETRY_BACKOFF'],
+        lease=app.config['JOBS_LEASE'],
+    )
+
+    # Initialize the local SQLite mirror of the recipes and ideas tables (reads and full-text search)
+    app.config['MIRROR_ENABLED'] = os.getenv('MIRROR_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    app.config['MIRROR_DB_PATH'] = os.getenv('MIRROR_DB_PATH', os.path.join(app.instance_path, 'mirror.sqlite3'))
+    app.config['MIRROR_TABLES'] = os.getenv(
+        'MIRROR_TABLES', ','.join(filter(None, ['mk4go4bhd91cihe', os.getenv('NOCO_DB_IDEAS_TABLE_ID')]))
+    ).split(',')
+    app.config['MIRROR_SYNC_INTERVAL'] = int(os.getenv('MIRROR_SYNC_INTERVAL', 60))
+    if app.config['MIRROR_ENABLED']:
+        app.extensions['mirror'] = mirror.Mirror(
+            app,
+            app.config['MIRROR_DB_PATH'],
+            app.config['MIRROR_TABLES'],
+            sync_interval=app.config['MIRROR_SYNC_INTERVAL'],
+        )
+        app.extensions['record_listeners'].append(mirror.apply_record_change)
+
+    # Shared secret expected in the X-Webhook-Secret header of NocoDB webhooks (unset disables the receiver)
+    app.config['NOCO_DB_WEBHOOK_SECRET'] = os.getenv('NOCO_DB_WEBHOOK_SECRET')
+
+    # Inline edits: PATCH only the edited column; with a window > 0 (seconds), edits are coalesced into bulk PATCHes
+    app.config['EDIT_COALESCE_WINDOW'] = float(os.getenv('EDIT_COALESCE_WINDOW', 0))
+    app.config['EDIT_RETRY_MAX_BACKOFF'] = float(os.getenv('EDIT_RETRY_MAX_BACKOFF', 60))  # failed bulk PATCHes are retried
+    app.extensions['edit_coalescer'] = EditCoalescer(app, app.config['EDIT_COALESCE_WINDOW'],
+                                                     max_backoff=app.config['EDIT_RETRY_MAX_BACKOFF'])
 
     #Initialize MINIO
     app.config['MINIO_URL'] = os.getenv('MINIO_URL')
     app.config['MINIO_ACCESS_KEY'] = os.getenv('MINIO_ACCESS_KEY')
     app.config['MINIO_SECRET_KEY'] = os.getenv('MINIO_SECRET_KEY')
+    app.config['MINIO_BUCKET'] = os.getenv('MINIO_BUCKET', 'menus')
+    # Setting the region skips the bucket location lookup (needed by some S3-compatible stand-ins)
+    app.config['MINIO_REGION'] = os.getenv('MINIO_REGION')
+    # Base URL browsers load photos from (the bucket must allow anonymous reads); defaults to MINIO_URL
+    app.config['MINIO_PUBLIC_URL'] = os.getenv('MINIO_PUBLIC_URL', app.config['MINIO_URL'])
+    # 'server' streams photos through Flask to NocoDB storage; 'presigned' has the browser PUT them to MinIO
+    app.config['PHOTO_UPLOAD_MODE'] = os.getenv('PHOTO_UPLOAD_MODE', 'server')
+    app.config['PHOTO_UPLOAD_EXPIRY'] = int(os.getenv('PHOTO_UPLOAD_EXPIRY', 900))  # seconds a presigned URL is valid
+    app.config['PHOTO_UPLOAD_MAX_SIZE'] = int(os.getenv('PHOTO_UPLOAD_MAX_SIZE', 25 * 1024 * 1024))
+    if app.config['MINIO_URL']:
+        # MINIO_URL may be "host:port" (TLS) or carry an http:// or https:// scheme
+        minio_url = urlsplit(app.config['MINIO_URL'] if '://' in app.config['MINIO_URL'] else f"https://{app.config['MINIO_URL']}")
+        app.extensions['minio'] = Minio(
+            minio_url.netloc,
+            access_key=app.config['MINIO_ACCESS_KEY'],
+            secret_key=app.config['MINIO_SECRET_KEY'],
+            secure=minio_url.scheme == 'https',
+            region=app.config['MINIO_REGION'],
+        )
 
 
     # Initialize CSRF protection
     #csrf = CSRFProtect(app)
 
+    @app.after_request
+    def mark_stale(response):
+        # Pages rendered from cached data NocoDB could not refresh in time (see noco._fresh_or_stale)
+        if g.get('served_stale'):
+            response.headers['Warning'] = '110 - "Response is Stale"'
+        return response
+
     # Register all blueprints
     from app.blueprints.menu.routes import menu
     from app.blueprints.ideas.routes import ideas
+    from app.blueprints.ops.routes import ops
+    from app.blueprints.webhooks.routes import webhooks
+    from app.blueprints.planner.routes import planner
 
     app.register_blueprint(menu, url_prefix='/')  # Home page
     app.register_blueprint(ideas, url_prefix='/ideas')  # Ideas page
+    app.register_blueprint(ops, url_prefix='/ops')  # Runtime statistics
+    app.register_blueprint(webhooks, url_prefix='/webhooks')  # NocoDB record change notifications
+    app.register_blueprint(planner, url_prefix='/planner')  # Weekly menus
+
+    # Job workers start with the first request a process serves, so the debug reloader's parent
+    # and `flask` CLI commands never run jobs (a command that needs them starts them itself)
+    @app.before_request
+    def start_job_workers():
+        if not app.extensions['jobs'].started:
+            app.extensions['jobs'].start()
+    if 'mirror' in app.extensions:
+        app.extensions['mirror'].start()
 
     return app
\ No newline at end of file
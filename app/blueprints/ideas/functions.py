@@ -0,0 +1,106 @@
+from app import noco
+
+# Idea columns copied onto the recipe an idea is promoted to
+PROMOTED_FIELDS = ('Title', 'Meal', 'Core', 'Source', 'Notes')
+
+
+def promote_ideas(idea_ids, ideas_table_id, recipes_table_id):
+    """
+    Turn ideas into recipes: one bulk insert into the recipes table, then one
+    bulk delete from the ideas table, however many ideas are selected.
+
+    Recipes are created before ideas are deleted, so a failure never loses
+    an idea. When the delete fails, the recipes of the ideas that are still
+    there are deleted again (a compensating rollback, see
+    reconcile_failed_delete) so no idea ends up in both tables; only if
+    that rollback fails too are duplicates left behind, and they are
+    reported.
+
+    Returns one {"id", "title", "ok", "recipe_id", "error"} result per requested
+    idea, in request order.
+    """
+    idea_ids = list(dict.fromkeys(int(idea_id) for idea_id in idea_ids))
+    results = {idea_id: {"id": idea_id, "title": None, "ok": False, "recipe_id": None, "error": None} for idea_id in idea_ids}
+
+    def fail(ids, error):
+        for idea_id in ids:
+            results[idea_id]["error"] = error
+        return list(results.values())
+
+    # Step 1: read the selected ideas in one filtered request
+    try:
+        found = noco.fetch_records(ideas_table_id, idea_ids)
+    except noco.NocoDBError as e:
+        return fail(idea_ids, f"Failed to fetch the ideas: {e}")
+    fail([idea_id for idea_id in idea_ids if idea_id not in found], "Idea not found")
+    for idea_id, idea in found.items():
+        results[idea_id]["title"] = idea.get("Title")
+    promoted = [idea_id for idea_id in idea_ids if idea_id in found]
+    if not promoted:
+        return list(results.values())
+
+    # Step 2: bulk insert the recipes; nothing has changed yet when this fails
+    rows = [{field: found[idea_id].get(field) for field in PROMOTED_FIELDS} for idea_id in promoted]
+    try:
+        created = noco.create_records(recipes_table_id, rows)
+    except noco.NocoDBError as e:
+        return fail(promoted, f"Failed to create the recipes: {e}")
+    recipe_ids = [record["Id"] for record in created]
+
+    # Step 3: bulk delete the ideas, undoing step 2 for the ideas still there when that fails
+    try:
+        noco.delete_records(ideas_table_id, promoted)
+    except noco.NocoDBError as e:
+        return reconcile_failed_delete(results, promoted, recipe_ids, ideas_table_id, recipes_table_id, e)
+
+    for idea_id, recipe_id in zip(promoted, recipe_ids):
+        results[idea_id].update(ok=True, recipe_id=recipe_id)
+    print(f"Promoted ideas {promoted} to recipes {recipe_ids}")
+    return list(results.values())
+
+
+def reconcile_failed_delete(results, promoted, recipe_ids, ideas_table_id, recipes_table_id, error):
+    """
+    Settle a bulk idea delete that raised: a timeout or a partly applied
+    delete may still have removed some or all of the ideas.
+
+    The ideas are read again; recipes are only rolled back for the ideas
+    that still exist, the others count as promoted. When the ideas cannot be
+    read either, nothing is rolled back (a duplicate is better than losing
+    both the idea and its recipe) and the recipes are reported.
+    """
+    try:
+        remaining = noco.fetch_records(ideas_table_id, promoted)
+    except noco.NocoDBError as read_error:
+        print(f"Could not check ideas {promoted} after a failed delete, kept recipes {recipe_ids}: {read_error}")
+        for idea_id, recipe_id in zip(promoted, recipe_ids):
+            results[idea_id].update(recipe_id=recipe_id, error=(
+                f"Failed to delete the idea ({error}); its new recipe was kept, check for a duplicate"
+            ))
+        return list(results.values())
+
+    # Ideas already gone were deleted despite the error: drop them from the cache and listeners too
+    for idea_id, recipe_id in zip(promoted, recipe_ids):
+        if idea_id not in remaining:
+            noco.get_cache().invalidate_record(ideas_table_id, idea_id)
+            noco.notify_record_change(ideas_table_id, idea_id, None)
+            results[idea_id].update(ok=True, recipe_id=recipe_id)
+
+    rollback = [(idea_id, recipe_id) for idea_id, recipe_id in zip(promoted, recipe_ids) if idea_id in remaining]
+    if rollback:
+        try:
+            noco.delete_records(recipes_table_id, [recipe_id for _, recipe_id in rollback])
+        except noco.NocoDBError as rollback_error:
+            print(f"Rollback of promoted ideas {rollback} failed, the recipes are duplicates: {rollback_error}")
+            for idea_id, recipe_id in rollback:
+                results[idea_id].update(recipe_id=recipe_id, error=(
+                    f"Failed to delete the idea ({error}) and to remove its new recipe ({rollback_error})"
+                ))
+        else:
+            for idea_id, _ in rollback:
+                results[idea_id]["error"] = f"Failed to delete the idea, nothing was changed: {error}"
+
+    promoted_now = [idea_id for idea_id in promoted if results[idea_id]["ok"]]
+    if promoted_now:
+        print(f"Promoted ideas {promoted_now} despite a failed delete: {error}")
+    return list(results.values())
@@ -1,5 +1,18 @@
+# Marks a lazy field that was not part of the fetched columns
+_NOT_LOADED = object()
+
+
 class Ideas:
-    def __init__(self, Id, Title, Meal, Core, Source, Notes):
+    # Columns rendered by the ideas grid (and UpdatedAt, which versions their ETags); list and search paths only fetch these
+    LIST_FIELDS = ('Id', 'Title', 'Meal', 'Core', 'Source', 'UpdatedAt')
+    # Columns left out of list fetches and loaded on first access
+    LAZY_FIELDS = ('Notes',)
+    # Columns of an idea export
+    EXPORT_FIELDS = ('Id', 'Title', 'Meal', 'Core', 'Source', 'Notes')
+
+    __slots__ = ('Id', 'Title', 'Meal', 'Core', 'Source', 'Notes', '_loader')
+
+    def __init__(self, Id, Title, Meal, Core, Source, Notes=_NOT_LOADED, loader=None):
         
         # Title attributes
         self.Title = Title
@@ -16,11 +29,18 @@ class Ideas:
         # Source attributes
         self.Source = Source
 
-        # Notes attributes
-        self.Notes = Notes
+        # Notes attributes. When they were not fetched, they stay unset and
+        # `loader(Id)` fetches the full record on first access
+        self._loader = loader
+        if Notes is not _NOT_LOADED or loader is None:
+            self.Notes = None if Notes is _NOT_LOADED else Notes
 
-
-        
+    def __getattr__(self, name):
+        # Only called for unset slots, i.e. lazy fields that were not fetched
+        if name not in Ideas.LAZY_FIELDS or self._loader is None:
+            raise AttributeError(name)
+        self.Notes = self._loader(self.Id).get('Notes')
+        return self.Notes
 
     def __repr__(self):
         return f'<Idea {self.Title}>'
@@ -39,13 +59,20 @@ class Ideas:
         }
 
     @classmethod
-    def from_api_data(cls, data):
-        """Class method to create an instance from API data."""
+    def from_api_data(cls, data, loader=None):
+        """
+        Class method to create an instance from API data.
+
+        Notes missing from `data` (a projected list row) are loaded through
+        `loader(Id)` when first accessed, or default to '-' without a loader.
+        """
+        lazy = {field: data.get(field, '-') for field in cls.LAZY_FIELDS if field in data or loader is None}
         return cls(
             Id=data.get('Id', '-'),
             Title=data.get('Title', '-'),
             Meal=data.get('Meal', '-'),
             Core=data.get('Core', '-'),
             Source=data.get('Source', '-'),
-            Notes=data.get('Notes', '-')
-        )
\ No newline at end of file
+            loader=loader,
+            **lazy
+        )
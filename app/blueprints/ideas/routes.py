@@ -1,10 +1,14 @@
-from flask import request, render_template, redirect, url_for, Blueprint  # noqa: F401
-import requests
+from flask import request, current_app, render_template, redirect, url_for, Blueprint  # noqa: F401
 from flask import jsonify
 import os
 from dotenv import load_dotenv
 
 from app.blueprints.ideas.models import Ideas
+from app.blueprints.ideas.functions import promote_ideas
+from app import noco
+from app.search_index import search_records, search_version, paginate
+from app.fragments import cached_fragment, rows_version, table_version
+from app.blueprints.menu.routes import export_response, NOCO_DB_TABLE_ID as RECIPES_TABLE_ID
 
 # Define a base URL and API token for NocoDB
 # Load the .env file
@@ -14,39 +18,25 @@ NOCO_DB_BASE_URL = os.getenv("NOCO_DB_BASE_URL")
 NOCO_DB_TABLE_ID = os.getenv("NOCO_DB_IDEAS_TABLE_ID")  
 NOCO_DB_API_TOKEN = os.getenv("NOCO_DB_API_TOKEN")  
 
-headers = {
-    "xc-token": NOCO_DB_API_TOKEN
-}
-
 ideas = Blueprint("ideas", __name__, template_folder='templates') 
 
 def get_idea_by_id(idea_id):
-    """Fetch a recipe by ID from the NoCoDB API."""
-    # Use the table ID in the URL
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records/{idea_id}"
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        data = response.json()
-        return Ideas.from_api_data(data)
-    else:
-        print(f"Failed to fetch recipe with ID {idea_id}: {response.status_code}")
+    """Fetch a recipe by ID from the NoCoDB API (or the record cache)."""
+    try:
+        data = noco.get_record(NOCO_DB_TABLE_ID, idea_id)
+    except noco.NocoDBError as e:
+        print(f"Failed to fetch recipe with ID {idea_id}: {e.status_code}")
         return None
+    return Ideas.from_api_data(data)
+
+def load_idea(idea_id):
+    """Full record loader for the lazy fields of ideas built from projected list rows."""
+    return noco.get_record(NOCO_DB_TABLE_ID, idea_id)
 
 @ideas.route('/')
 def index():
-    # Make a request to NocoDB to get all recipes
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records"
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        # Convert API data to NoCoShop instances
-        data = response.json().get("list", [])
-        ideas = [Ideas.from_api_data(item) for item in data]
-        return render_template('ideas/index.html', ideas=ideas)
-    else:
-        print(jsonify({"error": "Failed to retrieve recipes", "status_code": response.status_code}), response.status_code)
-        return render_template('/index.html')
+    # The ideas grid is filled page by page by htmx calls to ideas.search
+    return cached_fragment(lambda: render_template('ideas/index.html'), 'shell')
 
 @ideas.route('/add_idea', methods=['GET','POST'])
 def add_idea():
@@ -71,119 +61,82 @@ def save_new_idea():
     }
 
     # Make the API request to NoCoDB to create a new record
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records"
-    headers_with_content_type = {**headers, "Content-Type": "application/json"}
-    response = requests.post(url, headers=headers_with_content_type, json=payload)
-
-    if response.status_code == 200:
-        print("Idea uploaded successfully.")
-        # Optionally redirect or render the index page with updated data
-        return redirect(url_for('ideas.index'))
-    else:
-        print(f"Failed to upload idea: {response.status_code} - {response.text}")
+    try:
+        noco.create_record(NOCO_DB_TABLE_ID, payload)
+    except noco.NocoDBError as e:
         # Render the add_idea template with an error message
-        return render_template('ideas/add_idea.html', error="Failed to save the idea. Please try again.")
+        return render_template('ideas/add_idea.html', error=f"Failed to save the idea ({e}). Please try again.")
+
+    print("Idea uploaded successfully.")
+    # Optionally redirect or render the index page with updated data
+    return redirect(url_for('ideas.index'))
     
 @ideas.route('/search', methods=['GET', 'POST'])
 def search():
     # Get the 'search' query parameter from the request, split by whitespace to get each word
     query = request.args.get('idea-search', '').strip()
     words = query.lower().split()  # Split by space and convert to lowercase for case-insensitive search
-    
-    # Fetch all recipes from NoCo DB (you may later optimize this if NoCo supports more advanced filtering)
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records"
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        data = response.json().get("list", [])
-        ideas = [Ideas.from_api_data(item) for item in data]
-        
-        # Filter recipes: check if any word is in any relevant field
-        if words:
-            idea_results = [
-                idea for idea in ideas if all(
-                    word in (idea.Title or '').lower() or
-                    word in (idea.Meal or '').lower() or
-                    word in (idea.Core or '').lower() or
-                    word in (idea.Source or '').lower()
-                    for word in words
-                )
-            ]
-        else:
-            idea_results = ideas  # No search query, return all recipes
-
-        return render_template('ideas/search.html', idea_results=idea_results)
-    else:
-        return jsonify({"error": "Failed to retrieve ideas", "status_code": response.status_code}), response.status_code
+    page = request.args.get('page', 1, type=int)
+
+    # Ideas containing every word in Title/Meal/Core/Source, title matches first,
+    # answered by the configured search engine (in-memory index or NoCo DB filtering)
+    try:
+        version = search_version(NOCO_DB_TABLE_ID, Ideas.LIST_FIELDS)
+        found = search_records(NOCO_DB_TABLE_ID, words, Ideas.LIST_FIELDS)
+    except noco.NocoDBError as e:
+        return jsonify({"error": "Failed to retrieve ideas", "status_code": e.status_code}), e.status_code
+
+    # Only render the requested page; the last card of a page loads the next one when revealed
+    results, has_more = paginate(found, page, current_app.config['SEARCH_PAGE_SIZE'])
+
+    def render():
+        idea_results = [Ideas.from_api_data(item, loader=load_idea) for item in results]
+        next_url = url_for('ideas.search', page=page + 1, **{'idea-search': query}) if has_more else None
+
+        return render_template('ideas/search.html', idea_results=idea_results, next_url=next_url)
+
+    # Identical searches over unchanged records are answered with 304 or from the fragment cache
+    if version is not None:
+        version = [table_version(NOCO_DB_TABLE_ID), version, rows_version(results)]
+    return cached_fragment(render, version, query, page)
     
 @ideas.route('/delete/<int:idea_id>', methods=['DELETE'])
 def delete_idea(idea_id):
-    # Prepare the payload as an array with a single object containing the Id
-    payload = [{"Id": idea_id}]
-    
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records"
-    headers_with_content_type = {**headers, "Content-Type": "application/json"}
-    
-    response = requests.delete(url, headers=headers_with_content_type, json=payload)
-
-    if response.status_code == 200:
-        # Return JavaScript to reload the page
-        return """
-            <script>
-                window.location.reload();
-            </script>
-        """, 200  # 200 OK response with JavaScript to reload the page
-    
-    
-    else:
-        print(f"Failed to delete idea: {response.status_code} - {response.text}")  # Debug info
-        return "Failed to delete idea", 500
+    # Delete the idea (this also drops it from the record cache)
+    try:
+        noco.delete_records(NOCO_DB_TABLE_ID, [idea_id])
+    except noco.NocoDBError as e:
+        return f"Failed to delete idea: {e}", e.status_code
+
+    # Return JavaScript to reload the page
+    return """
+        <script>
+            window.location.reload();
+        </script>
+    """, 200  # 200 OK response with JavaScript to reload the page
 
 @ideas.route('/move_to_recipes/<int:idea_id>', methods=['POST'])
 def move_to_recipes(idea_id):
-    # Step 1: Fetch the record data from the existing NoCoDB table
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records/{idea_id}"
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code != 200:
-        print(f"Failed to fetch idea: {response.status_code} - {response.text}")
-        return jsonify({"error": "Failed to fetch the idea"}), 500
+    # Create the recipe and delete the idea, rolling the recipe back if the delete fails
+    result, = promote_ideas([idea_id], NOCO_DB_TABLE_ID, RECIPES_TABLE_ID)
+    if not result['ok']:
+        return jsonify({"error": result['error']}), 404 if result['error'] == "Idea not found" else 502
 
-    idea_data = response.json()
-
-    # Prepare the payload for creating a new record in the target NoCoDB table
-    payload = {
-        "Title": idea_data.get("Title"),
-        "Meal": idea_data.get("Meal"),
-        "Core": idea_data.get("Core"),
-        "Source": idea_data.get("Source"),
-        "Notes": idea_data.get("Notes"),
-    }
+    # Return the response with HX-Location header
+    return "", 200, {'HX-Location': url_for('menu.recipe', Id=result['recipe_id'])}
 
-    # Step 2: Create a new record in the target NoCoDB table (e.g., recipes table)
-    # Replace with the target table ID for recipes
-    recipe_table_id = "mk4go4bhd91cihe"  
-    new_url = f"{NOCO_DB_BASE_URL}/tables/{recipe_table_id}/records"
-    response = requests.post(new_url, headers=headers, json=payload)
-    
-    if response.status_code != 200:
-        print(f"Failed to create new recipe: {response.status_code} - {response.text}")
-        return jsonify({"error": "Failed to create new recipe"}), 500
 
-    new_recipe_id = response.json()["Id"]
+@ideas.route('/promote', methods=['POST'])
+def promote():
+    # Batch version of move_to_recipes for the ideas ticked in the grid; the
+    # results list says per idea whether it moved, and promoted cards are removed
+    idea_ids = request.form.getlist('idea_ids', type=int)
+    if not idea_ids:
+        return render_template('ideas/promote_results.html', results=[], error="No ideas selected")
+    results = promote_ideas(idea_ids, NOCO_DB_TABLE_ID, RECIPES_TABLE_ID)
+    return render_template('ideas/promote_results.html', results=results)
 
-    # Step 3: Delete the record from the current NoCoDB table
-    delete_payload = [{"Id": idea_id}]
-    delete_url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records"
-    delete_response = requests.delete(delete_url, headers=headers, json=delete_payload)
-    
-    if delete_response.status_code != 200:
-        print(f"Failed to delete idea: {delete_response.status_code} - {delete_response.text}")
-        return jsonify({"error": "Failed to delete the original idea"}), 500
 
-    # Generate the URL to redirect to
-    new_recipe_url = url_for('core.recipe', Id=new_recipe_id)
-    print("Redirecting to:", new_recipe_url)  # Debugging log
-
-    # Return the response with HX-Location header
-    return "", 200, {'HX-Location': new_recipe_url}
\ No newline at end of file
+@ideas.route('/export.<fmt>', methods=['GET'])
+def export_ideas(fmt):
+    return export_response(NOCO_DB_TABLE_ID, Ideas.EXPORT_FIELDS, fmt, 'ideas')
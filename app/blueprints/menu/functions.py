@@ -1,22 +1,19 @@
+import io
 import os
-import requests
 import json
+import uuid
+from datetime import timedelta
 from flask import current_app
-from icecream import ic
+from minio.error import S3Error
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 
-def make_headers(table_id):
-    headers = {
-        "xc-token": current_app['NOCO_DB_API_TOKEN']
-        }
-    ic(current_app['NOCO_DB_BASE_URL'], 
-       table_id, 
-       headers)
-    return headers
+from app import noco
+from app.edits import get_edit_coalescer
+from app.blueprints.menu.images import VARIANT_FORMATS, make_variants
 
 def update_record_with_attachment(record_id, attachment_metadata, table_id):
 
-    headers = make_headers(table_id)
     # If metadata is a list, get the first item (assuming only one attachment)
     if isinstance(attachment_metadata, list):
         attachment_metadata = attachment_metadata[0]
@@ -31,80 +28,340 @@ def update_record_with_attachment(record_id, attachment_metadata, table_id):
     }
     if "id" in attachment_metadata:
         attachment_json["id"] = attachment_metadata["id"]
-    
-    # The request URL without a specific record ID
-    url = f"{current_app['NOCO_DB_BASE_URL']}/tables/{current_app['NOCO_DB_TABLE_ID']}/records"
+    if attachment_metadata.get("url"):
+        attachment_json["url"] = attachment_metadata["url"]
+    if attachment_metadata.get("variants"):
+        attachment_json["variants"] = attachment_metadata["variants"]
     
     # Payload now includes the record ID in the body, along with the updated attachment data
     payload = {
         "Id": record_id,  # Including record ID in the payload
         "Photo": json.dumps([attachment_json])  # Assuming "Photo" is the attachment column
     }
-    headers_with_content_type = {**headers, "Content-Type": "application/json"}
 
-    # Send the PATCH request
-    response = requests.patch(url, headers=headers_with_content_type, json=payload)
-    
-    if response.status_code == 200:
-        print("Record updated successfully with attachment.")
-        return response.json()
-    else:
-        print(f"Failed to update record: {response.status_code} - {response.text}")
+    # Send the PATCH request; the cached record keeps the decoded attachment list
+    try:
+        result = noco.update_record(table_id, payload, cached_changes={"Photo": [attachment_json]})
+    except noco.NocoDBError:
+        return None
+    print("Record updated successfully with attachment.")
+    return result
+
+# Size of the blocks a photo is read and sent in, so an upload never holds more than this in memory
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Leading bytes identifying the image formats phones and browsers send
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+HEIF_BRANDS = {b"heic": "image/heic", b"heix": "image/heic", b"mif1": "image/heif", b"heif": "image/heif", b"avif": "image/avif"}
+
+
+def detect_mime_type(head, fallback="application/octet-stream"):
+    """Work out the MIME type of a file from its first bytes."""
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in HEIF_BRANDS:
+        return HEIF_BRANDS[head[8:12]]
+    return fallback
+
+
+class MultipartFileStream:
+    """
+    File-like multipart/form-data body for a NocoDB storage upload.
+
+    The form fields are encoded up front and the file part is read from the
+    source stream one chunk at a time as the HTTP connection asks for it, so
+    requests sends it with a Content-Length but never buffers the file.
+    """
+
+    def __init__(self, fields, filename, mime_type, stream, size):
+        self.boundary = f"----menus{os.urandom(16).hex()}"
+        preamble = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        )
+        preamble += (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: {mime_type}\r\n\r\n"
+        ).encode()
+        epilogue = f"\r\n--{self.boundary}--\r\n".encode()
+
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self._length = len(preamble) + size + len(epilogue)
+        self._parts = [io.BytesIO(preamble), stream, io.BytesIO(epilogue)]
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = UPLOAD_CHUNK_SIZE
+        chunk = b""
+        while self._parts and len(chunk) < size:
+            data = self._parts[0].read(size - len(chunk))
+            if not data:
+                self._parts.pop(0)
+                continue
+            chunk += data
+        return chunk
+
+
+def upload_stream_to_storage(stream, filename, table_id, mime_type=None):
+    """
+    Stream a seekable binary file object to NocoDB storage and return the attachment metadata.
+
+    The MIME type is detected from the first bytes and the size from the
+    stream itself; `mime_type` (e.g. what the browser claimed) is only used
+    when the content is not a recognised image.
+    """
+    filename = secure_filename(filename)
+    target_path = f"download/noco/{table_id}/{filename}"
+
+    start = stream.tell()
+    head = stream.read(32)
+    stream.seek(0, os.SEEK_END)
+    file_size = stream.tell() - start
+    stream.seek(start)
+    mime_type = detect_mime_type(head, mime_type or "application/octet-stream")
+
+    body = MultipartFileStream(
+        {"mimetype": mime_type, "path": target_path, "size": str(file_size), "title": filename},
+        filename, mime_type, stream, file_size,
+    )
+    try:
+        response = noco.get_client().post(
+            "storage/upload",
+            params={"path": target_path},
+            data=body,
+            headers={"Content-Type": body.content_type},
+        )
+    except noco.NocoDBError:
         return None
 
-def upload_file_to_storage(file_path, table_id):
-    target_path = f"download/noco/{table_id}/{secure_filename(os.path.basename(file_path))}"
-    url = f"{current_app['NOCO_DB_BASE_URL']}/storage/upload?path={target_path}"
-    filename = secure_filename(file_path.split("/")[-1])
-    file_size = os.path.getsize(file_path)
-    mime_type = "image/jpeg"  # Adjust MIME type as needed
-
-    headers = make_headers(table_id)
-
-    with open(file_path, 'rb') as file:
-        files = {
-            "mimetype": (None, mime_type),
-            "path": (None, target_path),
-            "size": (None, str(file_size)),
-            "title": (None, filename),
-            "file": (filename, file, mime_type)
-        }
-        response = requests.post(url, headers=headers, files=files)
-    
     if response.status_code == 200:
         print("File uploaded successfully.")
         return response.json()
     else:
         print(f"File upload failed: {response.status_code} - {response.text}")
         return None
-    
-def save_recipe(recipe, table_id):
+
+
+def upload_photo_variants(stream, filename, table_id):
     """
-    Save the updated recipe data to the NoCoDB API.
-    
-    Parameters:
-        recipe (NoCoRecipes): The recipe object containing updated data.
-    
-    Returns:
-        bool: True if the update was successful, False otherwise.
+    Generate the resized variants of a photo (see images.PHOTO_VARIANTS) and
+    upload them; returns the {name: metadata} stored with its attachment.
     """
-    # Use the table's records endpoint without specifying the ID in the URL
-    url = f"{current_app['NOCO_DB_BASE_URL']}/tables/{table_id}/records"
-    headers = {
-        "xc-token": current_app['NOCO_DB_API_TOKEN'],
-        "Content-Type": "application/json"
-    }
-    print('Saving recipe to NocoDB...')
-    # Convert the recipe object to a dictionary format and include the ID
-    data = recipe.to_dict()
-    data['Id'] = recipe.Id  # Include the ID in the request body
-    
-    # Send the PATCH request to update the recipe
-    response = requests.patch(url, headers=headers, json=data)
-    
-    if response.status_code == 200:
-        print("Recipe updated successfully.")
+    mime_type, extension = VARIANT_FORMATS[current_app.config['PHOTO_VARIANT_FORMAT']]
+    stem = os.path.splitext(secure_filename(filename))[0]
+
+    variants = {}
+    for name, (width, buffer) in make_variants(stream).items():
+        metadata = upload_stream_to_storage(buffer, f"{stem}.{name}.{extension}", table_id, mime_type=mime_type)
+        if not metadata:
+            continue
+        if isinstance(metadata, list):
+            metadata = metadata[0]
+        # Only the permanent path is kept: NocoDB re-signs the attachment's own signedPath, not nested ones
+        variants[name] = {"path": metadata.get("path"), "mimetype": mime_type, "width": width}
+    return variants
+
+
+def upload_photo_to_storage(file, table_id):
+    """
+    Upload an incoming werkzeug FileStorage straight to NocoDB storage, without saving it locally,
+    followed by its resized variants. The variants are returned with the attachment metadata.
+    """
+    attachment_metadata = upload_stream_to_storage(file.stream, file.filename, table_id, mime_type=file.mimetype)
+    if not attachment_metadata:
         return None
-    else:
-        print(f"Failed to update recipe with ID {recipe.Id}: {response.status_code} - {response.text}")
-        return None
\ No newline at end of file
+
+    file.stream.seek(0)
+    variants = upload_photo_variants(file.stream, file.filename, table_id)
+    if variants:
+        if isinstance(attachment_metadata, list):
+            attachment_metadata[0]["variants"] = variants
+        else:
+            attachment_metadata["variants"] = variants
+    return attachment_metadata
+
+
+def spool_upload(file):
+    """Copy an incoming upload into the job spool directory, where a background job (even after a restart) picks it up."""
+    path = os.path.join(current_app.config['JOBS_SPOOL_DIR'], f"{uuid.uuid4().hex}-{secure_filename(file.filename)}")
+    file.save(path)
+    return path
+
+
+def attach_photo_job(payload):
+    """
+    Background job: upload a spooled photo (and its variants) to NocoDB storage
+    and attach it to the record. Raising makes the job queue retry it.
+    """
+    with open(payload['spool_path'], 'rb') as stream:
+        file = FileStorage(stream=stream, filename=payload['filename'], content_type=payload['mimetype'])
+        attachment_metadata = upload_photo_to_storage(file, payload['table_id'])
+    if not attachment_metadata:
+        raise RuntimeError("Failed to upload to NoCoDB")
+
+    if not update_record_with_attachment(payload['record_id'], attachment_metadata, payload['table_id']):
+        raise RuntimeError("Failed to update record in NoCoDB")
+
+    os.remove(payload['spool_path'])
+    return {"record_id": payload['record_id']}
+
+
+def enqueue_photo_upload(file, record_id, table_id):
+    """Spool an uploaded photo and queue the job attaching it to `record_id`; returns the job id."""
+    from app.jobs import get_jobs
+
+    return get_jobs().enqueue('attach_photo', {
+        "record_id": record_id,
+        "table_id": table_id,
+        "spool_path": spool_upload(file),
+        "filename": file.filename,
+        "mimetype": file.mimetype,
+    })
+
+
+# Direct browser uploads to MinIO (PHOTO_UPLOAD_MODE = 'presigned')
+
+def get_minio():
+    """The MinIO client when presigned photo uploads are enabled, else None."""
+    if current_app.config['PHOTO_UPLOAD_MODE'] != 'presigned':
+        return None
+    return current_app.extensions.get('minio')
+
+
+def photo_object_prefix(record_id, table_id):
+    return f"{table_id}/{record_id}/"
+
+
+def photo_object_url(object_name):
+    """Public URL of an object in MINIO_BUCKET, which the Photo attachment stores."""
+    base = current_app.config['MINIO_PUBLIC_URL']
+    if '://' not in base:
+        base = f"https://{base}"
+    return f"{base.rstrip('/')}/{current_app.config['MINIO_BUCKET']}/{object_name}"
+
+
+def presign_photo_upload(record_id, filename, table_id):
+    """
+    Reserve an object name for a photo of `record_id` and return a presigned
+    URL the browser PUTs the file to, so the bytes never pass through Flask.
+    """
+    object_name = f"{photo_object_prefix(record_id, table_id)}{uuid.uuid4().hex}-{secure_filename(filename) or 'photo'}"
+    upload_url = get_minio().presigned_put_object(
+        current_app.config['MINIO_BUCKET'], object_name,
+        expires=timedelta(seconds=current_app.config['PHOTO_UPLOAD_EXPIRY']),
+    )
+    return {"upload_url": upload_url, "object_name": object_name}
+
+
+def confirm_photo_upload(record_id, object_name, table_id):
+    """
+    Attach a photo the browser uploaded with presign_photo_upload to the record.
+
+    The object must have been reserved for this record and exist, and is
+    checked against PHOTO_UPLOAD_MAX_SIZE (presigned PUTs cannot enforce a
+    size). Its MIME type is sniffed from the first bytes as for server
+    uploads. A 'photo_variants' job then builds the resized copies.
+
+    Returns (attachment metadata, variants job id); raises ValueError when
+    the object is not acceptable and S3Error/NocoDBError when a service fails.
+    """
+    client = get_minio()
+    bucket = current_app.config['MINIO_BUCKET']
+    if not object_name.startswith(photo_object_prefix(record_id, table_id)) or '..' in object_name:
+        raise ValueError("Photo was not uploaded for this recipe")
+    try:
+        stat = client.stat_object(bucket, object_name)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject", "ResourceNotFound"):
+            raise ValueError("Photo upload not found") from e
+        raise
+    if stat.size > current_app.config['PHOTO_UPLOAD_MAX_SIZE']:
+        client.remove_object(bucket, object_name)
+        raise ValueError("Photo is too large")
+
+    response = client.get_object(bucket, object_name, offset=0, length=32)
+    try:
+        head = response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+    filename = object_name.rsplit('/', 1)[-1].split('-', 1)[-1]
+    attachment_metadata = {
+        "url": photo_object_url(object_name),
+        "path": object_name,
+        "title": filename,
+        "mimetype": detect_mime_type(head, stat.content_type or "application/octet-stream"),
+        "size": stat.size,
+    }
+    if not update_record_with_attachment(record_id, attachment_metadata, table_id):
+        raise noco.NocoDBError("Failed to update record in NoCoDB", 502)
+
+    from app.jobs import get_jobs
+    job_id = get_jobs().enqueue('photo_variants', {
+        "record_id": record_id,
+        "table_id": table_id,
+        "attachment": attachment_metadata,
+    })
+    return attachment_metadata, job_id
+
+
+def photo_variants_job(payload):
+    """
+    Background job: build the resized variants of a photo uploaded straight
+    to MinIO, store them next to it and add them to the Photo attachment.
+    """
+    client = current_app.extensions['minio']
+    bucket = current_app.config['MINIO_BUCKET']
+    attachment = payload['attachment']
+
+    response = client.get_object(bucket, attachment['path'])
+    try:
+        original = io.BytesIO(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+
+    mime_type, extension = VARIANT_FORMATS[current_app.config['PHOTO_VARIANT_FORMAT']]
+    stem = os.path.splitext(attachment['path'])[0]
+    variants = {}
+    for name, (width, buffer) in make_variants(original).items():
+        object_name = f"{stem}.{name}.{extension}"
+        client.put_object(bucket, object_name, buffer, buffer.getbuffer().nbytes, content_type=mime_type)
+        variants[name] = {"path": object_name, "url": photo_object_url(object_name), "mimetype": mime_type, "width": width}
+    if not variants:
+        return {"record_id": payload['record_id'], "variants": 0}
+
+    if not update_record_with_attachment(payload['record_id'], {**attachment, "variants": variants}, payload['table_id']):
+        raise RuntimeError("Failed to update record in NoCoDB")
+    return {"record_id": payload['record_id'], "variants": len(variants)}
+
+
+def save_recipe_field(recipe_id, field, value, table_id):
+    """
+    Save a single edited column of a recipe without reading the record first.
+
+    Only `field` is sent, so concurrent edits to other columns are not
+    overwritten. With EDIT_COALESCE_WINDOW set, the edit is held briefly and
+    merged with other edits into one bulk PATCH.
+
+    Returns:
+        bool: False if the update failed, True otherwise.
+    """
+    try:
+        get_edit_coalescer().submit(table_id, recipe_id, {field: value})
+    except noco.NocoDBError:
+        print(f"Failed to update {field} of recipe with ID {recipe_id}")
+        return False
+    return True
@@ -0,0 +1,84 @@
+import io
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+# Resized copies generated for every recipe photo: name -> maximum width in pixels
+PHOTO_VARIANTS = {
+    "thumb": 320,
+    "card": 640,
+    "detail": 1280,
+}
+
+VARIANT_FORMATS = {
+    "WEBP": ("image/webp", "webp"),
+    "JPEG": ("image/jpeg", "jpg"),
+}
+
+
+def make_variants(stream):
+    """
+    Decode an image once and return {name: (width, encoded bytes)} for PHOTO_VARIANTS.
+
+    Variants are never upscaled, EXIF orientation is applied, and JPEG
+    sources are decoded at a reduced scale when they are much larger than the
+    biggest variant. Returns {} when the stream is not an image Pillow reads.
+    """
+    image_format = current_app.config['PHOTO_VARIANT_FORMAT']
+    quality = current_app.config['PHOTO_VARIANT_QUALITY']
+    largest = max(PHOTO_VARIANTS.values())
+
+    try:
+        image = Image.open(stream)
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, ValueError) as e:
+        print(f"Skipping photo variants, could not read image: {e}")
+        return {}
+
+    if image_format == "JPEG" or image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+
+    variants = {}
+    for name, width in sorted(PHOTO_VARIANTS.items(), key=lambda item: -item[1]):
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, image_format, quality=quality)
+        buffer.seek(0)
+        variants[name] = (resized.width, buffer)
+    return variants
+
+
+# Template filters
+
+def variant_url(variant, host):
+    """
+    URL of a photo variant, built at render time: its MinIO URL, or its
+    permanent NocoDB storage path. A signedPath stored inside the Photo JSON
+    is never used, since NocoDB only re-signs the attachment itself.
+    """
+    if variant.get("url"):
+        return variant["url"]
+    return f"{host.rstrip('/')}/{variant.get('path') or variant.get('signedPath')}"
+
+
+def photo_src(photo, host, variant=None):
+    """URL of a Photo attachment, or of one of its variants when it has been generated."""
+    variants = photo.get("variants") or {}
+    if variants.get(variant):
+        return variant_url(variants[variant], host)
+    # Photos uploaded straight to MinIO carry a full URL instead of a NocoDB signedPath
+    if photo.get("url"):
+        return photo["url"]
+    return f"{host.rstrip('/')}/{photo.get('signedPath')}"
+
+
+def photo_srcset(photo, host):
+    """srcset listing every generated variant of a Photo attachment ('' when there are none)."""
+    variants = photo.get("variants") or {}
+    return ", ".join(
+        f"{variant_url(variant, host)} {variant['width']}w"
+        for variant in sorted(variants.values(), key=lambda variant: variant["width"])
+    )
@@ -1,38 +1,72 @@
+# Marks a lazy field that was not part of the fetched columns
+_NOT_LOADED = object()
+
+
+def _is_set(obj, name):
+    """True when the slot `name` holds a value (without triggering lazy loading)."""
+    try:
+        object.__getattribute__(obj, name)
+    except AttributeError:
+        return False
+    return True
+
+
 class NoCoRecipes:
-    def __init__(self, Id, Meal, Core, Title, LeftOvers=None, Source=None, Photo=None, Notes=None, Ingredients=None, Method=None):
+    # Columns rendered by the recipe grid (and UpdatedAt, which versions their ETags); list and search paths only fetch these
+    LIST_FIELDS = ('Id', 'Title', 'Meal', 'Core', 'Source', 'Photo', 'UpdatedAt')
+    # Columns left out of list fetches and loaded on first access
+    LAZY_FIELDS = ('LeftOvers', 'Notes', 'Ingredients', 'Method')
+    # Columns the inline editors may write
+    EDITABLE_FIELDS = ('Title', 'Meal', 'Core', 'Source', 'LeftOvers', 'Notes', 'Ingredients', 'Method')
+
+    __slots__ = ('Id', 'Meal', 'Core', 'Title', 'LeftOvers', 'Source', 'Photo', 'Notes', 'Ingredients', 'Method', '_loader')
+
+    def __init__(self, Id, Meal, Core, Title, LeftOvers=_NOT_LOADED, Source=None, Photo=None, Notes=_NOT_LOADED,
+                 Ingredients=_NOT_LOADED, Method=_NOT_LOADED, loader=None):
         # Original fields for reference (can be removed if unnecessary)
         self.Id = Id
-        
+
         # Meal attributes
         self.Meal = Meal
 
         # Title attributes
         self.Title = Title
-        
+
         # Core attributes
         self.Core = Core or {}  # Placeholder for Core fields
 
-        # Leftovers attributes
-        self.LeftOvers = LeftOvers or {}  # Placeholder for Leftover fields
-        
         # Source attributes
         self.Source = Source
 
         # Photo attributes
         self.Photo = Photo
 
-        # Notes attributes
-        self.Notes = Notes
+        # Leftovers, Notes, Ingredients and Method attributes. When they were not
+        # fetched, they stay unset and `loader(Id)` fetches the full record on first access
+        self._loader = loader
+        for name, value in (('LeftOvers', LeftOvers), ('Notes', Notes), ('Ingredients', Ingredients), ('Method', Method)):
+            if value is _NOT_LOADED and loader is not None:
+                continue
+            self._set_lazy(name, None if value is _NOT_LOADED else value)
 
-        # Ingredients attributes
-        self.Ingredients = Ingredients
+    def _set_lazy(self, name, value):
+        if name == 'LeftOvers':
+            value = value or {}  # Placeholder for Leftover fields
+        setattr(self, name, value)
 
-        # Method attributes
-        self.Method = Method
+    def __getattr__(self, name):
+        # Only called for unset slots, i.e. lazy fields that were not fetched
+        if name not in NoCoRecipes.LAZY_FIELDS or self._loader is None:
+            raise AttributeError(name)
+        data = self._loader(self.Id)
+        for field in NoCoRecipes.LAZY_FIELDS:
+            if not _is_set(self, field):
+                self._set_lazy(field, data.get(field))
+        return object.__getattribute__(self, name)
 
     def __repr__(self):
         return f'<Recipe {self.Title}>'
-    
+
     def get_id(self):
         return self.Id
 
@@ -51,18 +85,21 @@ class NoCoRecipes:
         }
 
     @classmethod
-    def from_api_data(cls, data):
-        """Class method to create an instance from API data."""
+    def from_api_data(cls, data, loader=None):
+        """
+        Class method to create an instance from API data.
+
+        Lazy fields missing from `data` (a projected list row) are loaded
+        through `loader(Id)` when first accessed, or are None without a loader.
+        """
+        lazy = {field: data[field] for field in cls.LAZY_FIELDS if field in data}
         return cls(
             Id=data.get('Id', 'Unknown'),
             Meal=data.get('Meal', 'Unknown'),
             Core=data.get('Core', {}),
             Title=data.get('Title', 'Untitled'),
-            LeftOvers=data.get('LeftOvers', {}),
             Source=data.get('Source', 'Unknown'),
             Photo=data.get('Photo', None),
-            Notes=data.get('Notes', None),
-            Ingredients=data.get('Ingredients', None),
-            Method=data.get('Method', None)
+            loader=loader,
+            **lazy
         )
-
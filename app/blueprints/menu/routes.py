@@ -1,18 +1,37 @@
 from flask import request, current_app, render_template, Blueprint  # noqa: F401
-import requests
-from flask import jsonify, url_for, redirect
+from flask import jsonify, url_for, redirect, Response, stream_with_context
+import io
 import os
+import time
+import uuid
+import click
+from werkzeug.utils import secure_filename
+from minio.error import S3Error
 from dotenv import load_dotenv
 import json
-import markdown2
 from flask_ckeditor.utils import cleanify
-from app.blueprints.menu.functions import update_record_with_attachment, save_recipe, upload_file_to_storage
-from werkzeug.utils import secure_filename
+from app.blueprints.menu.functions import update_record_with_attachment, save_recipe_field, upload_photo_variants
+from app.blueprints.menu.functions import attach_photo_job, enqueue_photo_upload
+from app.blueprints.menu.functions import get_minio, presign_photo_upload, confirm_photo_upload, photo_variants_job
+from app.jobs import get_jobs
+from app.edits import get_edit_coalescer
+from app.blueprints.menu.images import photo_src, photo_srcset
+from app import noco
+from app.search_index import search_records, search_version, paginate
+from app.fragments import cached_fragment, rows_version, table_version
+from app.markdown_cache import render_markdown
+from app.related import get_related_index
+from app.ingredients import get_ingredient_index, merge_ingredients
+from app import transfer
 
 from app.blueprints.menu.models import NoCoRecipes
-from icecream import ic
 
 menu = Blueprint("menu", __name__, template_folder='templates')
+menu.add_app_template_filter(photo_src)
+menu.add_app_template_filter(photo_srcset)
+menu.record_once(lambda state: state.app.extensions['jobs'].register('attach_photo', attach_photo_job))
+menu.record_once(lambda state: state.app.extensions['jobs'].register('import_recipes', transfer.import_recipes_job))
+menu.record_once(lambda state: state.app.extensions['jobs'].register('photo_variants', photo_variants_job))
  
 
 # Define a base URL and API token for NocoDB
@@ -23,23 +42,18 @@ NOCO_DB_BASE_URL = os.getenv("NOCO_DB_BASE_URL")
 NOCO_DB_TABLE_ID = 'mk4go4bhd91cihe'  
 NOCO_DB_API_TOKEN = os.getenv("NOCO_DB_API_TOKEN")  
 
-headers = {
-    "xc-token": NOCO_DB_API_TOKEN
-}
-ic(NOCO_DB_BASE_URL, NOCO_DB_TABLE_ID, NOCO_DB_API_TOKEN, headers)
-
 def get_recipe_by_id(recipe_id):
-    """Fetch a recipe by ID from the NoCoDB API."""
-    # Use the table ID in the URL
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records/{recipe_id}"
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        data = response.json()
-        return NoCoRecipes.from_api_data(data)
-    else:
-        print(f"Failed to fetch recipe with ID {recipe_id}: {response.status_code}")
+    """Fetch a recipe by ID from the NoCoDB API (or the record cache), including edits not yet flushed."""
+    try:
+        data = noco.get_record_with_pending(NOCO_DB_TABLE_ID, recipe_id)
+    except noco.NocoDBError as e:
+        print(f"Failed to fetch recipe with ID {recipe_id}: {e.status_code}")
         return None
+    return NoCoRecipes.from_api_data(data)
+
+def load_recipe(recipe_id):
+    """Full record loader for the lazy fields of recipes built from projected list rows."""
+    return noco.get_record(NOCO_DB_TABLE_ID, recipe_id)
 
 
 
@@ -48,18 +62,8 @@ def get_recipe_by_id(recipe_id):
 
 @menu.route('/')
 def index():
-    # Make a request to NocoDB to get all recipes
-    url = ic(f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records")
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        # Convert API data to NoCoShop instances
-        data = response.json().get("list", [])
-        recipes = [NoCoRecipes.from_api_data(item) for item in data]
-        return render_template('menu/index.html', recipes=recipes)
-    else:
-        ic(url, response)
-        return jsonify({"error": "Failed to retrieve recipes", "status_code": response.status_code}), response.status_code
+    # The recipe grid is filled page by page by htmx calls to menu.search
+    return cached_fragment(lambda: render_template('menu/index.html'), 'shell')
     
 
 @menu.route('/search', methods=['GET', 'POST'])
@@ -67,54 +71,132 @@ def search():
     # Get the 'search' query parameter from the request, split by whitespace to get each word
     query = request.args.get('search', '').strip()
     words = query.lower().split()  # Split by space and convert to lowercase for case-insensitive search
-    
-    # Fetch all recipes from NoCo DB (you may later optimize this if NoCo supports more advanced filtering)
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records"
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        data = response.json().get("list", [])
-        recipes_data = [NoCoRecipes.from_api_data(item) for item in data]
-        
-        # Filter recipes: check if any word is in any relevant field
-        if words:
-            recipes = [
-                recipe for recipe in recipes_data if all(
-                    word in (recipe.Title or '').lower() or
-                    word in (recipe.Meal or '').lower() or
-                    word in (recipe.Core or '').lower() or
-                    word in (recipe.Source or '').lower()
-                    for word in words
-                )
-            ]
-        else:
-            recipes = recipes_data  # No search query, return all recipes
-
-        return render_template('menu/search.html', recipes=recipes, noco_db_url = NOCO_DB_BASE_URL)
-    else:
-        return jsonify({"error": "Failed to retrieve recipes", "status_code": response.status_code}), response.status_code
+    page = request.args.get('page', 1, type=int)
+
+    # Recipes containing every word in Title/Meal/Core/Source, title matches first,
+    # answered by the configured search engine (in-memory index or NoCo DB filtering)
+    try:
+        version = search_version(NOCO_DB_TABLE_ID, NoCoRecipes.LIST_FIELDS)
+        found = search_records(NOCO_DB_TABLE_ID, words, NoCoRecipes.LIST_FIELDS)
+    except noco.NocoDBError as e:
+        return jsonify({"error": "Failed to retrieve recipes", "status_code": e.status_code}), e.status_code
+
+    # Only render the requested page; the last card of a page loads the next one when revealed
+    results, has_more = paginate(found, page, current_app.config['SEARCH_PAGE_SIZE'])
+
+    def render():
+        recipes = [NoCoRecipes.from_api_data(item, loader=load_recipe) for item in results]
+        next_url = url_for('menu.search', search=query, page=page + 1) if has_more else None
+
+        return render_template('menu/search.html', recipes=recipes, next_url=next_url, noco_db_url = NOCO_DB_BASE_URL)
+
+    # Identical searches over unchanged records are answered with 304 or from the fragment cache
+    if version is not None:
+        version = [table_version(NOCO_DB_TABLE_ID), version, rows_version(results)]
+    return cached_fragment(render, version, query, page)
 
 @menu.route('/recipe/<int:Id>')
 def recipe(Id):
-    # Make a request to NocoDB to get the specific recipe by Id
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records/{Id}"
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
+    # Get the specific recipe by Id from NocoDB (or the record cache), with edits not yet flushed
+    try:
+        data = noco.get_record_with_pending(NOCO_DB_TABLE_ID, Id)
+    except noco.NocoDBError as e:
+        return jsonify({"error": "Failed to retrieve recipe", "status_code": e.status_code}), e.status_code
+
+    # A photo upload still being processed in the background is shown as a polling placeholder
+    photo_job = None
+    if request.args.get('photo_job'):
+        photo_job = get_jobs().get(request.args['photo_job'])
+        if photo_job and photo_job['status'] == 'done':
+            photo_job = None
+
+    def render():
         # Convert API data to a NoCoRecipe instance (or NoCoRecipe if different)
-        data = response.json()
         recipe = NoCoRecipes.from_api_data(data)
-        if recipe.Ingredients:
-            ingredients_html = markdown2.markdown(recipe.Ingredients)
-        else:
-            ingredients_html = ""
-        if recipe.Method:
-            method_html = markdown2.markdown(recipe.Method)
-        else:
-            method_html = ""
-        return render_template('menu/recipe.html', recipe=recipe, ingredients_html=ingredients_html, method_html=method_html)
-    else:
-        return jsonify({"error": "Failed to retrieve recipe", "status_code": response.status_code}), response.status_code
+        # Markdown is rendered when it is saved; views are served from the rendered-HTML cache
+        ingredients_html = render_markdown(recipe.Ingredients)
+        method_html = render_markdown(recipe.Method)
+        return render_template('menu/recipe.html', recipe=recipe, ingredients_html=ingredients_html,
+                               method_html=method_html, photo_job=photo_job)
+
+    # The page only changes with the record (its UpdatedAt and values) and the photo job
+    return cached_fragment(render, data, photo_job)
+
+
+@menu.route('/recipe/<int:Id>/related')
+def related_recipes(Id):
+    # Loaded by the recipe page after it renders; neighbours are precomputed, so this is a lookup
+    try:
+        index = get_related_index(NOCO_DB_TABLE_ID, NoCoRecipes.LIST_FIELDS)
+    except noco.NocoDBError as e:
+        return jsonify({"error": "Failed to find related recipes", "status_code": e.status_code}), e.status_code
+
+    rows = index.related(Id)
+
+    def render():
+        related = [NoCoRecipes.from_api_data(row) for row in rows]
+        return render_template('menu/related.html', related=related)
+
+    return cached_fragment(render, [table_version(NOCO_DB_TABLE_ID), index.version, index.built_at, rows_version(rows)],
+                           Id)
+
+
+@menu.route('/pantry')
+def pantry():
+    return render_template('menu/pantry.html', have=request.args.get('have', ''))
+
+
+@menu.route('/pantry/search')
+def pantry_search():
+    # Recipes using what is on hand (comma separated items), answered from the ingredient index
+    have = [term.strip() for term in request.args.get('have', '').split(',') if term.strip()]
+    try:
+        index = get_ingredient_index(NOCO_DB_TABLE_ID, NoCoRecipes.LIST_FIELDS)
+    except noco.NocoDBError as e:
+        return jsonify({"error": "Failed to find recipes", "status_code": e.status_code}), e.status_code
+
+    found = index.recipes_using(have, limit=current_app.config['SEARCH_PAGE_SIZE'])
+
+    def render():
+        matches = [{**match, "recipe": NoCoRecipes.from_api_data(match["recipe"])} for match in found]
+        return render_template('menu/pantry_results.html', matches=matches, have=have)
+
+    version = [table_version(NOCO_DB_TABLE_ID), index.version, index.built_at,
+               rows_version(match["recipe"] for match in found)]
+    return cached_fragment(render, version, sorted(term.lower() for term in have))
+
+
+def shopping_list_for(recipe_ids):
+    """Recipes (index rows) and their merged shopping list; ingredients come parsed from the index."""
+    index = get_ingredient_index(NOCO_DB_TABLE_ID, NoCoRecipes.LIST_FIELDS)
+    recipes = [row for row in map(index.row, recipe_ids) if row is not None]
+    return recipes, merge_ingredients(index.ingredients(recipe_id) for recipe_id in recipe_ids)
+
+
+def shopping_list_ids():
+    # ?ids=1&ids=2 (or ids=1,2); a recipe listed twice is bought for twice
+    return [int(value) for values in request.args.getlist('ids') for value in values.split(',') if value.strip().isdigit()]
+
+
+@menu.route('/shopping_list')
+def shopping_list():
+    recipe_ids = shopping_list_ids()
+    try:
+        recipes, items = shopping_list_for(recipe_ids)
+    except noco.NocoDBError as e:
+        return jsonify({"error": "Failed to build the shopping list", "status_code": e.status_code}), e.status_code
+    return render_template('menu/shopping_list.html', recipes=[NoCoRecipes.from_api_data(row) for row in recipes],
+                           items=items)
+
+
+@menu.route('/shopping_list.json')
+def shopping_list_json():
+    recipe_ids = shopping_list_ids()
+    try:
+        recipes, items = shopping_list_for(recipe_ids)
+    except noco.NocoDBError as e:
+        return jsonify({"error": "Failed to build the shopping list", "status_code": e.status_code}), e.status_code
+    return jsonify({"recipes": [row["Id"] for row in recipes], "items": items})
 
 
 @menu.route('/edit_field/<int:recipe_id>/<field>', methods=['GET'])
@@ -122,9 +204,7 @@ def edit_field(recipe_id, field):
     # Retrieve the recipe based on `recipe_id`
     
     recipe = get_recipe_by_id(recipe_id)  
-    print(recipe)
     current_value = getattr(recipe, field, "")
-    print(current_value)
     
     # Render the editable field template with an input field
     return render_template('menu/editable_field.html', field=field, recipe_id=recipe_id, current_value=current_value)
@@ -133,9 +213,7 @@ def edit_field(recipe_id, field):
 def edit_rich_field(recipe_id, field):
     # Retrieve the recipe based on `recipe_id`
     recipe = get_recipe_by_id(recipe_id)  
-    print(recipe)
     current_value = getattr(recipe, field, "")
-    print(current_value)
     
     # Render the editable field template with an input field
     return render_template('menu/editable_rich_field.html', field=field, recipe_id=recipe_id, current_value=current_value)
@@ -145,29 +223,42 @@ def edit_rich_field(recipe_id, field):
 def update_field(recipe_id, field):
     # Get the new value from the POST request
     new_value = request.form['value']
-    
-    # Retrieve and update the recipe in the database
-    recipe = get_recipe_by_id(recipe_id)  # Replace with your own function to fetch the recipe
-    setattr(recipe, field, new_value)  # Update the field
-    save_recipe(recipe)  # Save the updated recipe to the database/API
+    if field not in NoCoRecipes.EDITABLE_FIELDS:
+        return f"Field {field} cannot be edited", 400
+
+    # Send only the edited column to the database/API
+    if not save_recipe_field(recipe_id, field, new_value, NOCO_DB_TABLE_ID):
+        return "Could not save the change: NocoDB is unavailable, please try again shortly", 503
 
-    # Return the display field after updating
-    return render_template('menu/display_field.html', field=field, value=new_value, recipe_id=recipe_id)
+    # Return the display field after updating; a coalesced edit not sent yet is 202 and shows its save status
+    status = save_status(recipe_id, field)
+    return render_template('menu/display_field.html', field=field, value=new_value, recipe_id=recipe_id,
+                           save_status=status), 202 if status else 200
 
 @menu.route('/update_rich_field/<int:recipe_id>/<field>', methods=['POST'])
 def update_rich_field(recipe_id, field):
     # Get the new value from the POST request
     new_value = cleanify(request.form['value'])
-    
-    # Retrieve and update the recipe in the database
-    recipe = get_recipe_by_id(recipe_id)  # Replace with your own function to fetch the recipe
-    setattr(recipe, field, request.form['value'])  # Update the field
-    save_recipe(recipe)  # Save the updated recipe to the database/API
+    if field not in NoCoRecipes.EDITABLE_FIELDS:
+        return f"Field {field} cannot be edited", 400
 
-    rich_html = markdown2.markdown(new_value)
+    # Send only the edited column to the database/API (this also renders it into the markdown cache);
+    # the cleaned value is both saved and rendered below, so the render is a cache hit
+    if not save_recipe_field(recipe_id, field, new_value, NOCO_DB_TABLE_ID):
+        return "Could not save the change: NocoDB is unavailable, please try again shortly", 503
 
-    # Return the display field after updating
-    return render_template('menu/display_rich_field.html', field=field, value=rich_html, recipe_id=recipe_id)
+    rich_html = render_markdown(new_value)
+
+    # Return the display field after updating; a coalesced edit not sent yet is 202 and shows its save status
+    status = save_status(recipe_id, field)
+    return render_template('menu/display_rich_field.html', field=field, value=rich_html, recipe_id=recipe_id,
+                           save_status=status), 202 if status else 200
+
+
+def save_status(recipe_id, field):
+    """None once an edit is saved, else the coalescer's "pending" or "failed"."""
+    status = get_edit_coalescer().status(NOCO_DB_TABLE_ID, recipe_id, field)
+    return None if status == "saved" else status
 
 
 @menu.route('/display_field/<int:recipe_id>/<field>', methods=['GET'])
@@ -179,7 +270,8 @@ def display_field(recipe_id, field):
     value = getattr(recipe, field, "")
     
     # Render a simple span with the field value for display mode
-    return render_template('menu/display_field.html', field=field, value=value, recipe_id=recipe_id)
+    return render_template('menu/display_field.html', field=field, value=value, recipe_id=recipe_id,
+                           save_status=save_status(recipe_id, field))
 
 @menu.route('/display_rich_field/<int:recipe_id>/<field>', methods=['GET'])
 def display_rich_field(recipe_id, field):
@@ -189,22 +281,20 @@ def display_rich_field(recipe_id, field):
     # Get the current value of the field
     value = getattr(recipe, field, "")
 
-    rich_html = markdown2.markdown(value)
+    rich_html = render_markdown(value)
     
     # Render a simple span with the field value for display mode
-    return render_template('menu/display_rich_field.html', field=field, value=rich_html, recipe_id=recipe_id)
+    return render_template('menu/display_rich_field.html', field=field, value=rich_html, recipe_id=recipe_id,
+                           save_status=save_status(recipe_id, field))
 
 @menu.route('/upload_photo_field/<int:recipe_id>', methods=['GET'])
 def upload_photo_field(recipe_id):
     # Render only the photo upload form partial, not the entire layout
-    return render_template('menu/upload_photo_field.html', recipe_id=recipe_id)
+    return render_template('menu/upload_photo_field.html', recipe_id=recipe_id, presigned=get_minio() is not None)
 
 
 @menu.route('/save_photo/<int:recipe_id>', methods=['POST'])
 def save_photo(recipe_id):
-    print("Request received:", request)  # Log the request itself
-    print("Request files:", request.files)  # Log the contents of request.files
-
     if 'photo' not in request.files:
         print("No file uploaded")
         return jsonify({"error": "No file uploaded"}), 400
@@ -214,28 +304,71 @@ def save_photo(recipe_id):
         print("No file selected")
         return jsonify({"error": "No file selected"}), 400
     
-    # Save the file and get metadata for NoCoDB
-    filename = secure_filename(file.filename)
-    file_path = os.path.join('static/uploads', filename)
-    file.save(file_path)
-    
-    # Upload to NoCoDB
-    attachment_metadata = upload_file_to_storage(file_path)
-    if not attachment_metadata:
-        return jsonify({"error": "Failed to upload to NoCoDB"}), 500
-    
-    # Update record in NoCoDB
-    if not update_record_with_attachment(recipe_id, attachment_metadata, NOCO_DB_TABLE_ID):
-        return jsonify({"error": "Failed to update record in NoCoDB"}), 500
+    # Queue the upload and record update; the recipe page polls the job until the photo is attached
+    job_id = enqueue_photo_upload(file, recipe_id, NOCO_DB_TABLE_ID)
+    recipe_url = url_for('menu.recipe', Id=recipe_id, photo_job=job_id)
     
     # If this is an HTMX request, set HX-Redirect header
     if "HX-Request" in request.headers:
-        response = jsonify({"success": True})
-        response.headers["HX-Redirect"] = url_for('menu.recipe', Id=recipe_id)
+        response = jsonify({"success": True, "job_id": job_id})
+        response.headers["HX-Redirect"] = recipe_url
         return response
     
     # For non-HTMX requests, do a direct redirect
-    return redirect(url_for('menu.recipe', Id=recipe_id))
+    return redirect(recipe_url)
+
+@menu.route('/presign_photo/<int:recipe_id>', methods=['POST'])
+def presign_photo(recipe_id):
+    # First step of a direct upload: the browser PUTs the file to the returned URL itself
+    if get_minio() is None:
+        return jsonify({"error": "Direct photo uploads are not enabled"}), 404
+    filename = (request.get_json(silent=True) or {}).get('filename') or request.form.get('filename')
+    if not filename:
+        return jsonify({"error": "No file selected"}), 400
+    try:
+        upload = presign_photo_upload(recipe_id, filename, NOCO_DB_TABLE_ID)
+    except S3Error as e:
+        print(f"Failed to presign photo upload: {e}")
+        return jsonify({"error": "Photo storage is unavailable"}), 503
+    return jsonify({**upload, "confirm_url": url_for('menu.confirm_photo', recipe_id=recipe_id)})
+
+
+@menu.route('/confirm_photo/<int:recipe_id>', methods=['POST'])
+def confirm_photo(recipe_id):
+    # Second step: record the uploaded object in the recipe's Photo column
+    if get_minio() is None:
+        return jsonify({"error": "Direct photo uploads are not enabled"}), 404
+    object_name = (request.get_json(silent=True) or {}).get('object_name') or request.form.get('object_name')
+    if not object_name:
+        return jsonify({"error": "No photo uploaded"}), 400
+    try:
+        attachment, job_id = confirm_photo_upload(recipe_id, object_name, NOCO_DB_TABLE_ID)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except S3Error as e:
+        print(f"Failed to confirm photo upload: {e}")
+        return jsonify({"error": "Photo storage is unavailable"}), 503
+    except noco.NocoDBError as e:
+        return jsonify({"error": f"Failed to attach photo: {e}"}), e.status_code
+
+    recipe_url = url_for('menu.recipe', Id=recipe_id)
+    response = jsonify({"success": True, "photo": attachment, "variants_job": job_id, "redirect": recipe_url})
+    if "HX-Request" in request.headers:
+        response.headers["HX-Redirect"] = recipe_url
+    return response
+
+
+@menu.route('/photo_status/<job_id>', methods=['GET'])
+def photo_status(job_id):
+    # Polled by the photo placeholder until the background upload job has finished
+    photo_job = get_jobs().get(job_id)
+    if photo_job is None:
+        return "Unknown photo job", 404
+
+    if photo_job['status'] == 'done':
+        recipe = get_recipe_by_id(photo_job['payload']['record_id'])
+        return render_template('menu/photo_section.html', recipe=recipe)
+    return render_template('menu/photo_job.html', photo_job=photo_job)
 
 @menu.route('/create_recipe', methods=['GET'])
 def create_recipe():
@@ -263,31 +396,143 @@ def save_new_recipe():
     }
 
     # Make the API request to NoCoDB to create a new record
-    url = f"{NOCO_DB_BASE_URL}/tables/{NOCO_DB_TABLE_ID}/records"
-    headers_with_content_type = {**headers, "Content-Type": "application/json"}
-    response = requests.post(url, headers=headers_with_content_type, json=payload)
-    
-    if response.status_code == 200:
-        # Retrieve the new recipe ID from the response
-        new_recipe_id = response.json()["Id"]
-        
-        # Handle photo upload if a file is provided
-        if 'photo' in request.files and request.files['photo'].filename != '':
-            photo_file = request.files['photo']
-            filename = secure_filename(photo_file.filename)
-            photo_path = os.path.join('static/uploads', filename)
-            photo_file.save(photo_path)
-            
-            # Upload the photo to NoCoDB storage and get metadata
-            photo_metadata = upload_file_to_storage(photo_path)
-            
-            if photo_metadata:
-                # Update the record with the photo metadata
-                update_record_with_attachment(new_recipe_id, photo_metadata)
-
-        # Redirect to the new recipe's page after creation
-        return redirect(url_for('menu.recipe', Id=new_recipe_id))
-    else:
+    try:
+        created = noco.create_record(NOCO_DB_TABLE_ID, payload)
+    except noco.NocoDBError as e:
         # Handle error and show feedback to the user
-        print(f"Failed to create new recipe: {response.status_code} - {response.text}")
-        return jsonify({"error": "Failed to create recipe"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Failed to create recipe: {e}"}), e.status_code
+
+    # Retrieve the new recipe ID from the response
+    new_recipe_id = created["Id"]
+
+    # Queue the photo upload if a file is provided; the recipe page shows it once attached
+    photo_job = None
+    if 'photo' in request.files and request.files['photo'].filename != '':
+        photo_job = enqueue_photo_upload(request.files['photo'], new_recipe_id, NOCO_DB_TABLE_ID)
+
+    # Redirect to the new recipe's page after creation
+    return redirect(url_for('menu.recipe', Id=new_recipe_id, photo_job=photo_job))
+
+
+@menu.route('/import', methods=['POST'])
+def import_recipes():
+    # A CSV/JSON/markdown file of recipes, plus the photos its Photo column names
+    upload = request.files.get('file')
+    if upload is None or upload.filename == '':
+        return jsonify({"error": "No import file uploaded"}), 400
+
+    # Reject invalid files right away rather than in the background, before anything is spooled
+    content = upload.read()
+    photos = [photo for photo in request.files.getlist('photos') if photo.filename]
+    try:
+        rows = transfer.validate_rows(transfer.parse_rows(content.decode('utf-8-sig'), transfer.import_format(upload.filename)),
+                                      NoCoRecipes, photo_names={secure_filename(photo.filename) for photo in photos})
+    except (transfer.TransferError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Invalid import file: {e}"}), 400
+
+    # Spool everything for the import job, which resumes from its saved progress when retried;
+    # the directory is removed once the job finishes or fails for good
+    import_dir = os.path.join(current_app.config['JOBS_SPOOL_DIR'], f"import-{uuid.uuid4().hex}")
+    photo_dir = os.path.join(import_dir, 'photos')
+    os.makedirs(photo_dir)
+    path = os.path.join(import_dir, secure_filename(upload.filename))
+    with open(path, 'wb') as f:
+        f.write(content)
+    for photo in photos:
+        photo.save(os.path.join(photo_dir, secure_filename(photo.filename)))
+
+    job_id = get_jobs().enqueue('import_recipes', {
+        "path": path,
+        "photo_dir": photo_dir,
+        "spool_dir": import_dir,
+        "table_id": NOCO_DB_TABLE_ID,
+        "batch_size": current_app.config['IMPORT_BATCH_SIZE'],
+    })
+    return jsonify({"job_id": job_id, "rows": len(rows),
+                    "status_url": url_for('menu.import_status', job_id=job_id)}), 202
+
+
+@menu.route('/import/<job_id>', methods=['GET'])
+def import_status(job_id):
+    job = get_jobs().get(job_id)
+    if job is None or job['kind'] != 'import_recipes':
+        return jsonify({"error": "Unknown import"}), 404
+    return jsonify({key: job[key] for key in ('status', 'attempts', 'result', 'error')})
+
+
+@menu.route('/export/recipes.<fmt>', methods=['GET'])
+def export_recipes(fmt):
+    return export_response(NOCO_DB_TABLE_ID, ('Id',) + NoCoRecipes.EDITABLE_FIELDS + ('Photo',), fmt, 'recipes')
+
+
+def export_response(table_id, fields, fmt, name):
+    """Stream a table as NDJSON/CSV; the first page is fetched before answering so failures get an error status."""
+    if fmt not in transfer.EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported export format {fmt}"}), 404
+    lines = transfer.export_lines(table_id, fields, fmt)
+    try:
+        first = next(lines, '')
+    except noco.NocoDBError as e:
+        return jsonify({"error": f"Failed to export {name}: {e}"}), e.status_code
+
+    def stream():
+        yield first
+        yield from lines
+
+    return Response(stream_with_context(stream()), mimetype=transfer.EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'})
+
+
+@menu.cli.command('import-recipes')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--photos', 'photo_dir', type=click.Path(exists=True, file_okay=False),
+              help='Directory holding the files named in the Photo column.')
+@click.option('--batch-size', type=int, default=None, help='Rows per bulk insert (IMPORT_BATCH_SIZE).')
+def import_recipes_command(path, photo_dir, batch_size):
+    """Bulk import recipes from a CSV, JSON/NDJSON or markdown file; rerun to resume an interrupted import."""
+    try:
+        progress = transfer.import_records(path, NOCO_DB_TABLE_ID, NoCoRecipes, photo_dir=photo_dir,
+                                           batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'])
+    except transfer.TransferError as e:
+        raise click.ClickException(str(e))
+
+    # The photo jobs run on this process's workers; wait for them before exiting
+    jobs = get_jobs()
+    if progress['photo_jobs']:
+        jobs.start()
+    pending = list(progress['photo_jobs'])
+    while pending:
+        pending = [job_id for job_id in pending if jobs.get(job_id)['status'] not in ('done', 'failed')]
+        time.sleep(0.5)
+    failed = [job_id for job_id in progress['photo_jobs'] if jobs.get(job_id)['status'] == 'failed']
+    print(f"Imported {progress['done']} recipes, {len(progress['photo_jobs']) - len(failed)} photos"
+          + (f" ({len(failed)} photo uploads failed)" if failed else ""))
+
+
+@menu.cli.command('export-recipes')
+@click.option('--format', 'fmt', type=click.Choice(list(transfer.EXPORT_FORMATS)), default='ndjson')
+@click.option('--output', type=click.File('w'), default='-')
+def export_recipes_command(fmt, output):
+    """Write every recipe as NDJSON or CSV, one page of records in memory at a time."""
+    for line in transfer.export_lines(NOCO_DB_TABLE_ID, ('Id',) + NoCoRecipes.EDITABLE_FIELDS + ('Photo',), fmt):
+        output.write(line)
+
+
+@menu.cli.command('backfill-photos')
+def backfill_photos():
+    """Generate the resized variants of recipe photos uploaded before variants existed."""
+    rows = noco.fetch_all_records(NOCO_DB_TABLE_ID, {"fields": "Id,Photo"})
+    for row in rows:
+        photos = row.get('Photo') or []
+        if not photos or photos[0].get('variants') or not photos[0].get('signedPath'):
+            continue
+
+        response = noco.get_client().download(photos[0]['signedPath'])
+        if response.status_code != 200:
+            print(f"Failed to download photo of recipe {row['Id']}: {response.status_code}")
+            continue
+
+        filename = photos[0].get('title') or f"recipe-{row['Id']}"
+        variants = upload_photo_variants(io.BytesIO(response.content), filename, NOCO_DB_TABLE_ID)
+        if variants and update_record_with_attachment(row['Id'], {**photos[0], 'variants': variants}, NOCO_DB_TABLE_ID):
+            print(f"Generated {len(variants)} photo variants for recipe {row['Id']}")
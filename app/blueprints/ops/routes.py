@@ -0,0 +1,60 @@
+from flask import current_app, jsonify, Blueprint, Response
+
+ops = Blueprint("ops", __name__)
+
+
+@ops.route('/stats')
+def stats():
+    # Counters of the shared NocoDB client and the caches in front of it
+    return jsonify({
+        "noco_client": current_app.extensions['noco_client'].stats.as_dict(),
+        "single_flight": current_app.extensions['noco_client'].flights.as_dict(),
+        "circuit_breaker": current_app.extensions['noco_client'].breaker.as_dict(),
+        "record_cache": current_app.extensions['record_cache'].stats(),
+        "markdown_cache": current_app.extensions['markdown_cache'].stats(),
+        "fragment_cache": current_app.extensions['fragment_cache'].stats(),
+        "jobs": current_app.extensions['jobs'].counts(),
+        "edits": current_app.extensions['edit_coalescer'].stats(),
+        "mirror": current_app.extensions['mirror'].stats() if 'mirror' in current_app.extensions else None,
+        "related_indexes": {
+            table_id: {"rows": len(index), "bytes": index.nbytes(), "version": index.version}
+            for table_id, index in current_app.extensions['related_indexes'].items()
+            if index.built_at is not None
+        },
+        "ingredient_indexes": {
+            table_id: {**index.stats(), "version": index.version}
+            for table_id, index in current_app.extensions['ingredient_indexes'].items()
+            if index.built_at is not None
+        },
+    })
+
+
+@ops.route('/metrics')
+def metrics():
+    # Prometheus text format: request/upstream/render histograms plus cache and client gauges
+    extensions = current_app.extensions
+    caches = {
+        "record": extensions['record_cache'].stats(),
+        "markdown": extensions['markdown_cache'].stats(),
+        "fragment": extensions['fragment_cache'].stats(),
+    }
+    flights = extensions['noco_client'].flights.as_dict()
+    breaker = extensions['noco_client'].breaker.as_dict()
+    gauges = [
+        ("themenus_cache_hits", "Cache lookups answered from the cache.",
+         [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        ("themenus_cache_misses", "Cache lookups that missed.",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        ("themenus_cache_hit_ratio", "Share of cache lookups answered from the cache.",
+         [({"cache": name}, round(stats["hits"] / ((stats["hits"] + stats["misses"]) or 1), 4))
+          for name, stats in caches.items()]),
+        ("themenus_cache_entries", "Entries currently cached.",
+         [({"cache": name}, stats["entries"]) for name, stats in caches.items()]),
+        ("themenus_upstream_calls_saved", "NocoDB GETs answered by sharing a concurrent identical call.",
+         [({}, flights["calls_saved"])]),
+        ("themenus_circuit_open", "1 while the NocoDB circuit breaker rejects calls.",
+         [({}, int(breaker["state"] == "open"))]),
+        ("themenus_jobs", "Background jobs by status.",
+         [({"status": status}, count) for status, count in extensions['jobs'].counts().items()]),
+    ]
+    return Response(extensions['metrics'].render(gauges), mimetype='text/plain; version=0.0.4')
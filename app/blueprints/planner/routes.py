@@ -0,0 +1,115 @@
+from datetime import date
+
+import click
+from flask import current_app, jsonify, render_template, request, Blueprint
+
+from app import noco
+from app import planner as engine
+from app.blueprints.menu.routes import NOCO_DB_TABLE_ID as RECIPES_TABLE_ID
+
+planner = Blueprint("planner", __name__, template_folder='templates')
+
+
+def plan_options(source):
+    """Start date, meal types and leftover days of a plan request (form or query args)."""
+    try:
+        start = date.fromisoformat(source.get('start')) if source.get('start') else engine.next_monday()
+    except ValueError:
+        raise engine.PlanError(f"Invalid start date {source.get('start')}")
+    meals = [meal for meal in source.getlist('meals') if meal.strip()] or ['Dinner']
+    return start, meals, source.getlist('leftovers')
+
+
+@planner.route('/')
+def index():
+    return render_template('planner/index.html', start=engine.next_monday(), weekdays=engine.WEEKDAYS)
+
+
+@planner.route('/generate', methods=['POST'])
+def generate():
+    # Proposes a week; the result fragment carries the plan in hidden fields for planner.save
+    try:
+        start, meals, leftover_days = plan_options(request.form)
+        plan = engine.plan_week(RECIPES_TABLE_ID, current_app.config['NOCO_DB_MENUS_TABLE_ID'],
+                                start, meals, leftover_days)
+    except engine.PlanError as e:
+        return render_template('planner/plan.html', plan=[], error=str(e))
+    except noco.NocoDBError as e:
+        return render_template('planner/plan.html', plan=[], error=f"Failed to load recipes: {e}")
+    return render_template('planner/plan.html', plan=plan)
+
+
+@planner.route('/save', methods=['POST'])
+def save():
+    # Writes the previewed plan to the Menus table with a single bulk insert
+    menus_table_id = current_app.config['NOCO_DB_MENUS_TABLE_ID']
+    if not menus_table_id:
+        return render_template('planner/saved.html', error="NOCO_DB_MENUS_TABLE_ID is not configured")
+
+    try:
+        plan = submitted_plan(request.form, engine.get_features(RECIPES_TABLE_ID))
+        engine.save_plan(menus_table_id, plan)
+    except engine.PlanError as e:
+        return render_template('planner/saved.html', error=str(e))
+    except noco.NocoDBError as e:
+        return render_template('planner/saved.html', error=f"Failed to save the menu: {e}")
+    return render_template('planner/saved.html', plan=plan)
+
+
+def submitted_plan(form, features):
+    """The slots posted back by planner/plan.html; any malformed or misaligned row rejects the whole plan."""
+    fields = [form.getlist(name) for name in ('date', 'meal', 'recipe_id', 'leftovers')]
+    if len({len(values) for values in fields}) != 1:
+        raise engine.PlanError("The submitted menu is incomplete, please generate it again")
+    plan = []
+    for number, (day, meal, recipe_id, leftovers) in enumerate(zip(*fields), start=1):
+        try:
+            day = date.fromisoformat(day)
+            recipe_id = int(recipe_id)
+        except ValueError:
+            raise engine.PlanError(f"Row {number} of the submitted menu is malformed")
+        if not meal.strip() or leftovers not in ('0', '1'):
+            raise engine.PlanError(f"Row {number} of the submitted menu is malformed")
+        position = features.positions.get(recipe_id)
+        if position is None:
+            raise engine.PlanError(f"Recipe {recipe_id} no longer exists")
+        plan.append({"date": day, "meal": meal, "leftovers": leftovers == '1', "recipe": features.rows[position]})
+    if not plan:
+        raise engine.PlanError("Nothing to save")
+    return plan
+
+
+@planner.route('/plan.json')
+def plan_json():
+    # Same as planner.generate, for scripts: ?start=2024-06-03&meals=Dinner&leftovers=Wednesday
+    try:
+        start, meals, leftover_days = plan_options(request.args)
+        plan = engine.plan_week(RECIPES_TABLE_ID, current_app.config['NOCO_DB_MENUS_TABLE_ID'],
+                                start, meals, leftover_days)
+    except engine.PlanError as e:
+        return jsonify({"error": str(e)}), 400
+    except noco.NocoDBError as e:
+        return jsonify({"error": f"Failed to load recipes: {e}"}), e.status_code
+    return jsonify(engine.menu_rows(plan))
+
+
+@planner.cli.command('plan')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='First day (default: next Monday).')
+@click.option('--meal', 'meals', multiple=True, default=['Dinner'], help='Meal type planned each day (repeatable).')
+@click.option('--leftovers', 'leftover_days', multiple=True, help='Weekday eaten from leftovers (repeatable).')
+@click.option('--save', is_flag=True, help='Write the plan to the Menus table.')
+def plan_command(start, meals, leftover_days, save):
+    """Plan a week of meals and optionally save it to the Menus table."""
+    start = start.date() if start else engine.next_monday()
+    menus_table_id = current_app.config['NOCO_DB_MENUS_TABLE_ID']
+    try:
+        plan = engine.plan_week(RECIPES_TABLE_ID, menus_table_id, start, meals, leftover_days)
+    except engine.PlanError as e:
+        raise click.ClickException(str(e))
+    for slot in plan:
+        print(f"{slot['date'].isoformat()} {slot['meal']:<8} {'(leftovers) ' if slot['leftovers'] else ''}"
+              f"{slot['recipe'].get('Title')}")
+    if save:
+        if not menus_table_id:
+            raise click.ClickException("NOCO_DB_MENUS_TABLE_ID is not configured")
+        print(f"Saved {len(engine.save_plan(menus_table_id, plan))} menu rows")
@@ -0,0 +1,45 @@
+import hmac
+
+from flask import current_app, jsonify, request, Blueprint
+
+from app import noco
+
+webhooks = Blueprint("webhooks", __name__)
+
+# NocoDB webhook event types (single and bulk variants) and whether their rows were deleted
+RECORD_EVENTS = {
+    "records.after.insert": False,
+    "records.after.bulkInsert": False,
+    "records.after.update": False,
+    "records.after.bulkUpdate": False,
+    "records.after.delete": True,
+    "records.after.bulkDelete": True,
+}
+
+
+def verify_secret():
+    """True when the request carries the shared secret configured for the webhook."""
+    secret = current_app.config['NOCO_DB_WEBHOOK_SECRET']
+    provided = request.headers.get('X-Webhook-Secret', '')
+    return bool(secret) and hmac.compare_digest(provided.encode(), secret.encode())
+
+
+@webhooks.route('/nocodb', methods=['POST'])
+def nocodb():
+    # NocoDB posts {"type": ..., "data": {"table_id": ..., "rows": [...]}} for record events;
+    # the shared secret is sent as a custom X-Webhook-Secret header configured on the hook
+    if not verify_secret():
+        return jsonify({"success": False, "error": "Invalid webhook secret"}), 403
+
+    event = request.get_json(silent=True) or {}
+    deleted = RECORD_EVENTS.get(event.get("type"))
+    data = event.get("data") or {}
+    table_id = data.get("table_id")
+    if deleted is None or not table_id:
+        return jsonify({"success": False, "error": f"Unsupported webhook event {event.get('type')!r}"}), 400
+
+    rows = [row for row in data.get("rows") or [] if row.get("Id") is not None]
+    for row in rows:
+        noco.apply_remote_change(table_id, row["Id"], None if deleted else row)
+    print(f"Applied webhook {event['type']} for {len(rows)} rows of {table_id}")
+    return jsonify({"success": True, "applied": len(rows)})
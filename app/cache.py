@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecordCache:
+    """
+    Thread-safe read-through cache for NocoDB records.
+
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `max_entries` is reached. Single records are stored under
+    ("record", table_id, record_id) and full table listings under
+    ("list", table_id, fields), where `fields` is the column projection the
+    listing was fetched with, so a write to one record can update that
+    record and drop only the listings of its table.
+
+    With a `stale_ttl`, expired entries are kept that much longer so they
+    can still be served (see get_stale) when a refresh fails or is slow.
+    """
+
+    def __init__(self, ttl=60, max_entries=1024, stale_ttl=0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        value, fresh = self.get_stale(key)
+        return value if fresh else None
+
+    def get_stale(self, key):
+        """Return (value, fresh); an expired value is still returned, with fresh False, within stale_ttl."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            expires_at, value = entry
+            now = time.monotonic()
+            if expires_at < now:
+                if expires_at + self.stale_ttl < now:
+                    del self._entries[key]
+                    value = None
+                self.misses += 1
+                return value, False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, True
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Record helpers
+
+    def get_record(self, table_id, record_id):
+        return self.get(("record", table_id, int(record_id)))
+
+    def set_record(self, table_id, record_id, data):
+        self.set(("record", table_id, int(record_id)), data)
+
+    def get_record_stale(self, table_id, record_id):
+        return self.get_stale(("record", table_id, int(record_id)))
+
+    def get_list(self, table_id, fields=None):
+        return self.get(("list", table_id, fields))
+
+    def get_list_stale(self, table_id, fields=None):
+        return self.get_stale(("list", table_id, fields))
+
+    def set_list(self, table_id, rows, fields=None):
+        self.set(("list", table_id, fields), rows)
+
+    def _drop_lists(self, table_id):
+        for key in [k for k in self._entries if k[0] == "list" and k[1] == table_id]:
+            del self._entries[key]
+
+    def update_record(self, table_id, record_id, changes):
+        """Merge `changes` into a cached record (if present) and drop the table listing."""
+        key = ("record", table_id, int(record_id))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                self._entries[key] = (expires_at, {**value, **changes})
+            self._drop_lists(table_id)
+
+    def invalidate_record(self, table_id, record_id):
+        """Forget a single record and the listing of its table."""
+        with self._lock:
+            self._entries.pop(("record", table_id, int(record_id)), None)
+            self._drop_lists(table_id)
+
+    def invalidate_table(self, table_id):
+        """Forget every cached entry belonging to `table_id`."""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == table_id]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
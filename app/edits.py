@@ -0,0 +1,130 @@
+import atexit
+import threading
+
+from flask import current_app
+
+from app import noco
+
+
+class EditCoalescer:
+    """
+    Merges rapid inline edits into one bulk PATCH per table.
+
+    With a `window` of 0 every edit is sent right away as a single-column
+    PATCH. Otherwise edits are held for `window` seconds after the first one
+    arrives; later edits to the same record and column replace the pending
+    value, and everything still pending is then flushed as one bulk PATCH
+    per table. Reads go through noco.get_record_with_pending so a held edit
+    is visible before it is flushed.
+
+    A PATCH that fails puts its edits back (under any newer edit of the same
+    column) and is retried with exponential backoff up to `max_backoff`
+    seconds; until then status() reports them as failed rather than saved.
+    """
+
+    def __init__(self, app, window=0.0, max_backoff=60.0):
+        self.app = app
+        self.window = window
+        self.max_backoff = max_backoff
+        self._pending = {}  # table_id -> {record_id: {column: value}}
+        self._failing = {}  # table_id -> {record_id: error of the last flush}
+        self._attempts = 0  # consecutive failed flushes
+        self._lock = threading.Lock()
+        self._timer = None
+        self.edits = 0
+        self.patches = 0
+        self.failures = 0
+        atexit.register(self._flush_at_exit)
+
+    def submit(self, table_id, record_id, changes):
+        """Queue (or, without a window, immediately send) a change to some columns of a record."""
+        if self.window <= 0:
+            with self._lock:
+                self.edits += 1
+                self.patches += 1
+            return noco.update_fields(table_id, record_id, changes)
+
+        with self._lock:
+            self.edits += 1
+            self._pending.setdefault(table_id, {}).setdefault(int(record_id), {}).update(changes)
+            self._schedule(self.window)
+        return None
+
+    def _schedule(self, delay):
+        # Called with the lock held
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending(self, table_id, record_id):
+        with self._lock:
+            return dict(self._pending.get(table_id, {}).get(int(record_id), {}))
+
+    def status(self, table_id, record_id, column):
+        """"saved", "pending" (held for the next flush) or "failed" (its last flush failed and is being retried)."""
+        with self._lock:
+            if column not in self._pending.get(table_id, {}).get(int(record_id), {}):
+                return "saved"
+            return "failed" if int(record_id) in self._failing.get(table_id, {}) else "pending"
+
+    def flush(self):
+        """Send every pending edit now, one bulk PATCH per table."""
+        with self._lock:
+            batches, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.patches += len(batches)
+
+        failed = {}
+        for table_id, records in batches.items():
+            rows = [{"Id": record_id, **changes} for record_id, changes in records.items()]
+            try:
+                with self.app.app_context():
+                    noco.update_records(table_id, rows)
+            except noco.NocoDBError as e:
+                print(f"Failed to flush {len(rows)} coalesced edits to {table_id}, will retry: {e}")
+                failed[table_id] = str(e)
+
+        with self._lock:
+            for table_id, records in batches.items():
+                failing = self._failing.setdefault(table_id, {})
+                for record_id, changes in records.items():
+                    if table_id in failed:
+                        # Edits made since the flush started are newer than the failed ones
+                        pending = self._pending.setdefault(table_id, {})
+                        pending[record_id] = {**changes, **pending.get(record_id, {})}
+                        failing[record_id] = failed[table_id]
+                    else:
+                        failing.pop(record_id, None)
+                if not failing:
+                    del self._failing[table_id]
+            if failed:
+                self.failures += 1
+                self._attempts += 1
+                self._schedule(min(max(self.window, 1.0) * 2 ** self._attempts, self.max_backoff))
+            elif batches:
+                self._attempts = 0
+
+    def _flush_at_exit(self):
+        self.flush()
+        with self._lock:
+            for table_id, records in self._pending.items():
+                for record_id, changes in records.items():
+                    print(f"Edits to record {record_id} of {table_id} were not saved: {changes}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window": self.window,
+                "edits": self.edits,
+                "patches": self.patches,
+                "pending": sum(len(records) for records in self._pending.values()),
+                "failing": sum(len(records) for records in self._failing.values()),
+                "failed_flushes": self.failures,
+            }
+
+
+def get_edit_coalescer():
+    return current_app.extensions['edit_coalescer']
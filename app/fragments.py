@@ -0,0 +1,75 @@
+import hashlib
+import json
+import threading
+import uuid
+
+from flask import current_app, g, make_response, request
+
+# Changes on every start, so ETags issued before a deploy (new templates) are not honoured after it
+BOOT_ID = uuid.uuid4().hex
+# Record listeners run on request threads, webhook handlers and job workers at the same time
+_versions_lock = threading.Lock()
+
+
+def table_version(table_id):
+    """Counter of the record changes this app has seen for `table_id` (local writes and webhooks)."""
+    return current_app.extensions['table_versions'].get(table_id, 0)
+
+
+def apply_record_change(table_id, record_id, data):
+    """Record listener bumping the table version, which retires its ETags and cached fragments."""
+    versions = current_app.extensions['table_versions']
+    with _versions_lock:
+        versions[table_id] = versions.get(table_id, 0) + 1
+
+
+def rows_version(rows):
+    """
+    Latest UpdatedAt of the rendered `rows`, for the version of a fragment.
+
+    table_version is a per-process counter that starts again at 0 on restart
+    and only moves in the worker that saw the change, so it cannot tell two
+    workers' bodies apart on its own; the rows' own timestamps can.
+    """
+    return max((row.get('UpdatedAt') or '' for row in rows), default='')
+
+
+def make_etag(*parts):
+    """Strong ETag of the given (JSON serialisable) version parts."""
+    payload = json.dumps([BOOT_ID, request.endpoint, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cached_fragment(render, version, *parts):
+    """
+    Respond with `render()` under a strong ETag derived from `version` and `parts`.
+
+    `version` identifies the records the body is rendered from and `parts`
+    the rest of the request it depends on (query, page, ...). A matching
+    If-None-Match is answered with 304 without rendering, and the body is
+    kept in the fragment cache under the same ETag so repeated identical
+    requests skip rendering (and the data fetches inside `render`). A None
+    `version`, for data whose version cannot be known locally, and data served
+    stale because NocoDB could not refresh it, disable both.
+    """
+    if version is None or request.method != 'GET' or g.get('served_stale'):
+        return render()
+
+    etag = make_etag(version, *parts)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
+    cache = current_app.extensions['fragment_cache']
+    body = cache.get(etag)
+    if body is None:
+        body = render()
+        if not isinstance(body, str) or g.get('served_stale'):
+            # Errors (e.g. a NocoDB failure answered with JSON) and stale data are neither cached nor tagged
+            return body
+        cache.set(etag, body)
+
+    response = make_response(body)
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,386 @@
+import hashlib
+import heapq
+import html
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app
+
+from app import noco
+
+# One parsed ingredient line: quantity (float, or None for "salt to taste"),
+# canonical unit (None for counts), normalised item name and the source line
+Ingredient = namedtuple('Ingredient', 'quantity unit item line')
+
+# Recipe columns the ingredient index keeps (Ingredients is parsed, the rest rendered)
+INGREDIENT_COLUMNS = ('Id', 'Title', 'Meal', 'Core', 'Photo')
+
+# Canonical unit -> the spellings recipes use for it
+UNIT_ALIASES = {
+    'g': ('g', 'gr', 'gram', 'grams'),
+    'kg': ('kg', 'kilo', 'kilos', 'kilogram', 'kilograms'),
+    'oz': ('oz', 'ounce', 'ounces'),
+    'lb': ('lb', 'lbs', 'pound', 'pounds'),
+    'ml': ('ml', 'milliliter', 'milliliters', 'millilitre', 'millilitres'),
+    'l': ('l', 'liter', 'liters', 'litre', 'litres'),
+    'tsp': ('tsp', 'tsps', 'teaspoon', 'teaspoons'),
+    'tbsp': ('tbsp', 'tbsps', 'tbs', 'tbl', 'tablespoon', 'tablespoons'),
+    'cup': ('cup', 'cups'),
+    'fl oz': ('fl oz', 'fl. oz', 'fluid ounce', 'fluid ounces'),
+    'pint': ('pint', 'pints', 'pt'),
+    'quart': ('quart', 'quarts', 'qt'),
+    'clove': ('clove', 'cloves'),
+    'can': ('can', 'cans', 'tin', 'tins'),
+    'pinch': ('pinch', 'pinches'),
+    'bunch': ('bunch', 'bunches'),
+    'slice': ('slice', 'slices'),
+    'stick': ('stick', 'sticks'),
+    'sprig': ('sprig', 'sprigs'),
+    'handful': ('handful', 'handfuls'),
+    'package': ('package', 'packages', 'packet', 'packets', 'pack', 'packs'),
+}
+UNITS = {alias: unit for unit, aliases in UNIT_ALIASES.items() for alias in aliases}
+
+# Units merged across recipes, as a multiple of their dimension's base unit (g or ml)
+MASS = {'g': 1, 'kg': 1000, 'oz': 28.3495, 'lb': 453.592}
+VOLUME = {'ml': 1, 'l': 1000, 'tsp': 4.92892, 'tbsp': 14.7868, 'cup': 236.588, 'fl oz': 29.5735,
+          'pint': 473.176, 'quart': 946.353}
+
+# Words describing how an ingredient is prepared rather than what it is
+DESCRIPTORS = {
+    'large', 'small', 'medium', 'fresh', 'freshly', 'chopped', 'minced', 'diced', 'sliced', 'finely',
+    'roughly', 'grated', 'peeled', 'crushed', 'softened', 'melted', 'optional',
+}
+# Ingredients every kitchen is assumed to have when matching "what I have"
+STAPLES = {'salt', 'pepper', 'black pepper', 'water', 'oil', 'olive oil', 'vegetable oil'}
+
+FRACTIONS = {'½': 1 / 2, '⅓': 1 / 3, '⅔': 2 / 3, '¼': 1 / 4, '¾': 3 / 4, '⅛': 1 / 8, '⅜': 3 / 8, '⅝': 5 / 8, '⅞': 7 / 8}
+QUANTITY_WORDS = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'half': 0.5}
+
+_FRACTION = "[" + "".join(FRACTIONS) + "]"
+_NUMBER = rf"\d+\s+\d+/\d+|\d+\s*{_FRACTION}|\d+/\d+|\d+(?:[.,]\d+)?|{_FRACTION}"
+QUANTITY = re.compile(
+    rf"^(?P<quantity>{_NUMBER})(?:\s*(?:-|–|to)\s*(?P<upper>{_NUMBER}))?\s*(?P<rest>.*)$"
+)
+LIST_MARKER = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+(?:\[[ xX]\]\s*)?")
+HTML_BREAK = re.compile(r"<\s*br\s*/?>|</\s*(?:li|p|div|h\d)\s*>", re.IGNORECASE)
+HTML_TAG = re.compile(r"<[^>]+>")
+
+
+def parse_number(text):
+    """Value of "2", "1.5", "1,5", "1/2", "1 1/2", "½" or "1½"."""
+    text = text.strip()
+    whole, _, rest = text.partition(' ')
+    if rest:
+        return parse_number(whole) + parse_number(rest)
+    if text[-1] in FRACTIONS:
+        return (float(text[:-1]) if text[:-1] else 0) + FRACTIONS[text[-1]]
+    if '/' in text:
+        numerator, denominator = text.split('/')
+        return float(numerator) / float(denominator) if float(denominator) else 0.0
+    return float(text.replace(',', '.'))
+
+
+def normalize_item(text):
+    """Lowercase item name without notes, preparation words or a plural ending ("Tomatoes, diced" -> "tomato")."""
+    text = re.sub(r"\([^)]*\)", " ", text.lower()).split(',')[0]
+    words = [word for word in re.findall(r"[a-z][a-z'-]*", text) if word not in DESCRIPTORS]
+    if words and words[0] == 'of':
+        words = words[1:]
+    if words:
+        last = words[-1]
+        if last.endswith('oes') or last.endswith('ies'):
+            last = last[:-3] + ('o' if last.endswith('oes') else 'y')
+        elif last.endswith('s') and not last.endswith('ss') and len(last) > 3:
+            last = last[:-1]
+        words[-1] = last
+    return " ".join(words)
+
+
+def parse_line(line):
+    """Parse one ingredient line into an Ingredient (None for blank lines and headings)."""
+    line = LIST_MARKER.sub("", line).replace("**", "").replace("__", "").strip()
+    if not line or line.startswith('#') or (line.endswith(':') and not re.search(r"\d", line)):
+        return None
+
+    quantity, rest = None, line
+    match = QUANTITY.match(line)
+    if match:
+        quantity = parse_number(match.group('upper') or match.group('quantity'))
+        rest = match.group('rest')
+    else:
+        first, _, remainder = line.partition(' ')
+        if first.lower() in QUANTITY_WORDS and remainder:
+            quantity, rest = QUANTITY_WORDS[first.lower()], remainder
+
+    unit = None
+    if quantity is not None:
+        words = rest.split()
+        for size in (2, 1):
+            candidate = " ".join(words[:size]).lower().rstrip('.')
+            if len(words) > size - 1 and candidate in UNITS:
+                unit, rest = UNITS[candidate], " ".join(words[size:])
+                break
+    item = normalize_item(rest)
+    if not item:
+        return None
+    return Ingredient(quantity, unit, item, line)
+
+
+def parse_ingredients(text):
+    """Parse a recipe's Ingredients (markdown, or the HTML the rich editor saves) into Ingredient tuples."""
+    if not text or not isinstance(text, str):
+        return ()
+    if '<' in text:
+        text = html.unescape(HTML_TAG.sub("", HTML_BREAK.sub("\n", text)))
+    return tuple(ingredient for ingredient in map(parse_line, text.splitlines()) if ingredient is not None)
+
+
+def merge_ingredients(ingredient_lists):
+    """
+    Shopping list for several recipes: one entry per item, with its amounts summed.
+
+    Mass and volume units are converted to g and ml before summing (and shown
+    as kg/l from 1000 up); other units and plain counts are summed per unit,
+    and items without a quantity are listed once as needed. Returns dicts
+    {"item", "amounts", "lines"}, sorted by item.
+    """
+    items = {}
+    for ingredients in ingredient_lists:
+        for ingredient in ingredients:
+            entry = items.setdefault(ingredient.item, {"totals": {}, "as_needed": False, "lines": []})
+            entry["lines"].append(ingredient.line)
+            if ingredient.quantity is None:
+                entry["as_needed"] = True
+            elif ingredient.unit in MASS:
+                entry["totals"]["g"] = entry["totals"].get("g", 0) + ingredient.quantity * MASS[ingredient.unit]
+            elif ingredient.unit in VOLUME:
+                entry["totals"]["ml"] = entry["totals"].get("ml", 0) + ingredient.quantity * VOLUME[ingredient.unit]
+            else:
+                entry["totals"][ingredient.unit] = entry["totals"].get(ingredient.unit, 0) + ingredient.quantity
+
+    shopping = []
+    for item in sorted(items):
+        entry = items[item]
+        amounts = [format_amount(total, unit) for unit, total in entry["totals"].items()]
+        if entry["as_needed"] and not amounts:
+            amounts.append("as needed")
+        shopping.append({"item": item, "amounts": amounts, "lines": entry["lines"]})
+    return shopping
+
+
+def format_amount(total, unit):
+    if unit in ('g', 'ml') and total >= 1000:
+        total, unit = total / 1000, {'g': 'kg', 'ml': 'l'}[unit]
+    number = f"{total:.2f}".rstrip('0').rstrip('.') if unit not in ('g', 'ml') else f"{total:.0f}"
+    return f"{number} {unit}" if unit else number
+
+
+class IngredientIndex:
+    """
+    Parsed ingredients of every recipe, with an item -> recipes index.
+
+    Parsing is cached by the SHA-256 of the Ingredients text (an LRU like
+    MarkdownCache), so a rebuild or a repeated edit only parses new text.
+    Item names are also indexed by word, so "chicken" finds the recipes
+    using "chicken breast" or "chicken thigh".
+    """
+
+    def __init__(self, max_entries=2048, columns=None):
+        self.max_entries = max_entries
+        self.columns = tuple(columns or INGREDIENT_COLUMNS)
+        self._parsed = OrderedDict()   # text hash -> Ingredient tuple
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self._reset()
+
+    def _reset(self):
+        self._rows = {}                # record Id -> row (self.columns)
+        self._ingredients = {}         # record Id -> Ingredient tuple
+        self._items = {}               # record Id -> frozenset(item)
+        self._recipes_by_item = {}     # item -> set(record Id)
+        self._items_by_word = {}       # word -> set(item)
+        self.built_at = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def parse(self, text):
+        """parse_ingredients through the content-hash cache."""
+        if not text or not isinstance(text, str):
+            return ()
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with self._lock:
+            parsed = self._parsed.get(key)
+            if parsed is not None:
+                self._parsed.move_to_end(key)
+                self.hits += 1
+                return parsed
+            self.misses += 1
+        parsed = parse_ingredients(text)
+        with self._lock:
+            self._parsed[key] = parsed
+            while len(self._parsed) > self.max_entries:
+                self._parsed.popitem(last=False)
+        return parsed
+
+    # Building and maintenance
+
+    def build(self, rows):
+        parsed = [(row, self.parse(row.get('Ingredients'))) for row in rows]
+        with self._lock:
+            version = self.version
+            self._reset()
+            for row, ingredients in parsed:
+                self._add(row, ingredients)
+            self.built_at = time.monotonic()
+            self.version = version + 1
+
+    def upsert(self, row):
+        """Insert a row, or merge it into the indexed row with the same Id (re-parsing changed Ingredients)."""
+        with self._lock:
+            record_id = int(row["Id"])
+            ingredients = self._ingredients.get(record_id, ())
+            if 'Ingredients' in row:
+                ingredients = self.parse(row['Ingredients'])
+            existing = self._remove(record_id) or {}
+            self._add({**existing, **row}, ingredients)
+            self.version += 1
+
+    def remove(self, record_id):
+        with self._lock:
+            self._remove(int(record_id))
+            self.version += 1
+
+    def _add(self, row, ingredients):
+        record_id = int(row["Id"])
+        self._rows[record_id] = {column: row.get(column) for column in self.columns}
+        self._ingredients[record_id] = ingredients
+        self._items[record_id] = frozenset(ingredient.item for ingredient in ingredients)
+        for ingredient in ingredients:
+            self._recipes_by_item.setdefault(ingredient.item, set()).add(record_id)
+            for word in ingredient.item.split():
+                self._items_by_word.setdefault(word, set()).add(ingredient.item)
+
+    def _remove(self, record_id):
+        row = self._rows.pop(record_id, None)
+        self._items.pop(record_id, None)
+        for ingredient in self._ingredients.pop(record_id, ()):
+            recipes = self._recipes_by_item.get(ingredient.item)
+            if recipes is None:
+                continue
+            recipes.discard(record_id)
+            if not recipes:
+                del self._recipes_by_item[ingredient.item]
+                for word in ingredient.item.split():
+                    items = self._items_by_word[word]
+                    items.discard(ingredient.item)
+                    if not items:
+                        del self._items_by_word[word]
+        return row
+
+    # Querying
+
+    def ingredients(self, record_id):
+        with self._lock:
+            return self._ingredients.get(int(record_id), ())
+
+    def row(self, record_id):
+        with self._lock:
+            return self._rows.get(int(record_id))
+
+    def matching_items(self, term):
+        """Indexed items containing every word of `term` (after normalize_item)."""
+        words = normalize_item(term).split()
+        if not words:
+            return set()
+        with self._lock:
+            items = set(self._items_by_word.get(words[0], ()))
+            for word in words[1:]:
+                items &= self._items_by_word.get(word, set())
+            return items
+
+    def recipes_using(self, have, limit=24):
+        """
+        Recipes that can be made from the items in `have`, best covered first.
+
+        Recipes using at least one of the items are ranked by the share of
+        their ingredients on hand (STAPLES count as on hand), then by how
+        many they use. Returns dicts {"recipe", "using", "missing"}.
+        """
+        on_hand = set()
+        for term in have:
+            on_hand |= self.matching_items(term)
+        covered = on_hand | STAPLES
+        with self._lock:
+            candidates = set()
+            for item in on_hand:
+                candidates |= self._recipes_by_item.get(item, set())
+
+            def rank(record_id):
+                items = self._items[record_id]
+                return -len(items & covered) / len(items), -len(items & on_hand), record_id
+
+            best = heapq.nsmallest(limit, candidates, key=rank)
+            return [
+                {
+                    "recipe": self._rows[record_id],
+                    "using": sorted(self._items[record_id] & on_hand),
+                    "missing": sorted(self._items[record_id] - covered),
+                }
+                for record_id in best
+            ]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "recipes": len(self._rows),
+                "items": len(self._recipes_by_item),
+                "parsed_entries": len(self._parsed),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def get_ingredient_index(table_id, columns=None):
+    """
+    Return the ingredient index of `table_id`, building it on first use.
+
+    Once it is older than INGREDIENT_INDEX_TTL it keeps answering while a
+    rebuild runs in the background (see noco.Revalidator).
+    """
+    indexes = current_app.extensions['ingredient_indexes']
+    index = indexes.get(table_id)
+    if index is None:
+        index = indexes.setdefault(table_id, IngredientIndex(
+            max_entries=current_app.config['INGREDIENT_CACHE_MAX_ENTRIES'],
+            columns=columns,
+        ))
+
+    fields = tuple(dict.fromkeys(("Id",) + tuple(index.columns) + ("Ingredients",)))
+    if index.built_at is None:
+        with index._lock:
+            if index.built_at is None:
+                index.build(noco.list_records(table_id, fields))
+    elif time.monotonic() - index.built_at > current_app.config['INGREDIENT_INDEX_TTL']:
+        current_app.extensions['revalidator'].submit(
+            ("ingredients", table_id), lambda: index.build(noco.list_records(table_id, fields))
+        )
+    return index
+
+
+def apply_record_change(table_id, record_id, data):
+    """Record listener keeping already built indexes in step with local writes."""
+    index = current_app.extensions['ingredient_indexes'].get(table_id)
+    if index is None or index.built_at is None:
+        return
+    if data is None:
+        index.remove(record_id)
+    else:
+        index.upsert({**data, "Id": record_id})
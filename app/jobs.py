@@ -0,0 +1,202 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask import current_app
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, run_after);
+"""
+
+
+class JobQueue:
+    """
+    Persistent background job queue with an in-process worker pool.
+
+    Jobs live in a local SQLite file, so queued work survives a restart.
+    Several processes may share the file: a job is claimed with a
+    conditional UPDATE, so only one of them runs it. A running job holds a
+    lease (its updated_at, renewed while it runs); jobs whose lease expired
+    because their process stopped are queued again. A failing job is
+    retried with exponential backoff until `max_attempts`, after which it
+    is kept as 'failed' and its spooled upload is deleted (see
+    discard_spool). Handlers are registered per job kind and run inside an
+    app context with the job's JSON payload; whatever they return is stored
+    as the job result.
+    """
+
+    def __init__(self, app, path, workers=2, max_attempts=5, retry_backoff=2.0, poll_interval=1.0, lease=300.0):
+        self.app = app
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.handlers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._running = {}  # job id -> attempt, for the jobs this process is running
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, payload):
+        """Queue a job and return its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now, now),
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    # Workers
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    def start(self):
+        """Start the workers (once per process) and the lease keeper."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                self._threads.append(threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True))
+            self._threads.append(threading.Thread(target=self._keep_leases, name="job-leases", daemon=True))
+        self.requeue_expired()
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def requeue_expired(self):
+        """Queue again the running jobs whose lease expired (their process stopped); returns how many."""
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (time.time(), time.time() - self.lease),
+            ).rowcount
+
+    def _keep_leases(self):
+        while not self._stopping.wait(self.lease / 3):
+            with self._lock:
+                for job_id, attempt in self._running.items():
+                    self._db.execute(
+                        "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                        (time.time(), job_id, attempt),
+                    )
+            self.requeue_expired()
+
+    def _claim(self):
+        with self._lock:
+            while True:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ? ORDER BY run_after LIMIT 1",
+                    (time.time(),),
+                ).fetchone()
+                if row is None:
+                    return None
+                # Another process may have claimed it since the SELECT: only one conditional UPDATE wins
+                claimed = self._db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (time.time(), row["id"]),
+                ).rowcount
+                if claimed:
+                    job = dict(self._db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+                    self._running[job["id"]] = job["attempts"]
+                    return job
+
+    def _finish(self, job, status, result=None, error=None, run_after=None):
+        # Matching the attempt keeps a job requeued (lease expired) and claimed elsewhere from being overwritten
+        with self._lock:
+            self._running.pop(job["id"], None)
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, run_after = COALESCE(?, run_after), "
+                "updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (status, json.dumps(result) if result is not None else None, error, run_after, time.time(),
+                 job["id"], job["attempts"]),
+            )
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        handler = self.handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind {job['kind']!r}")
+            with self.app.app_context():
+                result = handler(json.loads(job["payload"]))
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}: {e}")
+            if job["attempts"] >= self.max_attempts:
+                self._finish(job, "failed", error=str(e))
+                discard_spool(json.loads(job["payload"]))
+            else:
+                delay = self.retry_backoff ** job["attempts"]
+                self._finish(job, "queued", error=str(e), run_after=time.time() + delay)
+            return
+        self._finish(job, "done", result=result)
+
+
+def discard_spool(payload):
+    """Delete the spooled upload of a job that will not run again (a `spool_path` file or `spool_dir` directory)."""
+    if payload.get("spool_path") and os.path.exists(payload["spool_path"]):
+        os.remove(payload["spool_path"])
+    if payload.get("spool_dir"):
+        shutil.rmtree(payload["spool_dir"], ignore_errors=True)
+
+
+def get_jobs():
+    return current_app.extensions['jobs']
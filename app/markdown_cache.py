@@ -0,0 +1,79 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import markdown2
+from flask import current_app
+
+from app.metrics import timed
+
+# Record columns holding markdown that the recipe pages render
+MARKDOWN_FIELDS = ('Ingredients', 'Method')
+
+
+class MarkdownCache:
+    """
+    LRU cache of rendered markdown keyed by the SHA-256 of the source text.
+
+    Recipe text rarely changes, so the converter runs once per distinct
+    Ingredients/Method body and every later view reuses the HTML.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def render(self, text):
+        if not text:
+            return ""
+        key = self.key(text)
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        with timed("markdown"):
+            html = markdown2.markdown(text)
+        self.store(key, html)
+        return html
+
+    def store(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def render_markdown(text):
+    """Render markdown through the app's rendered-HTML cache."""
+    return current_app.extensions['markdown_cache'].render(text)
+
+
+def apply_record_change(table_id, record_id, data):
+    """Record listener rendering saved Ingredients/Method at write time, so views only hit the cache."""
+    if not data:
+        return
+    for field in MARKDOWN_FIELDS:
+        if isinstance(data.get(field), str):
+            render_markdown(data[field])
@@ -0,0 +1,154 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from flask import before_render_template, current_app, g, has_app_context, has_request_context, request, \
+    template_rendered
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+RECORD_PATH = re.compile(r"/records/\d+$")
+
+
+class Histogram:
+    """Prometheus histogram with labels; observing costs a lock and a bisect."""
+
+    def __init__(self, name, help_text, labels, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, seconds, *label_values):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = _labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                bucket_labels = _labels(list(zip(self.labels, label_values)) + [("le", bound)])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """Request, upstream and render timings exported at /ops/metrics."""
+
+    def __init__(self):
+        self.requests = Histogram(
+            "themenus_request_duration_seconds", "Time to answer a request, by route.",
+            ("endpoint", "method", "status"),
+        )
+        self.upstream = Histogram(
+            "themenus_upstream_request_duration_seconds", "NocoDB calls and their latency, by endpoint.",
+            ("method", "endpoint", "status"),
+        )
+        self.renders = Histogram(
+            "themenus_render_duration_seconds", "Time spent rendering markdown and templates.", ("kind",),
+        )
+
+    def render(self, gauges=()):
+        """Prometheus text exposition of the histograms plus `gauges`: (name, help, [(labels, value)])."""
+        lines = self.requests.render() + self.upstream.render() + self.renders.render()
+        for name, help_text, samples in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{_labels(labels.items())} {value}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def upstream_endpoint(url):
+    """Low-cardinality label of a NocoDB URL: the API path with record Ids replaced by {id}."""
+    path = urlsplit(url).path
+    if "/api/v2/" not in path:
+        return "download"
+    return RECORD_PATH.sub("/records/{id}", path.split("/api/v2/", 1)[1])
+
+
+# Per-request Server-Timing
+
+def add_server_timing(name, seconds):
+    """Add `seconds` to the `name` entry of this request's Server-Timing header (outside requests: no-op)."""
+    if not has_request_context():
+        return
+    timings = g.setdefault('server_timing', {})
+    total, count = timings.get(name, (0.0, 0))
+    timings[name] = (total + seconds, count + 1)
+
+
+def observe_render(kind, seconds):
+    if has_app_context():
+        current_app.extensions['metrics'].renders.observe(seconds, kind)
+    add_server_timing(kind, seconds)
+
+
+@contextmanager
+def timed(kind):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_render(kind, time.perf_counter() - started)
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+
+
+def _finish_request(response):
+    elapsed = time.perf_counter() - g.pop('request_started', time.perf_counter())
+    current_app.extensions['metrics'].requests.observe(
+        elapsed, request.endpoint or "unmatched", request.method, str(response.status_code)
+    )
+    entries = [
+        f'{name};dur={total * 1000:.1f};desc="{count} calls"' if count > 1 else f'{name};dur={total * 1000:.1f}'
+        for name, (total, count) in g.get('server_timing', {}).items()
+    ]
+    entries.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers['Server-Timing'] = ", ".join(entries)
+    return response
+
+
+def _template_started(app, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+
+def _template_finished(app, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        observe_render("template", time.perf_counter() - starts.pop())
+
+
+def init_app(app):
+    """Register the metrics registry and the per-request timing hooks."""
+    app.extensions['metrics'] = Metrics()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
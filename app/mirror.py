@@ -0,0 +1,244 @@
+import json
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+from app import noco
+
+# Columns indexed for full-text search, with their bm25 weight (title matches rank first)
+FTS_FIELDS = {
+    "Title": 8.0,
+    "Core": 4.0,
+    "Meal": 2.0,
+    "Source": 1.0,
+    "Notes": 1.0,
+    "Ingredients": 1.0,
+    "Method": 1.0,
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS records (
+    table_id TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at TEXT,
+    PRIMARY KEY (table_id, id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    table_id TEXT PRIMARY KEY,
+    watermark TEXT,
+    synced_at REAL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5 (
+    table_id UNINDEXED,
+    {", ".join(FTS_FIELDS)},
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def _text(value):
+    """Searchable text of a column value (JSON columns are indexed as their JSON text)."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def fts_query(words):
+    """FTS5 query matching rows that contain every word as a token prefix."""
+    return " AND ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+class Mirror:
+    """
+    Local SQLite read replica of NocoDB tables with an FTS5 index.
+
+    Rows are kept as JSON in `records` and their searchable columns in
+    `records_fts` (sharing the rowid). `sync` pulls only rows whose UpdatedAt
+    is at or after the table's watermark, plus the list of Ids to drop rows
+    deleted upstream; local writes are applied right away through the record
+    listener. A table is served from the mirror once it has synced once.
+    """
+
+    def __init__(self, app, path, tables, sync_interval=60):
+        self.app = app
+        self.tables = tuple(tables)
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._versions = {}  # table_id -> number of syncs that changed rows
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+    # Writes
+
+    def _upsert(self, table_id, row):
+        """Insert or merge a row; returns False when the stored row already had these values."""
+        existing = self._db.execute(
+            "SELECT rowid, data FROM records WHERE table_id = ? AND id = ?", (table_id, int(row["Id"]))
+        ).fetchone()
+        if existing is not None:
+            stored = json.loads(existing["data"])
+            row = {**stored, **row}
+            if row == stored:
+                return False
+            self._db.execute("DELETE FROM records_fts WHERE rowid = ?", (existing["rowid"],))
+        cursor = self._db.execute(
+            "INSERT OR REPLACE INTO records (table_id, id, data, updated_at) VALUES (?, ?, ?, ?)",
+            (table_id, int(row["Id"]), json.dumps(row), row.get("UpdatedAt")),
+        )
+        self._db.execute(
+            f"INSERT INTO records_fts (rowid, table_id, {', '.join(FTS_FIELDS)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in FTS_FIELDS)})",
+            (cursor.lastrowid, table_id, *(_text(row.get(field)) for field in FTS_FIELDS)),
+        )
+        return True
+
+    def _delete(self, table_id, record_ids):
+        deleted = 0
+        for record_id in record_ids:
+            existing = self._db.execute(
+                "SELECT rowid FROM records WHERE table_id = ? AND id = ?", (table_id, int(record_id))
+            ).fetchone()
+            if existing is not None:
+                self._db.execute("DELETE FROM records_fts WHERE rowid = ?", (existing["rowid"],))
+                self._db.execute("DELETE FROM records WHERE rowid = ?", (existing["rowid"],))
+                deleted += 1
+        return deleted
+
+    def apply(self, table_id, record_id, data):
+        """Merge a local write into the mirrored row (`data` None deletes it)."""
+        if table_id not in self.tables:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            if data is None:
+                self._delete(table_id, [record_id])
+            else:
+                self._upsert(table_id, {**data, "Id": int(record_id)})
+            self._db.execute("COMMIT")
+
+    def sync(self, table_id):
+        """Pull rows changed since the watermark and drop rows deleted upstream; returns the number pulled."""
+        with self._lock:
+            state = self._db.execute("SELECT watermark FROM sync_state WHERE table_id = ?", (table_id,)).fetchone()
+        watermark = state["watermark"] if state else None
+        params = {"sort": "UpdatedAt"}
+        if watermark:
+            params["where"] = f"(UpdatedAt,gte,exactDate,{watermark})"
+        changed = noco.fetch_all_records(table_id, params)
+        upstream_ids = {row["Id"] for row in noco.fetch_all_records(table_id, {"fields": "Id"})}
+
+        with self._lock:
+            self._db.execute("BEGIN")
+            updated = sum(self._upsert(table_id, row) for row in changed)
+            local_ids = {
+                row["id"] for row in self._db.execute("SELECT id FROM records WHERE table_id = ?", (table_id,))
+            }
+            updated += self._delete(table_id, local_ids - upstream_ids)
+            if updated:
+                self._versions[table_id] = self._versions.get(table_id, 0) + 1
+            watermark = max([watermark or ""] + [row.get("UpdatedAt") or "" for row in changed]) or None
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync_state (table_id, watermark, synced_at) VALUES (?, ?, ?)",
+                (table_id, watermark, time.time()),
+            )
+            self._db.execute("COMMIT")
+        return len(changed)
+
+    def sync_all(self):
+        for table_id in self.tables:
+            try:
+                pulled = self.sync(table_id)
+            except noco.NocoDBError as e:
+                print(f"Mirror sync of {table_id} failed: {e}")
+                continue
+            if pulled:
+                print(f"Mirror synced {pulled} changed rows of {table_id}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._work, name="mirror-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            with self.app.app_context():
+                self.sync_all()
+            self._stopping.wait(self.sync_interval)
+
+    # Reads
+
+    def ready(self, table_id):
+        """True once `table_id` is mirrored and has completed a sync."""
+        if table_id not in self.tables:
+            return False
+        with self._lock:
+            state = self._db.execute("SELECT synced_at FROM sync_state WHERE table_id = ?", (table_id,)).fetchone()
+        return state is not None
+
+    def version(self, table_id):
+        """Changes whenever a sync alters the mirrored rows of `table_id`."""
+        return self._versions.get(table_id, 0)
+
+    def list(self, table_id, fields=None):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM records WHERE table_id = ? ORDER BY id", (table_id,)
+            ).fetchall()
+        return [_project(json.loads(row["data"]), fields) for row in rows]
+
+    def get(self, table_id, record_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM records WHERE table_id = ? AND id = ?", (table_id, int(record_id))
+            ).fetchone()
+        return json.loads(row["data"]) if row is not None else None
+
+    def search(self, table_id, words, fields=None):
+        """Rows containing every word (as a token prefix, in any indexed column), best bm25 rank first."""
+        if not words:
+            return self.list(table_id, fields)
+        weights = ", ".join(str(weight) for weight in (0.0, *FTS_FIELDS.values()))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT records.data FROM records_fts JOIN records ON records.rowid = records_fts.rowid "
+                f"WHERE records_fts MATCH ? AND records_fts.table_id = ? "
+                f"ORDER BY bm25(records_fts, {weights}), records.id",
+                (fts_query(words), table_id),
+            ).fetchall()
+        return [_project(json.loads(row["data"]), fields) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT table_id, COUNT(*) FROM records GROUP BY table_id").fetchall())
+            states = self._db.execute("SELECT table_id, watermark, synced_at FROM sync_state").fetchall()
+        return {
+            state["table_id"]: {
+                "rows": counts.get(state["table_id"], 0),
+                "watermark": state["watermark"],
+                "synced_at": state["synced_at"],
+            }
+            for state in states
+        }
+
+
+def _project(row, fields):
+    return {field: row.get(field) for field in fields} if fields else row
+
+
+def apply_record_change(table_id, record_id, data):
+    """Record listener applying local writes to the mirror right away."""
+    mirror = current_app.extensions.get('mirror')
+    if mirror is not None:
+        mirror.apply(table_id, record_id, data)
@@ -0,0 +1,561 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from flask import current_app, g
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from app.metrics import add_server_timing, upstream_endpoint
+
+# Methods that are safe to retry: NocoDB deletes are keyed by Id in the body
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class NocoDBError(Exception):
+    """Raised when NocoDB answers a request with a non-200 status (or not at all)."""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ConnectionStats:
+    """Counts connection checkouts from the pool and how many of them had to open a new connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.checkouts = 0
+        self.opened = 0
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": self.opened,
+                "connections_reused": self.checkouts - self.opened,
+            }
+
+
+class CircuitBreaker:
+    """
+    Tracks NocoDB health and stops calling it while it is failing.
+
+    After `failure_threshold` consecutive failures (no answer, or a 5xx) the
+    circuit opens and calls fail immediately. Once `reset_timeout` seconds
+    have passed a single trial call is let through (half-open): success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self.rejected = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_running:
+                    print(f"NocoDB circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def as_dict(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected}
+
+
+class SingleFlight:
+    """
+    Lets concurrent callers asking for the same key share one call and its result.
+
+    The first caller of a key runs the call; callers arriving while it is in
+    flight wait for it and get the same result (or exception). Nothing is
+    kept once the call returns, so later callers run it again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> in-flight call
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "upstream_calls": self.calls,
+                "calls_saved": self.shared,
+                "in_flight": len(self._calls),
+            }
+
+
+def _counting_pool_class(base, stats):
+    class CountingPool(base):
+        def _get_conn(self, timeout=None):
+            stats.count("checkouts")
+            return super()._get_conn(timeout)
+
+        def _new_conn(self):
+            stats.count("opened")
+            return super()._new_conn()
+
+    return CountingPool
+
+
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool_class(HTTPConnectionPool, self.stats),
+            "https": _counting_pool_class(HTTPSConnectionPool, self.stats),
+        }
+
+
+class NocoClient:
+    """
+    Shared NocoDB v2 REST client.
+
+    Holds one pooled keep-alive `requests.Session` (with the API token set
+    once), applies connect/read timeouts to every call and retries idempotent
+    calls with exponential backoff on connection errors and 502/503/504.
+    Identical concurrent GETs share one upstream call (see SingleFlight),
+    and calls fail fast with a 503 while the circuit breaker is open.
+    """
+
+    def __init__(self, base_url, api_token, pool_size=10, connect_timeout=3.05, read_timeout=10,
+                 retries=3, backoff_factor=0.3, breaker_threshold=5, breaker_reset=30, metrics=None):
+        self.base_url = base_url
+        self.metrics = metrics
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats = ConnectionStats()
+        self.flights = SingleFlight()
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = _CountingAdapter(self.stats, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers["xc-token"] = api_token or ""
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path):
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if not self.breaker.allow():
+            raise NocoDBError("NocoDB is unavailable, please try again shortly", 503)
+        self.stats.count("requests")
+        url = self.url(path)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = str(response.status_code)
+        except requests.Timeout as e:
+            self.breaker.record_failure()
+            print(f"NocoDB {method} {path} timed out: {e}")
+            raise NocoDBError(f"NocoDB {method} {path} timed out", 504) from e
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            print(f"NocoDB {method} {path} failed: {e}")
+            raise NocoDBError(f"NocoDB {method} {path} failed", 502) from e
+        finally:
+            elapsed = time.perf_counter() - started
+            if self.metrics is not None:
+                self.metrics.upstream.observe(elapsed, method, upstream_endpoint(url), status)
+            add_server_timing("noco", elapsed)
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, path, **kwargs):
+        # Only plain (non-streamed) GETs are shared: their response body is read once and reusable
+        if set(kwargs) - {"params"}:
+            return self.request("GET", path, **kwargs)
+        params = tuple(sorted((key, str(value)) for key, value in (kwargs.get("params") or {}).items()))
+        return self.flights.do(("GET", self.url(path), params), lambda: self.request("GET", path, **kwargs))
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def download(self, signed_path, **kwargs):
+        """GET a stored attachment by its signedPath, which is relative to the NocoDB root rather than the API."""
+        root = self.base_url.split("/api/")[0]
+        return self.get(f"{root}/{signed_path.lstrip('/')}", **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class Revalidator:
+    """Refreshes expired cache entries in the background, one refresh per key at a time."""
+
+    def __init__(self, app, workers=4):
+        self.app = app
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="revalidate")
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def submit(self, key, fetch):
+        """Start `fetch` (in an app context) unless a refresh of `key` is already running; returns its future."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._futures[key] = self._pool.submit(self._run, fetch)
+                future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _run(self, fetch):
+        with self.app.app_context():
+            return fetch()
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+
+def get_client():
+    return current_app.extensions['noco_client']
+
+
+def get_cache():
+    return current_app.extensions['record_cache']
+
+
+def get_mirror(table_id):
+    """The local mirror (app/mirror.py) when it is enabled and can serve `table_id`, else None."""
+    mirror = current_app.extensions.get('mirror')
+    if mirror is not None and mirror.ready(table_id):
+        return mirror
+    return None
+
+
+def _fresh_or_stale(key, stale, fetch):
+    """
+    Return `fetch()`, or the expired cached value `stale` when NocoDB cannot answer in time.
+
+    Without a stale value this is just `fetch()`. Otherwise the refresh runs
+    in the background and is waited for up to STALE_REFRESH_WAIT seconds; if
+    it fails (e.g. the circuit is open) or is still running, the stale value
+    is served, `g.served_stale` is set, and a slow refresh still updates the
+    cache when it completes.
+    """
+    if stale is None:
+        return fetch()
+    future = current_app.extensions['revalidator'].submit(key, fetch)
+    try:
+        return future.result(timeout=current_app.config['STALE_REFRESH_WAIT'])
+    except (FutureTimeout, NocoDBError) as e:
+        if isinstance(e, NocoDBError) and e.status_code < 500:
+            raise  # NocoDB answered (e.g. the record is gone), the cached copy is not a stand-in
+        print(f"Serving stale {key}: {str(e) or 'refresh still running'}")
+        g.served_stale = True
+        return stale
+
+
+def notify_record_change(table_id, record_id, data):
+    """
+    Tell the registered record listeners (search indexes, ...) about a local or pushed write.
+
+    `data` holds the changed columns, or None when the record was deleted.
+    """
+    for listener in current_app.extensions['record_listeners']:
+        listener(table_id, int(record_id), data)
+
+
+def apply_remote_change(table_id, record_id, data):
+    """
+    Apply a change made outside this app (e.g. pushed by a NocoDB webhook).
+
+    `data` is the full row as NocoDB now has it, or None when it was deleted.
+    """
+    cache = get_cache()
+    cache.invalidate_record(table_id, record_id)
+    if data is not None:
+        cache.set_record(table_id, record_id, data)
+    notify_record_change(table_id, record_id, data)
+
+
+def records_path(table_id, record_id=None):
+    path = f"tables/{table_id}/records"
+    if record_id is not None:
+        path = f"{path}/{record_id}"
+    return path
+
+
+def _check(response, action):
+    if response.status_code != 200:
+        print(f"Failed to {action}: {response.status_code} - {response.text}")
+        raise NocoDBError(f"Failed to {action}", response.status_code)
+    return response.json()
+
+
+def fetch_all_records(table_id, params=None):
+    """
+    Download every row of `table_id`, following NocoDB's pageInfo.
+
+    `params` are passed through (e.g. `where`, `fields`, `sort`). The first
+    page tells us the total row count and the page size the server actually
+    honoured; the remaining pages are then requested in parallel, at most
+    NOCO_DB_PAGE_CONCURRENCY at a time, and stitched back in order.
+    """
+    client = get_client()
+    path = records_path(table_id)
+    page_size = current_app.config['NOCO_DB_PAGE_SIZE']
+    params = {**(params or {}), "limit": page_size}
+
+    def fetch_page(offset):
+        response = client.get(path, params={**params, "offset": offset})
+        return _check(response, f"list records of {table_id} (offset {offset})")
+
+    first = fetch_page(0)
+    rows = list(first.get("list", []))
+    page_info = first.get("pageInfo") or {}
+    if page_info.get("isLastPage", True) or not rows:
+        return rows
+
+    page_size = page_info.get("pageSize") or len(rows)
+    total_rows = page_info.get("totalRows") or 0
+    offsets = range(len(rows), total_rows, page_size)
+    with ThreadPoolExecutor(max_workers=current_app.config['NOCO_DB_PAGE_CONCURRENCY']) as pool:
+        for page in pool.map(fetch_page, offsets):
+            rows.extend(page.get("list", []))
+    return rows
+
+
+def iter_records(table_id, params=None):
+    """
+    Yield every row of `table_id` one page at a time, for exports.
+
+    Pages are requested one after the other and never cached, so memory
+    stays bounded by a single page however large the table is.
+    """
+    client = get_client()
+    path = records_path(table_id)
+    params = {**(params or {}), "limit": current_app.config['NOCO_DB_PAGE_SIZE']}
+    offset = 0
+    while True:
+        response = client.get(path, params={**params, "offset": offset})
+        page = _check(response, f"list records of {table_id} (offset {offset})")
+        rows = page.get("list", [])
+        yield from rows
+        if (page.get("pageInfo") or {}).get("isLastPage", True) or not rows:
+            return
+        offset += len(rows)
+
+
+def list_records(table_id, fields=None):
+    """
+    Return every row of `table_id`, served from the record cache when fresh.
+
+    `fields` projects the listing onto the given columns (NocoDB's `fields`
+    parameter) so list views do not download large text columns.
+    """
+    fields = tuple(fields) if fields else None
+    mirror = get_mirror(table_id)
+    if mirror is not None:
+        return mirror.list(table_id, fields)
+
+    cache = get_cache()
+    rows, fresh = cache.get_list_stale(table_id, fields)
+    if fresh:
+        return rows
+
+    def fetch():
+        rows = fetch_all_records(table_id, {"fields": ",".join(fields)} if fields else None)
+        cache.set_list(table_id, rows, fields)
+        return rows
+
+    return _fresh_or_stale(("list", table_id, fields), rows, fetch)
+
+
+def get_record(table_id, record_id):
+    """Return a single row of `table_id`, served from the mirror or the record cache when possible."""
+    mirror = get_mirror(table_id)
+    data = mirror.get(table_id, record_id) if mirror is not None else None
+    if data is not None:
+        return data
+
+    cache = get_cache()
+    data, fresh = cache.get_record_stale(table_id, record_id)
+    if fresh:
+        return data
+
+    def fetch():
+        response = get_client().get(records_path(table_id, record_id))
+        data = _check(response, f"fetch record {record_id} of {table_id}")
+        cache.set_record(table_id, record_id, data)
+        return data
+
+    return _fresh_or_stale(("record", table_id, int(record_id)), data, fetch)
+
+
+def fetch_records(table_id, record_ids):
+    """
+    Fetch rows by Id straight from NocoDB, bypassing the mirror and caches.
+
+    Used before writes that copy rows, so they never copy stale data. All
+    Ids go into one `where` filter, so the request count does not grow with
+    the number of rows (beyond paging). Returns {Id: row} for those that exist.
+    """
+    if not record_ids:
+        return {}
+    where = "~or".join(f"(Id,eq,{int(record_id)})" for record_id in record_ids)
+    return {int(row["Id"]): row for row in fetch_all_records(table_id, {"where": where})}
+
+
+def get_record_with_pending(table_id, record_id):
+    """get_record, with edits still waiting in the edit coalescer applied on top."""
+    data = get_record(table_id, record_id)
+    pending = current_app.extensions['edit_coalescer'].pending(table_id, record_id)
+    return {**data, **pending} if pending else data
+
+
+def create_record(table_id, payload):
+    """Insert a row and return NocoDB's response (which carries the new Id)."""
+    response = get_client().post(records_path(table_id), json=payload)
+    data = _check(response, f"create record in {table_id}")
+    get_cache().invalidate_record(table_id, data["Id"])
+    notify_record_change(table_id, data["Id"], payload)
+    return data
+
+
+def create_records(table_id, rows):
+    """Bulk insert rows in one request; returns NocoDB's [{Id}, ...] in the order of `rows`."""
+    response = get_client().post(records_path(table_id), json=rows)
+    created = _check(response, f"create {len(rows)} records in {table_id}")
+    cache = get_cache()
+    for row, data in zip(rows, created):
+        cache.invalidate_record(table_id, data["Id"])
+        notify_record_change(table_id, data["Id"], row)
+    return created
+
+
+def update_record(table_id, data, cached_changes=None):
+    """
+    PATCH a row (`data` must include its Id) and merge the change into the cache.
+
+    `cached_changes` overrides what is merged into the cached record, for
+    columns whose wire format differs from the one NocoDB returns (e.g. the
+    JSON-encoded Photo attachment list).
+    """
+    response = get_client().patch(records_path(table_id), json=data)
+    result = _check(response, f"update record {data.get('Id')} of {table_id}")
+    changes = {**data, **(cached_changes or {})}
+    get_cache().update_record(table_id, data["Id"], changes)
+    notify_record_change(table_id, data["Id"], changes)
+    return result
+
+
+def update_fields(table_id, record_id, changes):
+    """PATCH only the given columns of one row, without reading it first."""
+    return update_record(table_id, {"Id": record_id, **changes})
+
+
+def update_records(table_id, rows):
+    """Bulk PATCH several rows (each dict must include its Id) in one request."""
+    response = get_client().patch(records_path(table_id), json=rows)
+    result = _check(response, f"update records {[row['Id'] for row in rows]} of {table_id}")
+    cache = get_cache()
+    for row in rows:
+        cache.update_record(table_id, row["Id"], row)
+        notify_record_change(table_id, row["Id"], row)
+    return result
+
+
+def delete_records(table_id, record_ids):
+    """Delete rows by Id and drop them from the cache."""
+    payload = [{"Id": record_id} for record_id in record_ids]
+    response = get_client().delete(records_path(table_id), json=payload)
+    result = _check(response, f"delete records {record_ids} of {table_id}")
+    cache = get_cache()
+    for record_id in record_ids:
+        cache.invalidate_record(table_id, record_id)
+        notify_record_change(table_id, record_id, None)
+    return result
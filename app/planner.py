@@ -0,0 +1,242 @@
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from flask import current_app
+
+from app import noco
+from app.fragments import table_version
+
+# Recipe columns the planner reads
+PLANNER_FIELDS = ('Id', 'Title', 'Meal', 'Core', 'LeftOvers')
+
+# Score of a plan: each distinct Core adds VARIETY_WEIGHT, each recipe planned
+# in the last PLANNER_RECENT_DAYS costs RECENT_PENALTY, a recipe cooked twice costs REPEAT_PENALTY
+VARIETY_WEIGHT = 1.0
+RECENT_PENALTY = 2.0
+REPEAT_PENALTY = 5.0
+
+# Columns of the Menus table a plan is saved to (one row per slot) and recently planned recipes are
+# read from, by role: the day (ISO date), meal type, recipe Id (number), a copy of the recipe title and
+# whether the slot is a leftover night (checkbox). NOCO_DB_MENUS_COLUMNS renames them ("date=Day,recipe_id=Recipe")
+MENU_COLUMNS = {"date": "Date", "meal": "Meal", "recipe_id": "RecipeId", "title": "Title", "leftovers": "LeftOvers"}
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+class PlanError(ValueError):
+    """Raised when the recipe pool cannot satisfy the requested week."""
+
+
+def makes_leftovers(value):
+    """Whether a recipe's LeftOvers column says it makes enough for another meal."""
+    if isinstance(value, str):
+        return value.strip().lower() not in ('', 'no', 'false', '0', 'none')
+    return bool(value)
+
+
+class RecipeFeatures:
+    """
+    The recipe pool as NumPy arrays, indexed by position: meal type and Core
+    codes (-1 when unset) and whether the recipe makes leftovers.
+    """
+
+    def __init__(self, rows):
+        self.rows = [row for row in rows if row.get('Id') is not None]
+        self.ids = np.array([int(row['Id']) for row in self.rows], dtype=np.int64)
+        self.meals = {}
+        self.cores = {}
+        self.meal = np.array([self._code(self.meals, row.get('Meal')) for row in self.rows], dtype=np.int32)
+        self.core = np.array([self._code(self.cores, row.get('Core')) for row in self.rows], dtype=np.int32)
+        self.leftovers = np.array([makes_leftovers(row.get('LeftOvers')) for row in self.rows], dtype=bool)
+        self.positions = {int(record_id): position for position, record_id in enumerate(self.ids.tolist())}
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _code(codes, value):
+        if not isinstance(value, str) or not value.strip():
+            return -1
+        return codes.setdefault(value.strip().lower(), len(codes))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def eligible(self, meal, leftovers=False):
+        """Positions of the recipes for a meal type (that also make leftovers, when asked)."""
+        mask = self.meal == self.meals.get(meal.strip().lower(), -2)
+        if leftovers:
+            mask &= self.leftovers
+        return np.nonzero(mask)[0]
+
+
+def week_slots(start, meals=('Dinner',), leftover_days=(), days=7):
+    """
+    The slots of a plan: one per day and meal type, in eating order.
+
+    On `leftover_days` (weekday names), the last meal of the day is a
+    leftover night instead of a cooked meal.
+    """
+    leftover_days = {day.strip().lower() for day in leftover_days}
+    slots = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        for number, meal in enumerate(meals):
+            slots.append({
+                "date": day,
+                "meal": meal,
+                "leftovers": number == len(meals) - 1 and WEEKDAYS[day.weekday()].lower() in leftover_days,
+            })
+    return slots
+
+
+class MenuPlanner:
+    """
+    Pick recipes for a list of slots (see week_slots) by scoring many random
+    candidate plans at once.
+
+    Candidates are drawn per slot from the recipes of the slot's meal type
+    as a (plans x slots) matrix of recipe positions. A leftover slot repeats
+    the recipe of the cooked slot before it, which is then drawn only from
+    recipes that make leftovers. Plans serving the same Core on consecutive
+    days (a leftover night and the meal it comes from excepted) are
+    rejected. Among the others the best score (see VARIETY_WEIGHT) wins.
+    All checks are array operations over the whole candidate matrix.
+    """
+
+    def __init__(self, features, slots, recent_ids=(), seed=None):
+        self.features = features
+        self.slots = slots
+        self.rng = np.random.default_rng(seed)
+
+        # Cooked slot a leftover slot eats from
+        self.source = {}
+        cooked = None
+        for number, slot in enumerate(slots):
+            if slot['leftovers']:
+                if cooked is None:
+                    raise PlanError("A leftover night needs a cooked meal before it")
+                self.source[number] = cooked
+            else:
+                cooked = number
+        self.cooked = [number for number in range(len(slots)) if number not in self.source]
+
+        self.pools = {}
+        for number in self.cooked:
+            pool = features.eligible(slots[number]['meal'], leftovers=number in self.source.values())
+            if not len(pool):
+                kind = " that makes leftovers" if number in self.source.values() else ""
+                raise PlanError(f"No {slots[number]['meal']} recipe{kind} for {slots[number]['date']}")
+            self.pools[number] = pool
+
+        # Slot pairs on consecutive days that must not share a Core
+        self.pairs = np.array([
+            (first, second)
+            for first in range(len(slots)) for second in range(len(slots))
+            if (slots[second]['date'] - slots[first]['date']).days == 1
+            and self.source.get(second, second) != self.source.get(first, first)
+        ], dtype=np.int64).reshape(-1, 2)
+
+        self.base = np.zeros(len(features), dtype=np.float64)
+        recent = [features.positions[record_id] for record_id in recent_ids if record_id in features.positions]
+        self.base[recent] -= RECENT_PENALTY
+
+    def candidates(self, count):
+        """A (count x slots) matrix of random recipe positions satisfying the meal types."""
+        plans = np.empty((count, len(self.slots)), dtype=np.int64)
+        for number, pool in self.pools.items():
+            plans[:, number] = pool[self.rng.integers(len(pool), size=count)]
+        for number, cooked in self.source.items():
+            plans[:, number] = plans[:, cooked]
+        return plans
+
+    def score(self, plans):
+        """Score of every candidate plan; -inf for plans breaking the Core rule."""
+        cores = self.features.core[plans]
+        first, second = self.pairs[:, 0], self.pairs[:, 1]
+        clash = ((cores[:, first] == cores[:, second]) & (cores[:, first] >= 0)).any(axis=1)
+
+        cooked = np.sort(plans[:, self.cooked], axis=1)
+        repeats = (cooked[:, 1:] == cooked[:, :-1]).sum(axis=1)
+        cooked_cores = np.sort(self.features.core[cooked], axis=1)
+        variety = 1 + (cooked_cores[:, 1:] != cooked_cores[:, :-1]).sum(axis=1)
+
+        scores = self.base[cooked].sum(axis=1) + VARIETY_WEIGHT * variety - REPEAT_PENALTY * repeats
+        scores[clash] = -np.inf
+        return scores
+
+    def best(self, count=2000, rounds=10):
+        """The best of up to `rounds` batches of `count` candidates, as a list of filled in slots."""
+        best_plan, best_score = None, -np.inf
+        for _ in range(rounds):
+            plans = self.candidates(count)
+            scores = self.score(plans)
+            winner = int(np.argmax(scores))
+            if scores[winner] > best_score:
+                best_plan, best_score = plans[winner], scores[winner]
+            if best_plan is not None and best_score >= VARIETY_WEIGHT * len(self.cooked):
+                break  # every cooked meal is a different, not recently planned Core; nothing scores higher
+        if best_plan is None:
+            raise PlanError("No plan avoids repeating a Core on consecutive days; add recipes or change the slots")
+        return [
+            {**slot, "recipe": self.features.rows[position]}
+            for slot, position in zip(self.slots, best_plan.tolist())
+        ]
+
+
+def get_features(table_id):
+    """The planner's view of the recipe pool, rebuilt when recipes change or after SEARCH_INDEX_TTL."""
+    cached = current_app.extensions['planner_features'].get(table_id)
+    version = table_version(table_id)
+    if (cached is None or cached[0] != version
+            or time.monotonic() - cached[1].built_at > current_app.config['SEARCH_INDEX_TTL']):
+        cached = (version, RecipeFeatures(noco.list_records(table_id, PLANNER_FIELDS)))
+        current_app.extensions['planner_features'][table_id] = cached
+    return cached[1]
+
+
+def recent_recipe_ids(menus_table_id, start):
+    """Ids of the recipes planned in the PLANNER_RECENT_DAYS before `start`."""
+    since = start - timedelta(days=current_app.config['PLANNER_RECENT_DAYS'])
+    columns = current_app.config['NOCO_DB_MENUS_COLUMNS']
+    day, recipe_id = columns['date'], columns['recipe_id']
+    rows = noco.fetch_all_records(menus_table_id, {
+        "where": f"({day},gte,exactDate,{since.isoformat()})~and({day},lt,exactDate,{start.isoformat()})",
+        "fields": recipe_id,
+    })
+    return {int(row[recipe_id]) for row in rows if row.get(recipe_id) is not None}
+
+
+def plan_week(recipes_table_id, menus_table_id, start, meals=('Dinner',), leftover_days=(), days=7, seed=None):
+    """Plan `days` days from `start` (see MenuPlanner); recipes planned recently are avoided."""
+    planner = MenuPlanner(
+        get_features(recipes_table_id),
+        week_slots(start, meals, leftover_days, days),
+        recent_ids=recent_recipe_ids(menus_table_id, start) if menus_table_id else (),
+        seed=seed,
+    )
+    return planner.best(current_app.config['PLANNER_CANDIDATES'], current_app.config['PLANNER_ROUNDS'])
+
+
+def menu_rows(plan):
+    """Menus table rows for a plan: one per slot (see MENU_COLUMNS)."""
+    columns = current_app.config['NOCO_DB_MENUS_COLUMNS']
+    return [
+        {
+            columns['date']: slot['date'].isoformat(),
+            columns['meal']: slot['meal'],
+            columns['recipe_id']: slot['recipe']['Id'],
+            columns['title']: slot['recipe'].get('Title'),
+            columns['leftovers']: slot['leftovers'],
+        }
+        for slot in plan
+    ]
+
+
+def save_plan(menus_table_id, plan):
+    """Write a plan to the Menus table in one bulk insert; returns the new row Ids."""
+    return [row["Id"] for row in noco.create_records(menus_table_id, menu_rows(plan))]
+
+
+def next_monday(today=None):
+    today = today or date.today()
+    return today + timedelta(days=(7 - today.weekday()) % 7 or 7)
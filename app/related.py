@@ -0,0 +1,358 @@
+import math
+import re
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+
+from app import noco
+
+# Text the similarity of two recipes is computed over, with the weight a
+# term in each field gets (shared title and core ingredient count most)
+RELATED_FIELDS = {
+    "Title": 3,
+    "Core": 3,
+    "Meal": 2,
+    "Source": 1,
+    "Ingredients": 1,
+}
+
+# Tokens that say nothing about a dish: filler words, units and URL parts
+STOPWORDS = {
+    "a", "an", "and", "or", "of", "the", "to", "in", "on", "with", "for", "from", "into", "at", "by",
+    "cup", "cups", "tbsp", "tsp", "tablespoon", "tablespoons", "teaspoon", "teaspoons", "lb", "lbs",
+    "oz", "g", "kg", "ml", "l", "pinch", "large", "small", "medium", "chopped", "sliced", "diced",
+    "http", "https", "www", "com",
+}
+
+TOKEN = re.compile(r"[a-z]+")
+
+# Rows scored at once when building; bounds the dense score block to about this many floats
+BUILD_BLOCK_CELLS = 4_000_000
+# The most common terms are scored with a dense matrix product instead of
+# through their (long) postings lists
+DENSE_TERMS = 256
+
+
+def terms(row, fields=None):
+    """{term: weighted count} of the text fields of a row."""
+    counts = {}
+    for field, weight in (fields or RELATED_FIELDS).items():
+        value = row.get(field)
+        if not isinstance(value, str):
+            continue
+        for token in TOKEN.findall(value.lower()):
+            if len(token) > 1 and token not in STOPWORDS:
+                counts[token] = counts.get(token, 0) + weight
+    return counts
+
+
+class RelatedIndex:
+    """
+    Precomputed "related recipes" table over TF-IDF vectors of recipe text.
+
+    build() turns every row into an L2-normalised TF-IDF vector (sublinear
+    term frequency, smoothed idf) kept as NumPy CSR arrays, then scores all
+    pairs block by block through the term -> rows postings and keeps the
+    `k` most similar rows of each. Terms found in a single row or in more
+    than `max_df` of them are left out: they cannot relate two recipes, or
+    relate nearly all of them. The DENSE_TERMS most common terms, whose
+    postings would dominate the pair count, are scored with one matrix
+    product per block instead.
+
+    related() is then a dict lookup plus k row references. upsert() and
+    remove() keep the table in step with single edits: the changed row is
+    re-vectorised against the existing vocabulary and idf, and its scores
+    against every row (one sparse pass) update its own neighbours and any
+    list it now enters or leaves. Vocabulary, idf and lists that lost a
+    neighbour only catch up on the next build.
+    """
+
+    def __init__(self, k=6, max_df=0.5, fields=None, columns=None):
+        self.k = k
+        self.max_df = max_df
+        self.fields = fields or RELATED_FIELDS
+        # Columns kept on the rows (for rendering), on top of the text fields
+        self.columns = columns
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._ids = []                # position -> record Id (None once removed)
+        self._positions = {}          # record Id -> position
+        self._rows = []               # position -> row dict
+        self._vocabulary = {}         # term -> column
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        # Row vectors as CSR arrays, spliced in place by upsert()/remove()
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._data = np.zeros(0, dtype=np.float32)
+        self._neighbors = np.zeros((0, self.k), dtype=np.int32)   # -1 pads short lists
+        self._scores = np.zeros((0, self.k), dtype=np.float32)
+        self.built_at = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def nbytes(self):
+        """Memory held by the vectors and the neighbour table (not counting the rows)."""
+        return (self._indptr.nbytes + self._indices.nbytes + self._data.nbytes
+                + self._neighbors.nbytes + self._scores.nbytes)
+
+    # Vectors
+
+    def _keep(self, row):
+        columns = set(self.fields) | set(self.columns or ()) | {"Id"}
+        return {column: row.get(column) for column in columns}
+
+    def _vector(self, counts):
+        columns, weights = [], []
+        for term, count in counts.items():
+            column = self._vocabulary.get(term)
+            if column is not None:
+                columns.append(column)
+                weights.append((1 + math.log(count)) * self._idf[column])
+        columns = np.array(columns, dtype=np.int32)
+        weights = np.array(weights, dtype=np.float32)
+        norm = np.linalg.norm(weights)
+        if norm:
+            weights /= norm
+        order = np.argsort(columns)
+        return columns[order], weights[order]
+
+    def _set_vector(self, position, columns, weights):
+        """Replace (or, at the end, append) the vector of a row in the CSR arrays."""
+        if position == len(self._indptr) - 1:
+            self._indptr = np.append(self._indptr, self._indptr[-1])
+        start, stop = self._indptr[position], self._indptr[position + 1]
+        self._indices = np.concatenate([self._indices[:start], columns, self._indices[stop:]])
+        self._data = np.concatenate([self._data[:start], weights, self._data[stop:]])
+        self._indptr[position + 1:] += len(columns) - (stop - start)
+
+    def _vector_at(self, position):
+        start, stop = self._indptr[position], self._indptr[position + 1]
+        return self._indices[start:stop], self._data[start:stop]
+
+    def _similarities(self, columns, weights):
+        """Cosine similarity of one vector to every row."""
+        indptr, indices, data = self._indptr, self._indices, self._data
+        dense = np.zeros(len(self._idf), dtype=np.float32)
+        dense[columns] = weights
+        products = np.concatenate([dense[indices] * data, [0]])
+        # reduceat needs in-range starts; empty rows are zeroed afterwards
+        scores = np.add.reduceat(products, np.minimum(indptr[:-1], len(products) - 1))
+        scores[indptr[:-1] == indptr[1:]] = 0
+        return scores
+
+    # Building and maintenance
+
+    def build(self, rows):
+        rows = [self._keep(row) for row in rows]
+        counts = [terms(row, self.fields) for row in rows]
+
+        document_frequency = {}
+        for row_counts in counts:
+            for term in row_counts:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        limit = self.max_df * len(rows)
+        vocabulary = {}
+        idf = []
+        for term, frequency in document_frequency.items():
+            if 1 < frequency <= limit:
+                vocabulary[term] = len(idf)
+                idf.append(math.log((1 + len(rows)) / (1 + frequency)) + 1)
+
+        with self._lock:
+            self._reset()
+            self._vocabulary = vocabulary
+            self._idf = np.array(idf, dtype=np.float32)
+            vectors = [self._vector(row_counts) for row_counts in counts]
+            for position, row in enumerate(rows):
+                record_id = int(row["Id"])
+                self._ids.append(record_id)
+                self._positions[record_id] = position
+                self._rows.append(row)
+            self._alive = np.ones(len(rows), dtype=bool)
+            self._indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum([len(columns) for columns, _ in vectors], out=self._indptr[1:])
+            if vectors:
+                self._indices = np.concatenate([columns for columns, _ in vectors])
+                self._data = np.concatenate([weights for _, weights in vectors])
+            self._neighbors, self._scores = self._top_neighbors()
+            self.built_at = time.monotonic()
+            self.version += 1
+
+    def _top_neighbors(self):
+        """Top-k (position, score) of every row, scoring rows in blocks."""
+        indptr, indices, data = self._indptr, self._indices, self._data
+        count = len(self._ids)
+        neighbors = np.full((count, self.k), -1, dtype=np.int32)
+        scores = np.zeros((count, self.k), dtype=np.float32)
+        if count < 2 or not len(indices):
+            return neighbors, scores
+        row_of = np.repeat(np.arange(count, dtype=np.int64), np.diff(indptr))
+
+        # The most common terms as a dense rows x terms matrix ...
+        frequency = np.bincount(indices, minlength=len(self._idf))
+        dense_terms = np.argsort(-frequency, kind="stable")[:DENSE_TERMS]
+        dense_column = np.full(len(self._idf), -1, dtype=np.int64)
+        dense_column[dense_terms] = np.arange(len(dense_terms))
+        in_dense = dense_column[indices] >= 0
+        dense = np.zeros((count, len(dense_terms)), dtype=np.float32)
+        dense[row_of[in_dense], dense_column[indices[in_dense]]] = data[in_dense]
+
+        # ... and term -> (rows, weights) postings of the others, i.e. CSC order
+        sparse_data = np.where(in_dense, 0, data)
+        order = np.argsort(np.where(in_dense, len(self._idf), indices), kind="stable")[:np.count_nonzero(~in_dense)]
+        posting_rows = row_of[order]
+        posting_data = data[order]
+        term_ptr = np.zeros(len(self._idf) + 1, dtype=np.int64)
+        np.cumsum(np.where(dense_column >= 0, 0, frequency), out=term_ptr[1:])
+
+        keep = min(self.k, count - 1)
+        block = max(1, BUILD_BLOCK_CELLS // count)
+        for start in range(0, count, block):
+            stop = min(start + block, count)
+            first, last = indptr[start], indptr[stop]
+            block_terms = indices[first:last]
+            lengths = term_ptr[block_terms + 1] - term_ptr[block_terms]
+            # Every (row in block, posting of one of its sparse terms) pair
+            offsets = np.repeat(term_ptr[block_terms] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            pair_rows = np.repeat(row_of[first:last] - start, lengths)
+            pair_weights = np.repeat(sparse_data[first:last], lengths) * posting_data[offsets]
+            block_scores = dense[start:stop] @ dense.T
+            block_scores += np.bincount(
+                pair_rows * count + posting_rows[offsets], weights=pair_weights, minlength=(stop - start) * count
+            ).reshape(stop - start, count)
+            block_scores[np.arange(stop - start), np.arange(start, stop)] = -1
+
+            top = np.argpartition(-block_scores, keep - 1, axis=1)[:, :keep]
+            top_scores = np.take_along_axis(block_scores, top, axis=1)
+            ranked = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, ranked, axis=1)
+            top_scores = np.take_along_axis(top_scores, ranked, axis=1)
+            top[top_scores <= 0] = -1
+            neighbors[start:stop, :keep] = top
+            scores[start:stop, :keep] = np.maximum(top_scores, 0)
+        return neighbors, scores
+
+    def upsert(self, row):
+        """Insert a row, or merge it into the indexed row with the same Id, and update the neighbour table."""
+        with self._lock:
+            record_id = int(row["Id"])
+            position = self._positions.get(record_id)
+            if position is None:
+                position = len(self._ids)
+                self._ids.append(record_id)
+                self._positions[record_id] = position
+                self._rows.append({})
+                self._alive = np.append(self._alive, True)
+                self._neighbors = np.vstack([self._neighbors, np.full((1, self.k), -1, dtype=np.int32)])
+                self._scores = np.vstack([self._scores, np.zeros((1, self.k), dtype=np.float32)])
+            self._rows[position] = self._keep({**self._rows[position], **row})
+            self._set_vector(position, *self._vector(terms(self._rows[position], self.fields)))
+
+            similarities = self._similarities(*self._vector_at(position))
+            similarities[position] = 0
+            similarities[~self._alive] = 0
+
+            # Its own list
+            top = np.argsort(-similarities, kind="stable")[:self.k]
+            top = top[similarities[top] > 0]
+            self._neighbors[position] = -1
+            self._scores[position] = 0
+            self._neighbors[position, :len(top)] = top
+            self._scores[position, :len(top)] = similarities[top]
+
+            # Lists it is in (its score changed) or now beats the last entry of
+            listed = np.any(self._neighbors == position, axis=1)
+            enters = similarities > np.where(self._neighbors[:, -1] < 0, 0, self._scores[:, -1])
+            for other in np.nonzero(listed | enters)[0]:
+                self._place(other, position, similarities[other])
+            self.version += 1
+
+    def remove(self, record_id):
+        with self._lock:
+            position = self._positions.pop(int(record_id), None)
+            if position is None:
+                return
+            self._ids[position] = None
+            self._rows[position] = None
+            self._alive[position] = False
+            self._set_vector(position, np.zeros(0, np.int32), np.zeros(0, np.float32))
+            self._neighbors[position] = -1
+            for other in np.nonzero(np.any(self._neighbors == position, axis=1))[0]:
+                self._place(other, position, 0)
+            self.version += 1
+
+    def _place(self, row, position, score):
+        """Put `position` with `score` into the neighbour list of `row` (a score of 0 takes it out)."""
+        entries = [
+            (s, p) for p, s in zip(self._neighbors[row].tolist(), self._scores[row].tolist())
+            if p >= 0 and p != position
+        ]
+        if score > 0:
+            entries.append((float(score), position))
+        entries.sort(key=lambda entry: -entry[0])
+        entries = entries[:self.k]
+        self._neighbors[row] = -1
+        self._scores[row] = 0
+        for i, (s, p) in enumerate(entries):
+            self._neighbors[row, i] = p
+            self._scores[row, i] = s
+
+    # Querying
+
+    def related(self, record_id, limit=None):
+        """Rows most similar to `record_id`, best first ([] when it is not indexed)."""
+        with self._lock:
+            position = self._positions.get(int(record_id))
+            if position is None:
+                return []
+            return [
+                self._rows[neighbor]
+                for neighbor in self._neighbors[position, :limit or self.k].tolist()
+                if neighbor >= 0
+            ]
+
+
+def get_related_index(table_id, columns=None):
+    """
+    Return the related-recipes index of `table_id`, building it on first use.
+
+    Once it is older than RELATED_INDEX_TTL it keeps answering while a
+    rebuild runs in the background (see noco.Revalidator).
+    """
+    indexes = current_app.extensions['related_indexes']
+    index = indexes.get(table_id)
+    if index is None:
+        index = indexes.setdefault(table_id, RelatedIndex(
+            k=current_app.config['RELATED_RECIPES_K'],
+            max_df=current_app.config['RELATED_MAX_DF'],
+            columns=columns,
+        ))
+
+    fields = tuple(dict.fromkeys(("Id",) + tuple(index.fields) + tuple(index.columns or ())))
+    if index.built_at is None:
+        with index._lock:
+            if index.built_at is None:
+                index.build(noco.list_records(table_id, fields))
+    elif time.monotonic() - index.built_at > current_app.config['RELATED_INDEX_TTL']:
+        current_app.extensions['revalidator'].submit(
+            ("related", table_id), lambda: index.build(noco.list_records(table_id, fields))
+        )
+    return index
+
+
+def apply_record_change(table_id, record_id, data):
+    """Record listener keeping already built indexes in step with local writes."""
+    index = current_app.extensions['related_indexes'].get(table_id)
+    if index is None or index.built_at is None:
+        return
+    if data is None:
+        index.remove(record_id)
+    else:
+        index.upsert({**data, "Id": record_id})
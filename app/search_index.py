@@ -0,0 +1,355 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import current_app
+
+from app import noco
+
+# Fields searched by menu.search and ideas.search, with the weight a match in
+# each field contributes to a record's relevance (title matches rank first)
+SEARCH_FIELDS = {
+    "Title": 8,
+    "Core": 4,
+    "Meal": 2,
+    "Source": 1,
+}
+
+
+# Characters that cannot be passed through a NocoDB `where` like-condition
+# verbatim: filter syntax, and SQL LIKE wildcards that would change the match
+WHERE_UNSAFE_CHARACTERS = set("(),~%_\\")
+
+
+def trigrams(word):
+    """Trigrams of a word padded like pg_trgm (two spaces before, one after)."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def tokenize(value):
+    """Lowercase whitespace tokens of a field value (None/empty values have none)."""
+    if not value or not isinstance(value, str):
+        return []
+    return value.lower().split()
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over the searchable fields of a NocoDB table.
+
+    A query word matches a record when it is a substring of one of the
+    record's fields, exactly like the `word in field.lower()` scan it
+    replaces. Because query words never contain whitespace, that is the same
+    as the word being a substring of a single whitespace token, so the index
+    keeps a sorted list of every token suffix and answers each word with a
+    prefix range lookup over it. Records matching every word are ranked by
+    the weight of the fields they matched in, then by table order.
+
+    With a `fuzzy_threshold`, a word that is not a substring of any token
+    matches the tokens whose trigram similarity to it (shared trigrams over
+    all trigrams, as in pg_trgm) is at least the threshold instead, so
+    "lasgna" finds "lasagna". Such matches count their field weight scaled
+    by the similarity. The trigram -> tokens map is maintained together with
+    the postings.
+    """
+
+    def __init__(self, fields=None, columns=None, fuzzy_threshold=None):
+        self.fields = fields or SEARCH_FIELDS
+        # Columns kept on the indexed rows (all of them when None)
+        self.columns = columns
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._rows = {}            # record Id -> row dict, in table order
+        self._positions = {}       # record Id -> position used to break ties
+        self._next_position = 0
+        self._record_tokens = {}   # record Id -> {field: set(tokens)}
+        self._postings = {}        # token -> {record Id: best weight of the fields holding it}
+        self._suffixes = []        # sorted (suffix, token) pairs
+        self._trigrams = {}        # trigram -> set(tokens)
+        self._trigram_counts = {}  # token -> number of distinct trigrams
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    # Building and maintenance
+
+    def build(self, rows):
+        with self._lock:
+            self._reset()
+            # Collect the suffixes of every row and sort them once, instead of an insort per token
+            suffixes = []
+            for row in rows:
+                self._add(row, suffixes)
+            self._suffixes = sorted(suffixes)
+            self.built_at = time.monotonic()
+
+    def upsert(self, row):
+        """Insert a row, or merge it into the indexed row with the same Id."""
+        with self._lock:
+            record_id = int(row["Id"])
+            existing = self._rows.get(record_id)
+            if existing is not None:
+                self._remove(record_id, keep_position=True)
+                row = {**existing, **row}
+            self._add(row)
+
+    def remove(self, record_id):
+        with self._lock:
+            self._remove(int(record_id))
+
+    def _add(self, row, suffixes=None):
+        record_id = int(row["Id"])
+        if self.columns:
+            row = {column: row.get(column) for column in self.columns}
+        self._rows[record_id] = row
+        if record_id not in self._positions:
+            self._positions[record_id] = self._next_position
+            self._next_position += 1
+
+        tokens_by_field = {}
+        for field in self.fields:
+            tokens = set(tokenize(row.get(field)))
+            tokens_by_field[field] = tokens
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    for i in range(len(token)):
+                        if suffixes is None:
+                            insort(self._suffixes, (token[i:], token))
+                        else:
+                            suffixes.append((token[i:], token))
+                    token_trigrams = trigrams(token)
+                    self._trigram_counts[token] = len(token_trigrams)
+                    for trigram in token_trigrams:
+                        self._trigrams.setdefault(trigram, set()).add(token)
+                if self.fields[field] > postings.get(record_id, 0):
+                    postings[record_id] = self.fields[field]
+        self._record_tokens[record_id] = tokens_by_field
+
+    def _remove(self, record_id, keep_position=False):
+        tokens_by_field = self._record_tokens.pop(record_id, None)
+        if tokens_by_field is None:
+            return
+        if not keep_position:
+            # An upsert keeps the row slot (overwritten by _add), so edits do not reorder unfiltered results
+            self._rows.pop(record_id, None)
+            self._positions.pop(record_id, None)
+
+        for tokens in tokens_by_field.values():
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None or postings.pop(record_id, None) is None:
+                    continue
+                if not postings:
+                    del self._postings[token]
+                    for i in range(len(token)):
+                        j = bisect_left(self._suffixes, (token[i:], token))
+                        del self._suffixes[j]
+                    del self._trigram_counts[token]
+                    for trigram in trigrams(token):
+                        tokens = self._trigrams[trigram]
+                        tokens.discard(token)
+                        if not tokens:
+                            del self._trigrams[trigram]
+
+    # Querying
+
+    def _tokens_containing(self, word):
+        start = bisect_left(self._suffixes, (word, ""))
+        tokens = set()
+        for suffix, token in self._suffixes[start:]:
+            if not suffix.startswith(word):
+                break
+            tokens.add(token)
+        return tokens
+
+    def _similar_tokens(self, word):
+        """Map tokens whose trigram similarity to `word` reaches fuzzy_threshold to that similarity."""
+        word_trigrams = trigrams(word)
+        shared = {}
+        for trigram in word_trigrams:
+            for token in self._trigrams.get(trigram, ()):
+                shared[token] = shared.get(token, 0) + 1
+
+        similar = {}
+        for token, count in shared.items():
+            similarity = count / (len(word_trigrams) + self._trigram_counts[token] - count)
+            if similarity >= self.fuzzy_threshold:
+                similar[token] = similarity
+        return similar
+
+    def _matches(self, word):
+        """Map each record containing `word` (else, when fuzzy, a similar token) to the best weight it matched with."""
+        scored_tokens = dict.fromkeys(self._tokens_containing(word), 1.0)
+        if not scored_tokens and self.fuzzy_threshold:
+            scored_tokens = self._similar_tokens(word)
+
+        matches = {}
+        for token, score in scored_tokens.items():
+            for record_id, weight in self._postings[token].items():
+                weight *= score
+                if weight > matches.get(record_id, 0):
+                    matches[record_id] = weight
+        return matches
+
+    def search(self, words):
+        """Return the rows matching every word, most relevant first."""
+        with self._lock:
+            if not words:
+                return list(self._rows.values())
+
+            per_word = [self._matches(word) for word in set(words)]
+            per_word.sort(key=len)
+            candidates = set(per_word[0])
+            for matches in per_word[1:]:
+                candidates &= matches.keys()
+                if not candidates:
+                    return []
+
+            scores = {
+                record_id: sum(matches[record_id] for matches in per_word)
+                for record_id in candidates
+            }
+            ranked = sorted(candidates, key=lambda record_id: (-scores[record_id], self._positions[record_id]))
+            return [self._rows[record_id] for record_id in ranked]
+
+
+def field_weight(row, word, fields=None):
+    """Best weight among the fields of `row` containing `word` (0 when none does)."""
+    fields = fields or SEARCH_FIELDS
+    return max(
+        (weight for field, weight in fields.items()
+         if isinstance(row.get(field), str) and word in row[field].lower()),
+        default=0,
+    )
+
+
+def build_where(words, fields=None):
+    """
+    Turn query words into a NocoDB `where` expression: every word must be
+    `like` one of the search fields, i.e.
+    ((Title,like,%w1%)~or(Meal,like,%w1%)...)~and((Title,like,%w2%)...)
+    """
+    fields = fields or SEARCH_FIELDS
+    return "~and".join(
+        "(" + "~or".join(f"({field},like,%{word}%)" for field in fields) + ")"
+        for word in words
+    )
+
+
+def where_search(table_id, words, columns=None):
+    """
+    Search by letting NocoDB filter the rows, then rank them like SearchIndex.
+
+    The returned rows are re-checked against the substring rule so results
+    are identical to the in-process engine; only matching rows are fetched.
+    """
+    params = {"where": build_where(words)}
+    if columns:
+        params["fields"] = ",".join(columns)
+    rows = noco.fetch_all_records(table_id, params)
+
+    ranked = []
+    for position, row in enumerate(rows):
+        weights = [field_weight(row, word) for word in set(words)]
+        if all(weights):
+            ranked.append((-sum(weights), position, row))
+    ranked.sort(key=lambda item: item[:2])
+    return [row for _, _, row in ranked]
+
+
+def search_records(table_id, words, columns=None):
+    """
+    Rows of `table_id` matching every word, most relevant first.
+
+    SEARCH_ENGINE picks who does the filtering: "index" (the in-memory
+    SearchIndex, default), "where" (NocoDB `where` clauses) or "mirror"
+    (FTS5 over the local mirror, which also searches Notes, Ingredients and
+    Method, matching words as token prefixes). Queries whose words cannot be
+    expressed as like-conditions always use the index, as do tables the
+    mirror cannot serve yet. Only the "index" engine tolerates typos (see
+    fuzzy_threshold), so every engine answers a query the same way.
+    """
+    engine = current_app.config['SEARCH_ENGINE']
+    mirror = noco.get_mirror(table_id) if engine == 'mirror' else None
+    if mirror is not None:
+        return mirror.search(table_id, words, columns)
+
+    use_where = (
+        engine == 'where'
+        and words
+        and not any(WHERE_UNSAFE_CHARACTERS & set(word) for word in words)
+    )
+    if use_where:
+        return where_search(table_id, words, columns)
+    return get_search_index(table_id, columns).search(words)
+
+
+def search_version(table_id, columns=None):
+    """
+    Token that changes whenever search_records may answer differently for `table_id`.
+
+    None for the "where" engine, whose answer only NocoDB knows. Local
+    writes are not reflected here; combine it with fragments.table_version.
+    """
+    engine = current_app.config['SEARCH_ENGINE']
+    if engine == 'where':
+        return None
+    mirror = noco.get_mirror(table_id) if engine == 'mirror' else None
+    if mirror is not None:
+        return ['mirror', mirror.version(table_id)]
+    return ['index', get_search_index(table_id, columns).built_at]
+
+
+def paginate(results, page, per_page):
+    """Return the 1-based `page` of `results` and whether another page follows it."""
+    page = max(page, 1)
+    start = (page - 1) * per_page
+    return results[start:start + per_page], start + per_page < len(results)
+
+
+def fuzzy_threshold():
+    """
+    SEARCH_FUZZY_THRESHOLD for the "index" engine, else 0: the "where" and
+    "mirror" engines cannot match typos, and the index they fall back on must
+    answer like them.
+    """
+    if current_app.config['SEARCH_ENGINE'] != 'index':
+        return 0
+    return current_app.config['SEARCH_FUZZY_THRESHOLD']
+
+
+def get_search_index(table_id, columns=None):
+    """
+    Return the search index of `table_id`, (re)building it from NocoDB when missing or expired.
+
+    `columns` is the projection fetched for (and kept on) the indexed rows.
+    """
+    indexes = current_app.extensions['search_indexes']
+    index = indexes.get(table_id)
+    if index is None:
+        index = indexes.setdefault(
+            table_id, SearchIndex(columns=columns, fuzzy_threshold=fuzzy_threshold())
+        )
+
+    ttl = current_app.config['SEARCH_INDEX_TTL']
+    if index.built_at is None or time.monotonic() - index.built_at > ttl:
+        index.build(noco.list_records(table_id, index.columns))
+    return index
+
+
+def apply_record_change(table_id, record_id, data):
+    """Record listener keeping already built indexes in step with local writes."""
+    index = current_app.extensions['search_indexes'].get(table_id)
+    if index is None or index.built_at is None:
+        return
+    if data is None:
+        index.remove(record_id)
+    else:
+        index.upsert({**data, "Id": record_id})
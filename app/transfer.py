@@ -0,0 +1,300 @@
+import csv
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+from app import noco
+from app.jobs import discard_spool
+
+IMPORT_FORMATS = ('csv', 'json', 'md')
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# "## Ingredients" style section headings of a markdown recipe, and "Meal: Dinner" style header lines
+MARKDOWN_SECTION = re.compile(r"^##\s+(.+?)\s*$")
+MARKDOWN_HEADER = re.compile(r"^(\w+):\s*(.*)$")
+
+
+class TransferError(ValueError):
+    """Raised when an import file cannot be parsed or a row does not validate."""
+
+
+# Parsing
+
+def parse_markdown(text):
+    """
+    Parse recipes written as markdown, one per top-level heading:
+
+        # Chicken lasagna
+        Meal: Dinner
+        Core: Chicken
+        Source: Grandma
+        Photo: lasagna.jpg
+
+        ## Ingredients
+        - 1 lb chicken
+
+        ## Method
+        1. Bake
+
+    Header lines become columns, and each "## Section" the column of that name.
+    """
+    rows, row, section = [], None, None
+    for line in text.splitlines():
+        if line.startswith("# "):
+            row, section = {"Title": line[2:].strip()}, None
+            rows.append(row)
+            continue
+        if row is None:
+            continue
+        heading = MARKDOWN_SECTION.match(line)
+        if heading:
+            section = heading.group(1).replace(" ", "")
+            row[section] = ""
+        elif section is not None:
+            row[section] += line + "\n"
+        else:
+            header = MARKDOWN_HEADER.match(line)
+            if header:
+                row[header.group(1)] = header.group(2).strip()
+    for row in rows:
+        for key, value in row.items():
+            row[key] = value.strip() if isinstance(value, str) else value
+    return rows
+
+
+def parse_rows(text, fmt):
+    """Rows of an import file: CSV with a header, a JSON list (or NDJSON), or markdown (see parse_markdown)."""
+    if fmt == 'csv':
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+    if fmt == 'json':
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                data = [json.loads(line) for line in text.splitlines() if line.strip()]
+            except json.JSONDecodeError as e:
+                raise TransferError(f"Invalid JSON: {e}") from e
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            raise TransferError("A JSON import must be a list of objects (or one object per line)")
+        return data
+    if fmt == 'md':
+        return parse_markdown(text)
+    raise TransferError(f"Unsupported import format {fmt!r} (expected one of {', '.join(IMPORT_FORMATS)})")
+
+
+def import_format(filename):
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    return {'ndjson': 'json', 'markdown': 'md'}.get(extension, extension)
+
+
+def validate_rows(rows, model, photo_dir=None, photo_names=None):
+    """
+    Check rows against the editable columns of `model` (plus Photo, a file in
+    `photo_dir`, or one of `photo_names` when the photos are not saved yet).
+
+    Empty values are dropped, and JSON numbers and booleans are converted to
+    text; only nested objects and lists are rejected. Every problem is
+    collected so one run reports them all; nothing is written unless every
+    row is valid.
+    """
+    allowed = set(model.EDITABLE_FIELDS) | {'Photo'}
+    valid, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        row = {key.strip(): value for key, value in row.items() if key and value not in (None, '')}
+        unknown = set(row) - allowed
+        if unknown:
+            errors.append(f"row {number}: unknown columns {', '.join(sorted(unknown))}")
+        if not str(row.get('Title', '')).strip():
+            errors.append(f"row {number}: Title is required")
+        for key, value in row.items():
+            if isinstance(value, (dict, list)):
+                errors.append(f"row {number}: {key} must be text, a number or true/false")
+            elif isinstance(value, bool):
+                # JSON booleans are stored as the text JSON wrote them in (the columns are text)
+                row[key] = "true" if value else "false"
+            elif not isinstance(value, str):
+                row[key] = str(value)
+        photo = row.get('Photo')
+        if photo and find_photo(photo, photo_dir, photo_names) is None:
+            errors.append(f"row {number}: photo {photo} was not provided")
+        valid.append(row)
+    if errors:
+        raise TransferError("; ".join(errors))
+    return valid
+
+
+def find_photo(photo, photo_dir=None, photo_names=None):
+    """
+    File name of the photo a Photo value refers to, or None when it was not
+    provided. Uploaded photos are saved with secure_filename ("my pie.jpg"
+    becomes "my_pie.jpg"), so that name is tried after the value's own
+    basename (which is what a local --photos directory holds).
+    """
+    for name in dict.fromkeys((os.path.basename(photo), secure_filename(os.path.basename(photo)))):
+        if photo_names is not None:
+            if name in photo_names:
+                return name
+        elif photo_dir is not None and os.path.isfile(os.path.join(photo_dir, name)):
+            return name
+    return None
+
+
+# Import
+
+def import_records(path, table_id, model, photo_dir=None, batch_size=100, progress_path=None):
+    """
+    Import the rows of a CSV/JSON/markdown file into `table_id` with bulk inserts.
+
+    Rows are validated up front, then written `batch_size` at a time. Rows
+    naming a Photo get an 'attach_photo' job each, so the job workers upload
+    them concurrently (and retry them) while later batches are inserted.
+
+    Progress is saved to `progress_path`: each batch is recorded as in
+    flight (with the highest Id before it) before it is inserted, and as
+    done after. Running the same file again resumes after the last batch
+    done; an in-flight batch is first reconciled by Title against the rows
+    added since, so rows NocoDB already created are not inserted twice.
+    The progress file is removed once the import finishes, so importing
+    the same file again later imports it again. Returns the progress dict
+    ({"rows", "done", "created", "photo_jobs"}).
+    """
+    from app.blueprints.menu.functions import enqueue_photo_upload
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    rows = validate_rows(parse_rows(content.decode('utf-8-sig'), import_format(path)), model, photo_dir)
+
+    progress_path = progress_path or os.path.join(
+        current_app.config['IMPORT_PROGRESS_DIR'], f"{hashlib.sha256(content).hexdigest()}.json"
+    )
+    progress = {"rows": len(rows), "done": 0, "created": [], "photo_jobs": [], "in_flight": None}
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            progress = {"in_flight": None, **json.load(f)}
+        print(f"Resuming import of {path} after {progress['done']} of {progress['rows']} rows")
+
+    while progress["done"] < len(rows):
+        if progress["in_flight"]:
+            # Interrupted between the insert and saving its progress: keep what NocoDB created
+            batch = rows[progress["done"]:progress["done"] + progress["in_flight"]["size"]]
+            created = _reconcile_batch(table_id, batch, progress["in_flight"]["after_id"])
+            print(f"Found {sum(record is not None for record in created)} of {len(batch)} rows "
+                  f"of the interrupted batch already imported")
+        else:
+            batch = rows[progress["done"]:progress["done"] + batch_size]
+            after_id = max(progress["created"]) if progress["created"] else _last_id(table_id)
+            progress["in_flight"] = {"size": len(batch), "after_id": after_id}
+            _save_progress(progress_path, progress)
+            created = [None] * len(batch)
+
+        missing = [row for row, record in zip(batch, created) if record is None]
+        if missing:
+            inserted = iter(noco.create_records(table_id, [{k: v for k, v in row.items() if k != 'Photo'}
+                                                           for row in missing]))
+            created = [record or next(inserted) for record in created]
+
+        for row, record in zip(batch, created):
+            progress["created"].append(record["Id"])
+            if row.get('Photo'):
+                photo_path = os.path.join(photo_dir, find_photo(row['Photo'], photo_dir))
+                with open(photo_path, 'rb') as stream:
+                    photo = FileStorage(stream=stream, filename=os.path.basename(photo_path),
+                                        content_type=mimetypes.guess_type(photo_path)[0] or 'application/octet-stream')
+                    progress["photo_jobs"].append(enqueue_photo_upload(photo, record["Id"], table_id))
+        progress["done"] += len(batch)
+        progress["in_flight"] = None
+        _save_progress(progress_path, progress)
+        print(f"Imported {progress['done']} of {progress['rows']} rows into {table_id}")
+
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    return progress
+
+
+def _last_id(table_id):
+    """Highest Id in the table (0 when it is empty); rows inserted later get larger ones."""
+    for row in noco.iter_records(table_id, {"sort": "-Id", "fields": "Id"}):
+        return int(row["Id"])
+    return 0
+
+
+def _save_progress(path, progress):
+    # Write then rename, so an interrupted write never leaves a truncated progress file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(progress, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _reconcile_batch(table_id, batch, after_id):
+    """
+    The records an interrupted insert of `batch` created: rows added after
+    `after_id` are matched to the batch by Title, in order. Returns one
+    record (or None, when it was not created) per row of the batch.
+    """
+    added = {}
+    for record in noco.fetch_all_records(table_id, {"where": f"(Id,gt,{int(after_id)})", "fields": "Id,Title",
+                                                    "sort": "Id"}):
+        added.setdefault(record.get("Title"), []).append(record)
+    return [added[row["Title"]].pop(0) if added.get(row["Title"]) else None for row in batch]
+
+
+def import_recipes_job(payload):
+    """
+    Background job: import an uploaded file (see import_records). A retry
+    resumes from the saved progress; the spooled upload is deleted once the
+    import finishes (or, by the job queue, once it fails for good).
+    """
+    from app.blueprints.menu.models import NoCoRecipes
+
+    progress = import_records(
+        payload['path'], payload['table_id'], NoCoRecipes,
+        photo_dir=payload.get('photo_dir'), batch_size=payload.get('batch_size', 100),
+    )
+    # The photo jobs spooled their own copies, so the uploaded files are no longer needed
+    discard_spool(payload)
+    return {key: progress[key] for key in ('rows', 'done', 'photo_jobs')}
+
+
+# Export
+
+def export_lines(table_id, fields, fmt):
+    """
+    Yield a table as NDJSON or CSV text, one row per chunk.
+
+    Rows come from noco.iter_records, one page at a time, so the export
+    runs in constant memory and can be streamed straight into a response.
+    """
+    params = {"fields": ",".join(fields)}
+    if fmt == 'ndjson':
+        for row in noco.iter_records(table_id, params):
+            yield json.dumps({field: row.get(field) for field in fields}) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in noco.iter_records(table_id, params):
+        writer.writerow([_csv_value(row.get(field)) for field in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
@@ -0,0 +1,227 @@
+"""
+In-process fake of the NocoDB v2 REST API used by the benchmarks.
+
+Serves /api/v2/tables/<table>/records (list with limit/offset/fields/where,
+get, create, patch, delete, single and bulk), /api/v2/storage/upload and the
+signed download paths it hands out, from plain dicts, with an optional
+latency injected into every call. Every call is counted along with the
+bytes received and sent, so a benchmark can report upstream traffic.
+"""
+import json
+import re
+import threading
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+from werkzeug.wrappers import Request, Response
+
+RECORDS_PATH = re.compile(r"^/api/v2/tables/([^/]+)/records(?:/(\d+))?$")
+
+MEALS = ["Dinner", "Lunch", "Brunch", "BBQ", "Dessert"]
+CORES = ["Chicken", "Beef", "Fish", "Tofu", "Pork", "Lamb", "Mushroom", "Lentils"]
+DISHES = ["stew", "lasagna", "curry", "pie", "salad", "risotto", "tacos", "soup"]
+
+
+class FakeNocoDB:
+    def __init__(self, tables=None, latency=0.0, page_size=25):
+        self.tables = tables or {}
+        self.latency = latency
+        self.page_size = page_size
+        self.files = {}
+        self.calls = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    # Server
+
+    def start(self):
+        """Serve on a free local port in a daemon thread; returns the API base URL."""
+        class QuietHandler(WSGIRequestHandler):
+            def log(self, *args, **kwargs):
+                pass
+
+        self._server = make_server("127.0.0.1", 0, self, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}/api/v2"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def counters(self):
+        with self._lock:
+            return {"calls": self.calls, "bytes": self.bytes_in + self.bytes_out}
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        if self.latency:
+            time.sleep(self.latency)
+        body = request.get_data()
+        with self._lock:
+            response = self.handle(request)
+            self.calls += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(response.get_data())
+        return response(environ, start_response)
+
+    # API
+
+    def handle(self, request):
+        if request.path.startswith("/api/v2/storage/upload"):
+            return self._upload(request)
+        if request.path.startswith("/download/"):
+            data = self.files.get(request.path[len("/download/"):])
+            return Response(data, 200) if data is not None else _json({"msg": "not found"}, 404)
+
+        match = RECORDS_PATH.match(request.path)
+        if not match:
+            return _json({"msg": "not found"}, 404)
+        rows = self.tables.setdefault(match.group(1), {})
+        record_id = match.group(2)
+
+        if request.method == "GET" and record_id:
+            row = rows.get(int(record_id))
+            return _json(row) if row is not None else _json({"msg": "not found"}, 404)
+        if request.method == "GET":
+            return self._list(rows, request.args)
+
+        payload = request.get_json()
+        items = payload if isinstance(payload, list) else [payload]
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        if request.method == "POST":
+            result = []
+            for item in items:
+                new_id = max(rows, default=0) + 1
+                rows[new_id] = {**item, "Id": new_id, "CreatedAt": now, "UpdatedAt": now}
+                result.append({"Id": new_id})
+        elif request.method == "PATCH":
+            if any(int(item["Id"]) not in rows for item in items):
+                return _json({"msg": "not found"}, 404)
+            for item in items:
+                row = rows[int(item["Id"])]
+                row.update({k: json.loads(v) if k == "Photo" and isinstance(v, str) else v for k, v in item.items()})
+                row["UpdatedAt"] = now
+            result = [{"Id": item["Id"]} for item in items]
+        elif request.method == "DELETE":
+            if any(int(item["Id"]) not in rows for item in items):
+                return _json({"msg": "not found"}, 404)
+            for item in items:
+                del rows[int(item["Id"])]
+            result = [{"Id": item["Id"]} for item in items]
+        else:
+            return _json({"msg": "method not allowed"}, 405)
+        return _json(result if isinstance(payload, list) else result[0])
+
+    def _list(self, rows, args):
+        listed = sorted(rows.values(), key=lambda row: row["Id"])
+        if args.get("where"):
+            listed = [row for row in listed if _matches_where(row, args["where"])]
+        limit = min(int(args.get("limit", self.page_size)), self.page_size)
+        offset = int(args.get("offset", 0))
+        page = listed[offset:offset + limit]
+        if args.get("fields"):
+            fields = args["fields"].split(",")
+            page = [{field: row.get(field) for field in fields} for row in page]
+        return _json({
+            "list": page,
+            "pageInfo": {
+                "totalRows": len(listed),
+                "page": offset // limit + 1,
+                "pageSize": limit,
+                "isFirstPage": offset == 0,
+                "isLastPage": offset + limit >= len(listed),
+            },
+        })
+
+    def _upload(self, request):
+        upload = request.files["file"]
+        data = upload.read()
+        path = request.args.get("path", "")
+        key = f"{path}/{upload.filename}"
+        self.files[key] = data
+        return _json([{
+            "path": key,
+            "title": upload.filename,
+            "mimetype": upload.mimetype,
+            "size": len(data),
+            "signedPath": f"download/{key}",
+        }])
+
+
+def _json(data, status=200):
+    return Response(json.dumps(data), status=status, mimetype="application/json")
+
+
+def _split_top_level(expression, separator):
+    parts, depth, current, i = [], 0, "", 0
+    while i < len(expression):
+        char = expression[i]
+        depth += char == "("
+        depth -= char == ")"
+        if depth == 0 and expression.startswith(separator, i):
+            parts.append(current)
+            current, i = "", i + len(separator)
+            continue
+        current += char
+        i += 1
+    return parts + [current]
+
+
+def _matches_where(row, expression):
+    """Evaluate the subset of NocoDB's where syntax the app sends (like, eq, gt/gte on dates, ~and/~or)."""
+    expression = expression.strip()
+    for separator, combine in (("~and", all), ("~or", any)):
+        parts = _split_top_level(expression, separator)
+        if len(parts) > 1:
+            return combine(_matches_where(row, part) for part in parts)
+    inner = expression[1:-1]
+    if inner.startswith("("):
+        return _matches_where(row, inner)
+    field, op, value = inner.split(",", 2)
+    actual = "" if row.get(field) is None else str(row.get(field))
+    if op == "like":
+        return value.strip("%").lower() in actual.lower()
+    if op == "eq":
+        return actual == value
+    value = value.split(",")[-1]  # gt/gte take a sub-operator such as exactDate
+    return actual > value if op == "gt" else actual >= value
+
+
+# Synthetic data
+
+def make_recipes(count):
+    return {
+        i: {
+            "Id": i,
+            "Title": f"{CORES[i % len(CORES)]} {DISHES[i % len(DISHES)]} {i}",
+            "Meal": MEALS[i % len(MEALS)],
+            "Core": CORES[i % len(CORES)],
+            "Source": f"Cookbook {i % 40}" if i % 3 else None,
+            "Notes": "Family favourite",
+            "Ingredients": "- 2 cups flour\n- 1 lb chicken\n- 3 tbsp butter\n- 1 onion, diced",
+            "Method": "1. Mix everything\n2. Bake for 40 minutes\n3. Rest and serve",
+            "Photo": None,
+            "LeftOvers": None,
+            "CreatedAt": "2024-01-01 00:00:00",
+            "UpdatedAt": "2024-01-01 00:00:00",
+        }
+        for i in range(1, count + 1)
+    }
+
+
+def make_ideas(count):
+    return {
+        i: {
+            "Id": i,
+            "Title": f"Try {CORES[i % len(CORES)].lower()} {DISHES[(i + 3) % len(DISHES)]}",
+            "Meal": MEALS[i % len(MEALS)],
+            "Core": CORES[i % len(CORES)],
+            "Source": None,
+            "Notes": "Saw this somewhere",
+            "CreatedAt": "2024-01-01 00:00:00",
+            "UpdatedAt": "2024-01-01 00:00:00",
+        }
+        for i in range(1, count + 1)
+    }
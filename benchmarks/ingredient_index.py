@@ -0,0 +1,89 @@
+"""
+Parse cost, cached rebuilds and lookups of the ingredient index.
+
+Builds an IngredientIndex over synthetic recipes twice (the second build
+reuses the content-hash parse cache), then times "what I have" lookups and
+shopping lists merged from the already parsed ingredients:
+
+    python benchmarks/ingredient_index.py --rows 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ingredients import IngredientIndex, merge_ingredients  # noqa: E402
+
+UNITS = ["g", "kg", "cups", "tbsp", "tsp", "ml", "oz", "lb", "cloves", "", "pinch of"]
+ITEMS = [
+    "flour", "butter", "garlic", "onions", "tomatoes", "basil", "oregano", "cumin", "ginger", "chicken breast",
+    "chicken thighs", "ground beef", "rice", "pasta", "cream", "parmesan", "spinach", "potatoes", "carrots",
+    "coconut milk", "chicken stock", "white wine", "soy sauce", "honey", "chickpeas", "eggs", "lemons", "salt",
+]
+
+
+def make_rows(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "Id": i,
+            "Title": f"Recipe {i}",
+            "Ingredients": "\n".join(
+                f"- {rng.choice(['1', '2', '1/2', '1 1/2', '250', '3'])} {rng.choice(UNITS)} {item}, chopped"
+                for item in rng.sample(ITEMS, rng.randint(5, 12))
+            ),
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(label, samples):
+    print(
+        f"{label:<16} p50={statistics.median(samples):.3f}ms p95={percentile(samples, 0.95):.3f}ms "
+        f"max={max(samples):.3f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    index = IngredientIndex(max_entries=args.rows, columns=("Id", "Title"))
+    for label in ("build (parsing)", "build (cached)"):
+        started = time.perf_counter()
+        index.build(rows)
+        print(f"{label:<16} {len(index)} rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+    print(index.stats())
+
+    rng = random.Random(2)
+    samples = []
+    for _ in range(args.lookups):
+        have = rng.sample(["chicken", "rice", "garlic", "spinach", "eggs", "pasta", "cream"], 3)
+        started = time.perf_counter()
+        index.recipes_using(have)
+        samples.append((time.perf_counter() - started) * 1000)
+    report("recipes_using()", samples)
+
+    samples = []
+    for _ in range(args.lookups):
+        recipe_ids = rng.sample(range(1, args.rows + 1), 7)
+        started = time.perf_counter()
+        merge_ingredients(index.ingredients(recipe_id) for recipe_id in recipe_ids)
+        samples.append((time.perf_counter() - started) * 1000)
+    report("shopping list", samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Candidate plans scored per second by the menu planner.
+
+Builds RecipeFeatures over synthetic recipes and times MenuPlanner rounds
+for a week of dinners with two leftover nights:
+
+    python benchmarks/planner_throughput.py --rows 5000 --candidates 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.planner import MenuPlanner, RecipeFeatures, week_slots  # noqa: E402
+
+CORES = ["Chicken", "Beef", "Fish", "Tofu", "Pork", "Lamb", "Mushroom", "Prawn", "Lentil", "Egg"]
+MEALS = ["Dinner", "Lunch", "Brunch", "BBQ"]
+
+
+def make_rows(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "Id": i,
+            "Title": f"Recipe {i}",
+            "Meal": rng.choice(MEALS),
+            "Core": rng.choice(CORES),
+            "LeftOvers": "Yes" if rng.random() < 0.3 else None,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--candidates", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    features = RecipeFeatures(make_rows(args.rows))
+    print(f"built features over {len(features)} recipes in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    slots = week_slots(date(2024, 6, 3), ["Lunch", "Dinner"], ["Wednesday", "Sunday"])
+    planner = MenuPlanner(features, slots, recent_ids=range(1, 200), seed=1)
+    started = time.perf_counter()
+    feasible = 0
+    for _ in range(args.rounds):
+        feasible += (planner.score(planner.candidates(args.candidates)) > float("-inf")).sum()
+    elapsed = time.perf_counter() - started
+    total = args.rounds * args.candidates
+    print(
+        f"scored {total} candidate plans of {len(slots)} slots in {elapsed * 1000:.0f} ms: "
+        f"{total / elapsed:,.0f} plans/s, {feasible / total:.0%} feasible"
+    )
+
+    started = time.perf_counter()
+    planner.best(args.candidates, 10)
+    print(f"best() of 10 rounds in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
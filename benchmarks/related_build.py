@@ -0,0 +1,104 @@
+"""
+Build time, memory and lookup latency of the related-recipes index.
+
+Builds a RelatedIndex over synthetic recipes (titles, cores and markdown
+ingredient lists), then times related() lookups and single-recipe edits:
+
+    python benchmarks/related_build.py --rows 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.related import RelatedIndex  # noqa: E402
+
+DISHES = ["lasagna", "stew", "curry", "risotto", "pie", "salad", "tacos", "soup", "roast", "stir", "fry", "bake", "tart"]
+CORES = ["Chicken", "Beef", "Fish", "Tofu", "Pork", "Lamb", "Mushroom", "Prawn", "Lentil", "Egg"]
+MEALS = ["Dinner", "Lunch", "Brunch", "BBQ", "Dessert"]
+INGREDIENTS = [
+    "flour", "butter", "garlic", "onion", "tomato", "basil", "oregano", "cumin", "coriander", "ginger", "chili",
+    "lemon", "lime", "rice", "pasta", "cream", "cheese", "parmesan", "mozzarella", "spinach", "potato", "carrot",
+    "celery", "thyme", "rosemary", "paprika", "coconut", "milk", "stock", "wine", "soy", "sesame", "honey",
+    "mustard", "vinegar", "yogurt", "peas", "beans", "chickpeas", "avocado", "pepper", "sugar", "eggplant",
+]
+
+
+def make_rows(count, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(1, count + 1):
+        core = rng.choice(CORES)
+        rows.append({
+            "Id": i,
+            "Title": f"{rng.choice(['Spicy', 'Creamy', 'Easy', 'Slow', 'Crispy'])} {core.lower()} {rng.choice(DISHES)}",
+            "Core": core,
+            "Meal": rng.choice(MEALS),
+            "Source": f"Cookbook {rng.randrange(300)}",
+            "Ingredients": "\n".join(
+                f"- {rng.randint(1, 4)} cups {ingredient}" for ingredient in rng.sample(INGREDIENTS, rng.randint(5, 12))
+            ),
+        })
+    return rows
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(label, samples):
+    print(
+        f"{label:<10} p50={statistics.median(samples):.3f}ms p95={percentile(samples, 0.95):.3f}ms "
+        f"max={max(samples):.3f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--edits", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    index = RelatedIndex(k=args.k, columns=("Id", "Title", "Meal", "Core"))
+    started = time.perf_counter()
+    index.build(rows)
+    elapsed = time.perf_counter() - started
+    # Peak memory of a second build, traced separately so tracing does not skew the timing
+    tracemalloc.start()
+    index.build(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"built index over {len(index)} rows in {elapsed * 1000:.0f} ms, "
+        f"vocabulary {len(index._vocabulary)} terms, "
+        f"vectors + neighbours {index.nbytes() / 2**20:.1f} MiB, peak traced {peak / 2**20:.1f} MiB"
+    )
+
+    rng = random.Random(2)
+    samples = []
+    for _ in range(args.lookups):
+        record_id = rng.randint(1, args.rows)
+        started = time.perf_counter()
+        index.related(record_id)
+        samples.append((time.perf_counter() - started) * 1000)
+    report("related()", samples)
+
+    samples = []
+    for row in rng.sample(make_rows(args.rows, seed=3), args.edits):
+        started = time.perf_counter()
+        index.upsert(row)
+        samples.append((time.perf_counter() - started) * 1000)
+    report("upsert()", samples)
+
+
+if __name__ == "__main__":
+    main()
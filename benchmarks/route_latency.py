@@ -0,0 +1,213 @@
+"""
+Route benchmarks against a local fake NocoDB.
+
+Starts benchmarks/fake_noco.py in-process with the requested table sizes and
+latency, builds the real app on top of it and drives its routes through the
+Flask test client. For each scenario it reports p50/p95/p99 latency and the
+upstream calls and bytes per request, and writes everything as JSON so runs
+can be compared:
+
+    python benchmarks/route_latency.py --recipes 2000 --latency 0.01 --output before.json
+    python benchmarks/route_latency.py --recipes 2000 --latency 0.01 --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_noco import FakeNocoDB, make_ideas, make_recipes  # noqa: E402
+
+RECIPES_TABLE_ID = "mk4go4bhd91cihe"
+IDEAS_TABLE_ID = "ideas"
+
+# What a user types into the search box, one request per keystroke
+KEYSTROKES = ["c", "ch", "chi", "chic", "chick", "chicke", "chicken", "chicken ", "chicken s", "chicken st",
+              "chicken ste", "chicken stew", "l", "la", "las", "lasa", "lasag", "lasagn", "lasagna"]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def make_photo():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (1600, 1200), (180, 90, 40)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def create_app(args, fake):
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "NOCO_DB_BASE_URL": fake.start(),
+        "NOCO_DB_API_TOKEN": "benchmark",
+        "NOCO_DB_IDEAS_TABLE_ID": IDEAS_TABLE_ID,
+        "FLASK_APP_SECRET_KEY": "benchmark",
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "JOBS_SPOOL_DIR": os.path.join(workdir, "job_uploads"),
+        "MIRROR_DB_PATH": os.path.join(workdir, "mirror.sqlite3"),
+    })
+    from app.app import create_app
+    app = create_app()
+    app.testing = True
+    return app
+
+
+def wait_for_job(app, job_id, timeout=30):
+    jobs = app.extensions["jobs"]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job and job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    return None
+
+
+def scenarios(app, client, args):
+    """Yield (name, callable) pairs; each callable performs one measured request (or cycle)."""
+    rng = random.Random(args.seed)
+    photo = make_photo()
+    next_idea = iter(range(1, args.ideas + 1))
+
+    def index(i):
+        return [client.get("/")]
+
+    def search(i):
+        query = KEYSTROKES[i % len(KEYSTROKES)]
+        return [client.get("/search", query_string={"search": query})]
+
+    def recipe(i):
+        return [client.get(f"/recipe/{rng.randint(1, args.recipes)}")]
+
+    def edit_cycle(i):
+        recipe_id = rng.randint(1, args.recipes)
+        return [
+            client.get(f"/edit_field/{recipe_id}/Title"),
+            client.post(f"/update_field/{recipe_id}/Title", data={"value": f"Edited title {i}"}),
+            client.get(f"/display_field/{recipe_id}/Title"),
+        ]
+
+    def save_photo(i):
+        recipe_id = rng.randint(1, args.recipes)
+        response = client.post(
+            f"/save_photo/{recipe_id}",
+            data={"photo": (io.BytesIO(photo), f"bench-{i}.jpg")},
+            content_type="multipart/form-data",
+            headers={"HX-Request": "true"},
+        )
+        return [response]
+
+    def ideas_search(i):
+        query = KEYSTROKES[i % len(KEYSTROKES)]
+        return [client.get("/ideas/search", query_string={"idea-search": query})]
+
+    def move_to_recipes(i):
+        return [client.post(f"/ideas/move_to_recipes/{next(next_idea)}")]
+
+    yield "menu.index", index
+    yield "menu.search", search
+    yield "menu.recipe", recipe
+    yield "menu.edit_cycle", edit_cycle
+    yield "menu.save_photo", save_photo
+    yield "ideas.search", ideas_search
+    yield "ideas.move_to_recipes", move_to_recipes
+
+
+def run(args):
+    fake = FakeNocoDB(
+        {RECIPES_TABLE_ID: make_recipes(args.recipes), IDEAS_TABLE_ID: make_ideas(args.ideas)},
+        latency=args.latency,
+        page_size=args.page_size,
+    )
+    app = create_app(args, fake)
+    client = app.test_client()
+
+    results = {}
+    for name, request in scenarios(app, client, args):
+        latencies, statuses = [], {}
+        before = fake.counters()
+        for i in range(args.iterations):
+            started = time.perf_counter()
+            responses = request(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            for response in responses:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if name == "menu.save_photo" and response.is_json:
+                    # The upload finishes in the job queue; count its upstream traffic too
+                    wait_for_job(app, response.json["job_id"])
+        after = fake.counters()
+        results[name] = {
+            "samples": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.50), 3),
+            "p95_ms": round(percentile(latencies, 0.95), 3),
+            "p99_ms": round(percentile(latencies, 0.99), 3),
+            "mean_ms": round(statistics.mean(latencies), 3),
+            "upstream_calls_per_request": round((after["calls"] - before["calls"]) / len(latencies), 3),
+            "upstream_bytes_per_request": round((after["bytes"] - before["bytes"]) / len(latencies)),
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        }
+    fake.stop()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "recipes": args.recipes,
+            "ideas": args.ideas,
+            "latency_s": args.latency,
+            "page_size": args.page_size,
+            "iterations": args.iterations,
+            "seed": args.seed,
+        },
+        "routes": results,
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"{'route':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'calls/req':>11}{'bytes/req':>12}")
+    for name, result in report["routes"].items():
+        line = (f"{name:<24}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['upstream_calls_per_request']:>11.2f}{result['upstream_bytes_per_request']:>12}")
+        previous = (baseline or {}).get("routes", {}).get(name)
+        if previous and previous["p50_ms"]:
+            line += f"   p50 x{result['p50_ms'] / previous['p50_ms']:.2f} vs baseline"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipes", type=int, default=500, help="rows in the fake recipes table")
+    parser.add_argument("--ideas", type=int, default=200, help="rows in the fake ideas table")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds added to every upstream call")
+    parser.add_argument("--page-size", type=int, default=100, help="largest page the fake NocoDB returns")
+    parser.add_argument("--iterations", type=int, default=50, help="measured requests per route")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the JSON report")
+    parser.add_argument("--compare", help="earlier JSON report to compare p50 latencies against")
+    args = parser.parse_args()
+    if args.ideas < args.iterations:
+        parser.error("--ideas must be at least --iterations (each move_to_recipes sample consumes an idea)")
+
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
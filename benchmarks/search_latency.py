@@ -0,0 +1,74 @@
+"""
+Per-query latency of the in-memory search index, exact and typo-tolerant.
+
+Builds a SearchIndex over synthetic recipe rows and times the queries an
+htmx keyup search sends, printing p50/p95/max in milliseconds:
+
+    python benchmarks/search_latency.py --rows 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.search_index import SearchIndex  # noqa: E402
+
+WORDS = [
+    "chicken", "lasagna", "beef", "stew", "tofu", "curry", "salmon", "risotto", "mushroom", "pasta",
+    "roasted", "vegetables", "spicy", "garlic", "lemon", "tart", "soup", "bbq", "pork", "ribs",
+]
+MEALS = ["Dinner", "Lunch", "Brunch", "BBQ", "Dessert"]
+QUERIES = [
+    ["chicken"], ["lasagna"], ["chic"], ["chiken"], ["lasgna"], ["spicy", "chiken"], ["musroom", "risoto"], ["xyzzy"],
+]
+
+
+def make_rows(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "Id": i,
+            "Title": " ".join(rng.sample(WORDS, 3)) + f" {i}",
+            "Core": rng.choice(WORDS).title(),
+            "Meal": rng.choice(MEALS),
+            "Source": f"cookbook{rng.randrange(500)}",
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    args = parser.parse_args()
+
+    index = SearchIndex(fuzzy_threshold=args.threshold)
+    started = time.perf_counter()
+    index.build(make_rows(args.rows))
+    print(f"built index over {len(index)} rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    for words in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            results = index.search(words)
+            samples.append((time.perf_counter() - started) * 1000)
+        print(
+            f"{' '.join(words):<20} results={len(results):<6} "
+            f"p50={statistics.median(samples):.2f}ms p95={percentile(samples, 0.95):.2f}ms max={max(samples):.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Fake NocoDB webhook sender, to exercise the /webhooks/nocodb receiver.
+
+Without --url it runs in-process against benchmarks/fake_noco.py. It checks
+that a missing or wrong X-Webhook-Secret is refused (403) and an unknown
+event type rejected (400), then changes rows in the fake table the way a
+NocoDB user would and posts the matching insert, update and delete events.
+After each one it checks that the search index, the record cache, the
+fragment version and (with --mirror) the local mirror followed the change,
+and finally reports the latency of a burst of update events:
+
+    python benchmarks/webhook_sender.py --recipes 2000 --events 500 --mirror
+
+With --url the same insert/update/delete events are posted to a running app
+(which must be configured with the same secret), without the checks:
+
+    python benchmarks/webhook_sender.py --url http://localhost:5001/webhooks/nocodb --secret s3cret
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_noco import FakeNocoDB, make_recipes  # noqa: E402
+
+RECIPES_TABLE_ID = "mk4go4bhd91cihe"
+SECRET = "webhook-benchmark"
+
+
+def event(kind, table_id, rows):
+    """A NocoDB v2 webhook payload, e.g. kind "update" or "bulkDelete"."""
+    return {"type": f"records.after.{kind}", "data": {"table_id": table_id, "rows": rows}}
+
+
+def sample_events(table_id, record_id):
+    """Insert, update and delete events for one made-up recipe."""
+    row = {"Id": record_id, "Title": "Webhook marmalade tart", "Meal": "Dessert", "Core": "Fruit", "Source": None}
+    return [
+        event("insert", table_id, [row]),
+        event("update", table_id, [{**row, "Title": "Webhook quince crumble"}]),
+        event("delete", table_id, [{"Id": record_id}]),
+    ]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def __call__(self, label, ok, detail=""):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}{f' ({detail})' if detail and not ok else ''}")
+        self.failed += not ok
+
+
+def send_remote(args):
+    import requests
+
+    for payload in sample_events(args.table, args.record_id):
+        response = requests.post(args.url, json=payload, headers={"X-Webhook-Secret": args.secret}, timeout=10)
+        print(f"{payload['type']:<28} {response.status_code} {response.text.strip()}")
+
+
+def create_app(args, fake):
+    workdir = tempfile.mkdtemp(prefix="webhooks-")
+    os.environ.update({
+        "NOCO_DB_BASE_URL": fake.start(),
+        "NOCO_DB_API_TOKEN": "benchmark",
+        "FLASK_APP_SECRET_KEY": "benchmark",
+        "NOCO_DB_WEBHOOK_SECRET": SECRET,
+        "MIRROR_ENABLED": "true" if args.mirror else "false",
+        "MIRROR_TABLES": RECIPES_TABLE_ID,
+        "MIRROR_DB_PATH": os.path.join(workdir, "mirror.sqlite3"),
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "JOBS_SPOOL_DIR": os.path.join(workdir, "job_uploads"),
+    })
+    from app.app import create_app
+    app = create_app()
+    app.testing = True
+    return app
+
+
+def run_local(args):
+    from app import noco
+    from app.blueprints.menu.models import NoCoRecipes
+    from app.fragments import table_version
+    from app.search_index import get_search_index
+
+    fake = FakeNocoDB({RECIPES_TABLE_ID: make_recipes(args.recipes)})
+    app = create_app(args, fake)
+    client = app.test_client()
+    table = fake.tables[RECIPES_TABLE_ID]
+    check = Checks()
+
+    def post(payload, secret=SECRET):
+        headers = {"X-Webhook-Secret": secret} if secret is not None else {}
+        return client.post("/webhooks/nocodb", json=payload, headers=headers)
+
+    with app.app_context():
+        index = get_search_index(RECIPES_TABLE_ID, NoCoRecipes.LIST_FIELDS)
+        noco.get_record(RECIPES_TABLE_ID, 1)
+        mirror = app.extensions.get('mirror')
+        if mirror is not None:
+            mirror.sync(RECIPES_TABLE_ID)
+
+        def found(word):
+            return [row["Id"] for row in index.search([word])]
+
+        # Authentication and payload checks
+        update_one = event("update", RECIPES_TABLE_ID, [table[1]])
+        check("missing secret is refused", post(update_one, secret=None).status_code == 403)
+        check("wrong secret is refused", post(update_one, secret="not-the-secret").status_code == 403)
+        response = post(event("rename", RECIPES_TABLE_ID, [table[1]]))
+        check("unknown event type is rejected", response.status_code == 400, response.status_code)
+
+        # Insert: a recipe added in NocoDB shows up in search and the mirror
+        new_id = max(table) + 1
+        table[new_id] = {**table[1], "Id": new_id, "Title": "Webhook marmalade tart"}
+        version = table_version(RECIPES_TABLE_ID)
+        response = post(event("insert", RECIPES_TABLE_ID, [table[new_id]]))
+        check("insert is applied", response.status_code == 200 and response.json["applied"] == 1, response.json)
+        check("insert reaches the search index", found("marmalade") == [new_id], found("marmalade"))
+        check("insert bumps the fragment version", table_version(RECIPES_TABLE_ID) > version)
+        if mirror is not None:
+            check("insert reaches the mirror", mirror.get(RECIPES_TABLE_ID, new_id) is not None)
+
+        # Update: served from the record cache without asking NocoDB again
+        table[1] = {**table[1], "Title": "Webhook quince crumble"}
+        version = table_version(RECIPES_TABLE_ID)
+        post(event("update", RECIPES_TABLE_ID, [table[1]]))
+        calls = fake.counters()["calls"]
+        title = noco.get_record(RECIPES_TABLE_ID, 1)["Title"]
+        check("update reaches the record cache", title == "Webhook quince crumble" and fake.counters()["calls"] == calls,
+              title)
+        check("update reaches the search index", found("quince") == [1], found("quince"))
+        check("update bumps the fragment version", table_version(RECIPES_TABLE_ID) > version)
+        if mirror is not None:
+            check("update reaches the mirror", (mirror.get(RECIPES_TABLE_ID, 1) or {}).get("Title") == title)
+
+        # Delete (bulk): gone from the index, the cache and the mirror
+        deleted = [2, new_id]
+        for record_id in deleted:
+            del table[record_id]
+        post(event("bulkDelete", RECIPES_TABLE_ID, [{"Id": record_id} for record_id in deleted]))
+        remaining = {row["Id"] for row in index.search([])}
+        check("delete reaches the search index", not remaining & set(deleted))
+        try:
+            noco.get_record(RECIPES_TABLE_ID, 2)
+            check("delete reaches the record cache", False, "record 2 still served")
+        except noco.NocoDBError as e:
+            check("delete reaches the record cache", e.status_code == 404, e.status_code)
+        if mirror is not None:
+            check("delete reaches the mirror", all(mirror.get(RECIPES_TABLE_ID, i) is None for i in deleted))
+
+    # Burst of single-row updates, as NocoDB sends them while someone edits
+    rng = random.Random(args.seed)
+    samples = []
+    for number in range(args.events):
+        record_id = rng.choice(list(table))
+        table[record_id] = {**table[record_id], "Notes": f"Edited {number}"}
+        started = time.perf_counter()
+        post(event("update", RECIPES_TABLE_ID, [table[record_id]]))
+        samples.append((time.perf_counter() - started) * 1000)
+    print(f"{args.events} update events: p50={statistics.median(samples):.2f}ms "
+          f"p95={percentile(samples, 0.95):.2f}ms max={max(samples):.2f}ms")
+
+    fake.stop()
+    return check.failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Post to a running app's /webhooks/nocodb instead of checking in-process.")
+    parser.add_argument("--secret", default=SECRET, help="X-Webhook-Secret sent with --url.")
+    parser.add_argument("--table", default=RECIPES_TABLE_ID, help="Table id of the events sent with --url.")
+    parser.add_argument("--record-id", type=int, default=999999, help="Id of the made-up recipe sent with --url.")
+    parser.add_argument("--recipes", type=int, default=500)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--mirror", action="store_true", help="Also check the local SQLite mirror.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.url:
+        send_remote(args)
+        return
+    sys.exit(1 if run_local(args) else 0)
+
+
+if __name__ == "__main__":
+    main()